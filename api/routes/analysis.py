@@ -1,10 +1,11 @@
 import logging
 import math
 import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from fastapi import APIRouter, HTTPException, Query
 from core.database import get_db_connection, TradeAnalysis
+from core.pagination import count_cache, keyset_condition, next_cursor
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -31,12 +32,18 @@ def get_all_assets_symbols() -> List[str]:
 
 @router.get("/analysis", summary="获取行情分析结果列表")
 def get_analysis_history(
-    page: int = Query(1, ge=1, description="页码"),
+    page: int = Query(1, ge=1, description="页码 (提供 cursor 时忽略)"),
     page_size: int = Query(20, ge=1, le=100, description="每页大小"),
-    asset: str = Query(None, description="按资产符号筛选 (例如: BTCUSDT)")
+    asset: str = Query(None, description="按资产符号筛选 (例如: BTCUSDT)"),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页返回的 next_cursor"),
+    with_total: Optional[bool] = Query(None, description="是否返回总数 (页码模式默认返回，游标模式默认不返回)")
 ) -> Dict[str, Any]:
     """
     获取行情分析历史记录，支持分页和按资产筛选。
+
+    按 (timestamp, id) 倒序排列。提供 cursor 时使用键集分页，直接从上一页最后一行处
+    沿 idx_asset_timestamp (按资产筛选时) 或 idx_timestamp 继续扫描，翻页深度不影响耗时；否则沿用页码 + OFFSET 模式。
+    总数按筛选条件缓存 PAGINATION_COUNT_CACHE_TTL 秒。
     """
     conn = None
     try:
@@ -44,48 +51,61 @@ def get_analysis_history(
         if not conn:
             raise HTTPException(status_code=500, detail="数据库连接失败。")
 
-        cursor = conn.cursor(dictionary=True)
+        cursor_db = conn.cursor(dictionary=True)
 
         # --- 动态构建查询 ---
-        count_query = "SELECT COUNT(*) as total FROM trade_analysis"
-        data_query = "SELECT * FROM trade_analysis"
-        
+        conditions = []
         params = []
         
         if asset:
-            data_query += " WHERE asset = %s"
-            count_query += " WHERE asset = %s"
+            conditions.append("asset = %s")
             params.append(asset)
 
-        # 计算总记录数
-        cursor.execute(count_query, tuple(params))
-        total_records = cursor.fetchone()['total']
-        total_pages = math.ceil(total_records / page_size)
+        filter_sql = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        response: Dict[str, Any] = {"page_size": page_size}
+
+        if with_total if with_total is not None else cursor is None:
+            def _count() -> int:
+                cursor_db.execute(f"SELECT COUNT(*) as total FROM trade_analysis{filter_sql}", tuple(params))
+                return cursor_db.fetchone()['total']
+
+            total_records = count_cache.get_or_count(("trade_analysis", asset), _count)
+            response["total_records"] = total_records
+            response["total_pages"] = math.ceil(total_records / page_size)
 
         # 获取分页数据
-        data_query += " ORDER BY timestamp DESC LIMIT %s OFFSET %s"
-        offset = (page - 1) * page_size
-        params.extend([page_size, offset])
+        if cursor:
+            try:
+                keyset_sql, keyset_params = keyset_condition("timestamp", cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            conditions.append(keyset_sql)
+            params.extend(keyset_params)
+            data_query = f"SELECT * FROM trade_analysis WHERE {' AND '.join(conditions)}"
+            data_query += " ORDER BY timestamp DESC, id DESC LIMIT %s"
+            params.append(page_size)
+        else:
+            response["page"] = page
+            data_query = f"SELECT * FROM trade_analysis{filter_sql} ORDER BY timestamp DESC, id DESC LIMIT %s OFFSET %s"
+            params.extend([page_size, (page - 1) * page_size])
         
-        cursor.execute(data_query, tuple(params))
-        results = cursor.fetchall()
+        cursor_db.execute(data_query, tuple(params))
+        results = cursor_db.fetchall()
+        response["next_cursor"] = next_cursor(results, "timestamp", page_size)
 
         # 序列化 datetime
         for row in results:
             if isinstance(row.get('timestamp'), datetime.datetime):
                 row['timestamp'] = row['timestamp'].isoformat()
 
-        return {
-            "page": page,
-            "page_size": page_size,
-            "total_pages": total_pages,
-            "total_records": total_records,
-            "data": results
-        }
+        response["data"] = results
+        return response
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取分析历史记录时出错: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="发生内部错误。")
     finally:
         if conn:
-            conn.close()
\ No newline at end of file
+            conn.close()
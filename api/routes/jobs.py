@@ -0,0 +1,35 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from core import job_queue
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.get("/jobs", summary="获取分析作业列表")
+def get_jobs(
+    status: Optional[str] = Query(None, description=f"按状态筛选: {', '.join(job_queue.JOB_STATUSES)}"),
+    limit: int = Query(50, ge=1, le=500, description="最多返回的条数")
+) -> List[Dict[str, Any]]:
+    """按 ID 倒序返回最近的分析作业；status=DEAD 即死信队列。"""
+    if status and status not in job_queue.JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"无效的作业状态: {status}")
+    try:
+        return job_queue.list_jobs(status, limit)
+    except Exception as e:
+        logger.error(f"获取分析作业列表时出错: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="获取分析作业列表失败。")
+
+@router.post("/jobs/{job_id}/retry", summary="重新执行死信作业")
+def retry_job(job_id: int):
+    try:
+        retried = job_queue.retry_dead_job(job_id)
+    except Exception as e:
+        logger.error(f"重新排队作业 {job_id} 时出错: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="重新排队作业失败。")
+    if not retried:
+        raise HTTPException(status_code=404, detail="作业不存在或不在死信队列中。")
+    logger.info(f"死信作业 {job_id} 已重新排队。")
+    return {"message": "Job requeued", "job_id": job_id}
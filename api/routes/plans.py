@@ -1,30 +1,196 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Response
+from typing import Dict, List, Optional, Tuple
+import datetime
 import logging
 
-from core.database import get_db_connection, TradePlan
+from core.database import get_db_connection, TradePlan, Cycle, Direction, PlanStatus
+from core.pagination import count_cache, keyset_condition, next_cursor
 from models.request import UpdatePlanStatusRequest
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+class PlanFilters:
+    """交易计划列表的服务端筛选条件。"""
+
+    __slots__ = (
+        "asset", "cycle", "status", "direction", "start_time", "end_time",
+        "min_confidence", "max_confidence", "prompt_id",
+    )
+
+    def __init__(
+        self,
+        asset: Optional[str] = None,
+        cycle: Optional[Cycle] = None,
+        status: Optional[PlanStatus] = None,
+        direction: Optional[Direction] = None,
+        start_time: Optional[datetime.datetime] = None,
+        end_time: Optional[datetime.datetime] = None,
+        min_confidence: Optional[float] = None,
+        max_confidence: Optional[float] = None,
+        prompt_id: Optional[int] = None,
+    ):
+        self.asset = asset
+        self.cycle = cycle
+        self.status = status
+        self.direction = direction
+        self.start_time = start_time
+        self.end_time = end_time
+        self.min_confidence = min_confidence
+        self.max_confidence = max_confidence
+        self.prompt_id = prompt_id
+
+    def key(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def to_sql(self) -> Tuple[List[str], List]:
+        """
+        生成 WHERE 条件。等值条件的顺序与 schema.sql 中的复合索引一致，
+        时间范围落在索引末尾的 created_at 上，置信度作为索引之后的剩余条件。
+        """
+        conditions, params = [], []
+        for column, value in (
+            ("asset", self.asset),
+            ("cycle", self.cycle.value if self.cycle else None),
+            ("status", self.status.value if self.status else None),
+            ("direction", self.direction.value if self.direction else None),
+            ("prompt_id", self.prompt_id),
+        ):
+            if value is not None:
+                conditions.append(f"{column} = %s")
+                params.append(value)
+        if self.start_time is not None:
+            conditions.append("created_at >= %s")
+            params.append(self.start_time)
+        if self.end_time is not None:
+            conditions.append("created_at < %s")
+            params.append(self.end_time)
+        if self.min_confidence is not None:
+            conditions.append("confidence >= %s")
+            params.append(self.min_confidence)
+        if self.max_confidence is not None:
+            conditions.append("confidence <= %s")
+            params.append(self.max_confidence)
+        return conditions, params
+
+
+def build_plans_query(filters: PlanFilters, page_size: int, page: int = 1,
+                      cursor: Optional[str] = None) -> Tuple[str, tuple]:
+    """构建列表查询 (供路由与 `manage.py explain-plans` 共用)。游标格式错误时抛出 ValueError。"""
+    conditions, params = filters.to_sql()
+    if cursor:
+        keyset_sql, keyset_params = keyset_condition("created_at", cursor)
+        conditions.append(keyset_sql)
+        params.extend(keyset_params)
+    query = "SELECT * FROM trade_plan"
+    if conditions:
+        query += f" WHERE {' AND '.join(conditions)}"
+    query += " ORDER BY created_at DESC, id DESC LIMIT %s"
+    params.append(page_size)
+    if not cursor:
+        query += " OFFSET %s"
+        params.append((page - 1) * page_size)
+    return query, tuple(params)
+
+
+# 需要保持走索引的常见筛选组合，由 tests/test_plans_explain.py 与 `manage.py explain-plans` 检查
+EXPLAIN_CASES = {
+    "无筛选": PlanFilters(),
+    "时间范围": PlanFilters(start_time=datetime.datetime(2024, 1, 1)),
+    "资产": PlanFilters(asset="BTCUSDT"),
+    "资产+周期+状态+方向+时间+置信度": PlanFilters(
+        asset="BTCUSDT", cycle=Cycle.H1, status=PlanStatus.ACTIVE, direction=Direction.LONG,
+        start_time=datetime.datetime(2024, 1, 1), min_confidence=0.7,
+    ),
+    "状态+方向": PlanFilters(status=PlanStatus.ACTIVE, direction=Direction.LONG),
+    "状态": PlanFilters(status=PlanStatus.ACTIVE),
+    "提示词": PlanFilters(prompt_id=1),
+}
+
+
+def explain_plan_queries(conn=None) -> List[Dict]:
+    """
+    对 EXPLAIN_CASES 执行 EXPLAIN，返回每个组合使用的索引以及是否出现全表扫描或文件排序。
+
+    未传入连接时从连接池获取并在结束后归还；连接池不可用时抛出 RuntimeError。
+    表中数据过少时优化器可能直接选择全表扫描，应在数据量有代表性的库上运行。
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+        if conn is None:
+            raise RuntimeError("无法连接数据库。")
+    try:
+        cursor = conn.cursor(dictionary=True)
+        report = []
+        for name, filters in EXPLAIN_CASES.items():
+            query, params = build_plans_query(filters, page_size=20)
+            cursor.execute(f"EXPLAIN {query}", params)
+            row = cursor.fetchall()[0]
+            extra = row.get("Extra") or ""
+            ok = row.get("type") != "ALL" and row.get("key") is not None and "filesort" not in extra
+            report.append({"case": name, "type": row.get("type"), "key": row.get("key"), "extra": extra, "ok": ok})
+        return report
+    finally:
+        if own_conn:
+            conn.close()
+
+
 @router.get("/plans", response_model=List[TradePlan], summary="获取交易计划列表")
 def get_all_plans(
-    page: int = Query(1, ge=1, description="页码"),
-    page_size: int = Query(20, ge=1, le=100, description="每页数量")
+    response: Response,
+    page: int = Query(1, ge=1, description="页码 (提供 cursor 时忽略)"),
+    page_size: int = Query(20, ge=1, le=100, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页响应头 X-Next-Cursor 的值"),
+    with_total: bool = Query(False, description="是否在响应头 X-Total-Count 中返回总数"),
+    asset: Optional[str] = Query(None, description="资产符号，例如 BTCUSDT"),
+    cycle: Optional[Cycle] = Query(None, description="分析周期"),
+    status: Optional[PlanStatus] = Query(None, description="计划状态"),
+    direction: Optional[Direction] = Query(None, description="交易方向"),
+    start_time: Optional[datetime.datetime] = Query(None, description="生成时间下限 (含)"),
+    end_time: Optional[datetime.datetime] = Query(None, description="生成时间上限 (不含)"),
+    min_confidence: Optional[float] = Query(None, ge=0, le=1, description="最低置信度"),
+    max_confidence: Optional[float] = Query(None, ge=0, le=1, description="最高置信度"),
+    prompt_id: Optional[int] = Query(None, description="生成计划所用的提示词ID")
 ):
+    """
+    按 (created_at, id) 倒序列出交易计划，支持按资产、周期、状态、方向、时间范围、置信度与提示词筛选。
+
+    响应体保持为计划列表；下一页游标和可选的总数通过响应头 X-Next-Cursor / X-Total-Count 返回。
+    """
+    filters = PlanFilters(
+        asset, cycle, status, direction, start_time, end_time, min_confidence, max_confidence, prompt_id
+    )
     conn = None
     try:
+        try:
+            query, params = build_plans_query(filters, page_size, page, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
         conn = get_db_connection()
         if not conn:
             raise HTTPException(status_code=500, detail="Database connection failed")
         
-        cursor = conn.cursor(dictionary=True)
-        offset = (page - 1) * page_size
-        query = "SELECT * FROM trade_plan ORDER BY created_at DESC LIMIT %s OFFSET %s"
-        cursor.execute(query, (page_size, offset))
-        plans = cursor.fetchall()
+        cursor_db = conn.cursor(dictionary=True)
+        if with_total:
+            def _count() -> int:
+                conditions, count_params = filters.to_sql()
+                where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+                cursor_db.execute(f"SELECT COUNT(*) as total FROM trade_plan{where}", tuple(count_params))
+                return cursor_db.fetchone()['total']
+
+            total = count_cache.get_or_count(("trade_plan", filters.key()), _count)
+            response.headers["X-Total-Count"] = str(total)
+
+        cursor_db.execute(query, params)
+        plans = cursor_db.fetchall()
+        cursor_value = next_cursor(plans, "created_at", page_size)
+        if cursor_value:
+            response.headers["X-Next-Cursor"] = cursor_value
         return plans
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取交易计划列表时出错: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to fetch trade plans")
@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, status
 from typing import List, Dict
 from models.prompt import Prompt, PromptCreate
 from core.database import get_db_connection
+from core.prompt_cache import prompt_cache
 import logging
 import datetime
 
@@ -15,7 +16,7 @@ logger = logging.getLogger(__name__)
 def _get_prompts_from_db(conn) -> List[Prompt]:
     """从数据库获取所有 prompts 并转换为 Prompt 对象列表。"""
     cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT id, name, version, content, is_active, created_at FROM prompts ORDER BY name, version DESC")
+    cursor.execute("SELECT id, name, version, content, is_active, kline_encoding, created_at FROM prompts ORDER BY name, version DESC")
     rows = cursor.fetchall()
     # Pydantic 将自动处理类型转换
     return [Prompt(**row) for row in rows] # type: ignore
@@ -32,16 +33,17 @@ def _create_prompt_in_db(conn, prompt_data: PromptCreate) -> Prompt:
 
     # 2. 插入新记录
     sql = """
-        INSERT INTO prompts (name, version, content, is_active)
-        VALUES (%s, %s, %s, %s)
+        INSERT INTO prompts (name, version, content, is_active, kline_encoding)
+        VALUES (%s, %s, %s, %s, %s)
     """
-    cursor.execute(sql, (prompt_data.name, new_version, prompt_data.content, False))
+    kline_encoding = prompt_data.kline_encoding.value if prompt_data.kline_encoding else None
+    cursor.execute(sql, (prompt_data.name, new_version, prompt_data.content, False, kline_encoding))
     
     new_id = cursor.lastrowid
     conn.commit()
 
     # 3. 获取并返回新创建的对象
-    cursor.execute("SELECT id, name, version, content, is_active, created_at FROM prompts WHERE id = %s", (new_id,))
+    cursor.execute("SELECT id, name, version, content, is_active, kline_encoding, created_at FROM prompts WHERE id = %s", (new_id,))
     new_row = cursor.fetchone()
     
     if not new_row:
@@ -56,7 +58,7 @@ def _create_prompt_in_db(conn, prompt_data: PromptCreate) -> Prompt:
 def _get_prompt_by_id_from_db(conn, prompt_id: int) -> Prompt | None:
     """通过 ID 从数据库获取单个 prompt 并转换为 Prompt 对象。"""
     cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT id, name, version, content, is_active, created_at FROM prompts WHERE id = %s", (prompt_id,))
+    cursor.execute("SELECT id, name, version, content, is_active, kline_encoding, created_at FROM prompts WHERE id = %s", (prompt_id,))
     row = cursor.fetchone()
     
     if not row:
@@ -116,8 +118,8 @@ def create_prompt(prompt: PromptCreate):
         if conn is None:
             raise HTTPException(status_code=500, detail="Database connection failed")
         
-        new_prompt = _create_prompt_in_db(conn, prompt)
-        return new_prompt
+        # 提示词按 ID 不可变，新版本是新的一行，无需让缓存失效
+        return _create_prompt_in_db(conn, prompt)
     except Exception as e:
         if conn:
             conn.rollback()
@@ -150,6 +152,7 @@ def delete_prompt(prompt_id: int):
             raise HTTPException(status_code=500, detail="Database connection failed")
         
         success = _delete_prompt_from_db(conn, prompt_id)
+        prompt_cache.invalidate(prompt_id)
         
         if not success:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt not found")
@@ -0,0 +1,66 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from core import run_ledger
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+STAGE_PATTERN = "^(" + "|".join(run_ledger.STAGE_COLUMNS) + ")$"
+GROUP_PATTERN = "^(" + "|".join(run_ledger.GROUP_COLUMNS) + ")$"
+
+@router.get("/runs/slowest", summary="获取最慢的分析运行")
+def get_slowest_runs(
+    hours: float = Query(24, gt=0, le=720, description="统计最近多少小时"),
+    stage: str = Query("total", pattern=STAGE_PATTERN, description="按哪个阶段的耗时排序"),
+    asset: Optional[str] = Query(None, description="按交易对筛选"),
+    model: Optional[str] = Query(None, description="按模型筛选"),
+    limit: int = Query(20, ge=1, le=200, description="最多返回的条数")
+) -> List[Dict[str, Any]]:
+    """时间窗口内指定阶段耗时最长的运行，附带各阶段耗时；run_id 可用于 /task-logs 查看完整日志。"""
+    try:
+        return run_ledger.slowest_runs(hours, stage=stage, limit=limit, asset=asset, model=model)
+    except Exception as e:
+        logger.error(f"查询最慢的运行时出错: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="查询运行记录失败。")
+
+@router.get("/runs/latency", summary="按资产或模型统计运行耗时分位数")
+def get_run_latency(
+    hours: float = Query(24, gt=0, le=720, description="统计最近多少小时"),
+    group_by: str = Query("asset", pattern=GROUP_PATTERN, description="分组字段"),
+    stage: str = Query("total", pattern=STAGE_PATTERN, description="统计哪个阶段的耗时"),
+    include_failed: bool = Query(False, description="是否把失败的运行也计入")
+) -> List[Dict[str, Any]]:
+    """每组的运行数与 p50/p95/p99/最大/平均耗时 (毫秒)，按 p95 从高到低排列。"""
+    try:
+        return run_ledger.latency_percentiles(
+            hours, group_by=group_by, stage=stage, outcome=None if include_failed else run_ledger.OK
+        )
+    except Exception as e:
+        logger.error(f"统计运行耗时分位数时出错: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="查询运行记录失败。")
+
+@router.get("/runs/failures", summary="统计分析运行的失败率")
+def get_run_failures(
+    hours: float = Query(24, gt=0, le=720, description="统计最近多少小时"),
+    group_by: str = Query("asset", pattern=GROUP_PATTERN, description="分组字段")
+) -> List[Dict[str, Any]]:
+    """每组的运行数、失败数、失败率和各失败类别的次数，按失败率从高到低排列。"""
+    try:
+        return run_ledger.failure_rates(hours, group_by=group_by)
+    except Exception as e:
+        logger.error(f"统计运行失败率时出错: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="查询运行记录失败。")
+
+@router.get("/runs/{run_id}", summary="获取单次运行的耗时明细")
+def get_run(run_id: str) -> Dict[str, Any]:
+    try:
+        run = run_ledger.get_run(run_id)
+    except Exception as e:
+        logger.error(f"查询运行 {run_id} 时出错: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="查询运行记录失败。")
+    if run is None:
+        raise HTTPException(status_code=404, detail="运行记录不存在 (可能尚未写入或已过保留期)。")
+    return run
@@ -0,0 +1,116 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+import logging
+
+from core.ai_client import admission
+from core import job_queue
+from core.cluster import cluster
+from core.config import settings
+from core.database import get_db_connection
+from core.db_executor import db_executor
+from core.indicators import indicator_engine
+from core.kline_cache import kline_cache
+from core.market_data import kline_singleflight
+from core.model_router import model_router
+from core.prompt_cache import prompt_cache
+from core.result_writer import result_writer
+from core.run_ledger import run_ledger
+from core.scheduler import JOB_PREFIX, change_stats, load_shaping_stats, reconcile_stats, scheduler
+from core.response_cache import response_cache
+from services.job_worker import worker_pool
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.get("/system/kline-cache", summary="获取K线缓存命中与请求合并统计")
+def get_kline_cache_stats():
+    return {
+        **kline_cache.stats(),
+        "singleflight": kline_singleflight.stats(),
+    }
+
+
+@router.get("/system/indicators", summary="获取技术指标引擎统计")
+def get_indicator_stats():
+    return indicator_engine.stats()
+
+
+@router.get("/system/ai-cache", summary="获取 AI 响应缓存统计")
+def get_ai_cache_stats():
+    return response_cache.stats()
+
+
+@router.get("/system/ai-admission", summary="获取模型调用排队与限流状态")
+def get_ai_admission_stats():
+    return admission.stats()
+
+
+@router.get("/system/ai-models", summary="获取各模型的延迟与健康度")
+def get_ai_model_stats():
+    return model_router.stats()
+
+
+@router.get("/system/db", summary="获取数据库线程池状态")
+def get_db_executor_stats():
+    return db_executor.stats()
+
+
+@router.get("/system/prompt-cache", summary="获取已解析提示词缓存统计")
+def get_prompt_cache_stats():
+    return prompt_cache.stats()
+
+
+@router.get("/system/result-writer", summary="获取分析结果批量写入统计")
+def get_result_writer_stats():
+    return result_writer.stats()
+
+
+@router.get("/system/scheduler", summary="获取调度器作业与对账统计")
+def get_scheduler_stats():
+    jobs = [job for job in scheduler.get_jobs() if job.id.startswith(JOB_PREFIX)]
+    return {"jobs": len(jobs), "reconcile": reconcile_stats, "task_changes": change_stats, "load_shaping": load_shaping_stats()}
+
+
+@router.get("/system/cluster", summary="获取集群节点与任务分片状态")
+def get_cluster_stats():
+    task_ids = [
+        int(job.id[len(JOB_PREFIX):]) for job in scheduler.get_jobs() if job.id.startswith(JOB_PREFIX)
+    ]
+    return {**cluster.stats(), "enabled": settings.CLUSTER_ENABLED, "scheduled_tasks": len(task_ids)}
+
+
+@router.get("/system/job-queue", summary="获取分析作业队列深度与本进程工作者统计")
+def get_job_queue_stats():
+    try:
+        depth = job_queue.queue_depth()
+    except Exception as e:
+        logger.error(f"统计分析作业队列时出错: {e}", exc_info=True)
+        depth = None
+    return {"queue": depth, "workers": worker_pool.stats(), "run_ledger": run_ledger.stats()}
+
+
+@router.get("/system/live", summary="存活检查")
+def get_liveness():
+    return {"status": "ok", "role": settings.APP_ROLE}
+
+
+@router.get("/system/ready", summary="按进程角色的就绪检查")
+def get_readiness():
+    """
+    数据库可连接，且本进程角色负责的组件已在运行时返回 200，否则返回 503。
+    manage.py serve 在启动和滚动重启时据此判断子进程是否可以接收流量。
+    """
+    checks = {}
+    conn = get_db_connection()
+    checks["database"] = conn is not None
+    if conn is not None:
+        conn.close()
+    if settings.runs_scheduler:
+        checks["scheduler"] = scheduler.running
+    if settings.runs_analysis_workers and worker_pool.concurrency > 0:
+        checks["analysis_workers"] = worker_pool.running
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "role": settings.APP_ROLE, "checks": checks}
+    )
@@ -0,0 +1,48 @@
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from core.config import settings
+from core.task_log import read_task_logs, summarize_runs
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+
+def _log_dir() -> str:
+    return os.path.dirname(settings.TASK_LOG_FILE) or "."
+
+@router.get("/task-logs/runs", summary="获取分析运行列表")
+def get_task_runs(
+    date: Optional[str] = Query(None, pattern=DATE_PATTERN, description="日期 (YYYY-MM-DD)，默认从最近的日志开始"),
+    task_id: Optional[int] = Query(None, description="按定时任务ID筛选"),
+    limit: int = Query(100, ge=1, le=1000, description="最多返回的运行数")
+) -> List[Dict[str, Any]]:
+    """按运行汇总任务日志：起止时间、日志条数和最高日志级别。"""
+    try:
+        return summarize_runs(_log_dir(), date=date, task_id=task_id, limit=limit)
+    except Exception as e:
+        logger.error(f"汇总任务日志时出错: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="读取任务日志失败。")
+
+@router.get("/task-logs", summary="按运行筛选分析任务日志")
+def get_task_logs(
+    run_id: Optional[str] = Query(None, description="运行ID"),
+    task_id: Optional[int] = Query(None, description="定时任务ID"),
+    symbol: Optional[str] = Query(None, description="交易对"),
+    level: Optional[str] = Query(None, description="日志级别，例如 ERROR"),
+    date: Optional[str] = Query(None, pattern=DATE_PATTERN, description="日期 (YYYY-MM-DD)，限定读取的日志文件"),
+    limit: int = Query(500, ge=1, le=5000, description="最多返回的条数")
+) -> List[Dict[str, Any]]:
+    """从汇总的 JSONL 任务日志 (含已轮转的压缩文件) 中筛选日志，按时间顺序返回。"""
+    try:
+        return read_task_logs(
+            _log_dir(), run_id=run_id, task_id=task_id, symbol=symbol,
+            level=level.upper() if level else None, date=date, limit=limit
+        )
+    except Exception as e:
+        logger.error(f"读取任务日志时出错: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="读取任务日志失败。")
@@ -18,15 +18,17 @@ def create_task(task_data: CreateTaskRequest):
             raise HTTPException(status_code=500, detail="Database connection failed")
         cursor = conn.cursor()
         sql = """
-        INSERT INTO scheduled_tasks (asset_id, prompt_id, cycle, cron_expression, is_active)
-        VALUES (%s, %s, %s, %s, %s)
+        INSERT INTO scheduled_tasks (asset_id, prompt_id, cycle, cron_expression, kline_encoding, trigger_mode, is_active)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
         """
-        params = (task_data.asset_id, task_data.prompt_id, task_data.cycle, task_data.cron_expression, task_data.is_active)
+        kline_encoding = task_data.kline_encoding.value if task_data.kline_encoding else None
+        params = (task_data.asset_id, task_data.prompt_id, task_data.cycle, task_data.cron_expression, kline_encoding,
+                  task_data.trigger_mode.value, task_data.is_active)
         cursor.execute(sql, params)
         conn.commit()
         task_id = cursor.lastrowid
         logger.info(f"定时任务创建成功，ID: {task_id}")
-        reload_scheduler_tasks() # 重新加载调度器以应用更改
+        reload_scheduler_tasks(task_id) # 只对账该任务对应的作业
         return {"message": "Task created successfully", "task_id": task_id}
     except Exception as e:
         logger.error(f"创建任务时出错: {e}", exc_info=True)
@@ -65,16 +67,18 @@ def update_task(task_id: int, task_data: CreateTaskRequest):
         cursor = conn.cursor()
         sql = """
         UPDATE scheduled_tasks
-        SET asset_id = %s, prompt_id = %s, cycle = %s, cron_expression = %s, is_active = %s
+        SET asset_id = %s, prompt_id = %s, cycle = %s, cron_expression = %s, kline_encoding = %s, trigger_mode = %s, is_active = %s
         WHERE id = %s
         """
-        params = (task_data.asset_id, task_data.prompt_id, task_data.cycle, task_data.cron_expression, task_data.is_active, task_id)
+        kline_encoding = task_data.kline_encoding.value if task_data.kline_encoding else None
+        params = (task_data.asset_id, task_data.prompt_id, task_data.cycle, task_data.cron_expression, kline_encoding,
+                  task_data.trigger_mode.value, task_data.is_active, task_id)
         cursor.execute(sql, params)
         conn.commit()
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Task not found")
         logger.info(f"定时任务 {task_id} 更新成功")
-        reload_scheduler_tasks()
+        reload_scheduler_tasks(task_id)
         return {"message": f"Task {task_id} updated successfully"}
     except Exception as e:
         logger.error(f"更新任务 {task_id} 时出错: {e}", exc_info=True)
@@ -98,7 +102,7 @@ def delete_task(task_id: int):
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Task not found")
         logger.info(f"定时任务 {task_id} 删除成功")
-        reload_scheduler_tasks()
+        reload_scheduler_tasks(task_id)
         return {"message": f"Task {task_id} deleted successfully"}
     except Exception as e:
         logger.error(f"删除任务 {task_id} 时出错: {e}", exc_info=True)
@@ -2,9 +2,19 @@ import logging
 from openai import AsyncOpenAI, APIError
 
 from core.config import settings
+from core.metrics import LLM_CALL_SECONDS, LLM_TOKENS, GaugeFunc
+from core.model_router import model_router
+from core.response_cache import make_cache_key, response_cache
+from core.singleflight import SingleFlight
+from core.stream_json import StreamAbort, StreamingJSONExtractor
+from core.tokenizer import count_message_tokens, estimate_tokens, tokenizer_name
 import asyncio
+import heapq
+import itertools
 import random
 import json
+import time
+from contextlib import asynccontextmanager
 
 # --- Logging ---
 logger = logging.getLogger(__name__)
@@ -24,6 +34,179 @@ if settings.OPENAI_API_KEY and settings.OPENAI_API_KEY != "your_openai_api_key_h
 else:
     logger.warning("OPENAI_API_KEY 未设置或为占位符，OpenAI 客户端未初始化。")
 
+_ai_singleflight = SingleFlight("ai")
+
+# 分析周期越短，调用模型时的优先级越高 (数值越小越优先)
+CYCLE_PRIORITY = {'1m': 0, '5m': 1, '15m': 2, '1h': 3, '4h': 4, '1d': 5}
+DEFAULT_PRIORITY = 9
+
+
+# --- Admission Control ---
+
+class _TokenBucket:
+    """按分钟补充的令牌桶。capacity <= 0 表示不限制。"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """返回距离可以消耗 amount 还需等待的秒数；超过容量的请求只需等到桶满。"""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        needed = min(amount, self.capacity) - self.level
+        return 0.0 if needed <= 0 else needed * 60.0 / self.capacity
+
+    def consume(self, amount: float):
+        if self.capacity > 0:
+            self.level -= amount
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "model", "tokens", "future", "enqueued_at")
+
+    def __init__(self, priority, seq, model, tokens, future):
+        self.priority = priority
+        self.seq = seq
+        self.model = model
+        self.tokens = tokens
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    """
+    所有模型调用的统一准入控制：
+
+    - 全局并发上限 (AI_MAX_CONCURRENCY)；
+    - 每个模型的请求数/分钟与令牌数/分钟令牌桶 (AI_MODEL_RPM / AI_MODEL_TPM / AI_MODEL_LIMITS)；
+    - 按优先级排队，短周期任务优先；同一优先级先到先得。
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.running = 0
+        self._queue: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._buckets: dict[str, tuple[_TokenBucket, _TokenBucket]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self.admitted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    def _model_buckets(self, model: str) -> tuple[_TokenBucket, _TokenBucket]:
+        buckets = self._buckets.get(model)
+        if buckets is None:
+            limits = settings.AI_MODEL_LIMITS.get(model, {})
+            buckets = (
+                _TokenBucket(limits.get("rpm", settings.AI_MODEL_RPM)),
+                _TokenBucket(limits.get("tpm", settings.AI_MODEL_TPM)),
+            )
+            self._buckets[model] = buckets
+        return buckets
+
+    @asynccontextmanager
+    async def slot(self, model: str, tokens: int, priority: int = DEFAULT_PRIORITY):
+        """获取一个调用名额，退出上下文时归还。"""
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(priority, next(self._seq), model, tokens, loop.create_future())
+        heapq.heappush(self._queue, waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release()
+            elif waiter in self._queue:
+                self._queue.remove(waiter)
+                heapq.heapify(self._queue)
+            raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def record_usage(self, model: str, extra_tokens: int):
+        """调用完成后按实际消耗补扣令牌 (例如响应部分的令牌数)。"""
+        if extra_tokens > 0:
+            self._model_buckets(model)[1].consume(extra_tokens)
+
+    def _release(self):
+        self.running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """按优先级放行排队的请求；受限于速率时安排定时器稍后重试。"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        retry_in = None
+        for waiter in sorted(self._queue):
+            if waiter.future.done():
+                # 排队期间已被取消 (例如对冲失败方或超时)，其清理逻辑尚未执行：直接移出，不占名额
+                self._queue.remove(waiter)
+                continue
+            if self.running >= self.max_concurrency:
+                break
+            rpm, tpm = self._model_buckets(waiter.model)
+            wait = max(rpm.wait_time(1, now), tpm.wait_time(waiter.tokens, now))
+            if wait > 0:
+                retry_in = wait if retry_in is None else min(retry_in, wait)
+                continue
+            rpm.consume(1)
+            tpm.consume(waiter.tokens)
+            self._queue.remove(waiter)
+            self.running += 1
+            waited = now - waiter.enqueued_at
+            self.admitted += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            self.last_wait = waited
+            waiter.future.set_result(None)
+        heapq.heapify(self._queue)
+        if retry_in is not None and self._queue:
+            self._timer = asyncio.get_running_loop().call_later(retry_in, self._dispatch)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "queue_depth": len(self._queue),
+            "queue_by_priority": {
+                str(p): sum(1 for w in self._queue if w.priority == p)
+                for p in sorted({w.priority for w in self._queue})
+            },
+            "oldest_wait_seconds": round(max((now - w.enqueued_at for w in self._queue), default=0.0), 3),
+            "admitted": self.admitted,
+            "avg_wait_seconds": round(self.total_wait / self.admitted, 3) if self.admitted else 0.0,
+            "max_wait_seconds": round(self.max_wait, 3),
+            "last_wait_seconds": round(self.last_wait, 3),
+            "models": {
+                model: {
+                    "rpm_available": round(rpm.level, 1) if rpm.capacity > 0 else None,
+                    "tpm_available": round(tpm.level, 1) if tpm.capacity > 0 else None,
+                }
+                for model, (rpm, tpm) in self._buckets.items()
+            },
+        }
+
+
+admission = AdmissionController(settings.AI_MAX_CONCURRENCY)
+GaugeFunc("llm_running_calls", "正在进行的模型调用数", lambda: admission.running)
+GaugeFunc("llm_admission_queue_depth", "等待模型调用名额的请求数", lambda: len(admission._queue))
+
 
 def _extract_json_from_response(response_str: str) -> str | None:
     if "```json" in response_str:
@@ -38,12 +221,62 @@ def _extract_json_from_response(response_str: str) -> str | None:
     return None
 
 
+def _apply_context_budget(
+    system_prompt: str,
+    user_prompt: str,
+    history: list[dict] | None
+) -> tuple[list[dict], dict]:
+    """
+    按令牌预算组装消息，线性一次完成，结果确定。
+
+    保留策略 (优先级从高到低)：
+    1. 系统提示词与本次 user prompt，始终保留；
+    2. 历史中 role 为 system 的消息；
+    3. 其余历史消息从新到旧保留，直到预算用尽，更早的消息被丢弃。
+    预算 = AI_MAX_CONTEXT_TOKENS - AI_RESPONSE_RESERVE_TOKENS。
+    """
+    history = history or []
+    limit = settings.AI_MAX_CONTEXT_TOKENS - settings.AI_RESPONSE_RESERVE_TOKENS
+    system_message = {"role": "system", "content": system_prompt}
+    user_message = {"role": "user", "content": user_prompt}
+    used = count_message_tokens(system_message) + count_message_tokens(user_message)
+    if used > limit:
+        logger.warning(f"系统提示词与用户输入已超出上下文预算: {used} > {limit}")
+
+    costs = [count_message_tokens(m) for m in history]
+    keep = [False] * len(history)
+    pinned = [i for i, m in enumerate(history) if m.get("role") == "system"]
+    others = [i for i in reversed(range(len(history))) if history[i].get("role") != "system"]
+    for i in pinned + others:
+        if used + costs[i] <= limit:
+            keep[i] = True
+            used += costs[i]
+        elif history[i].get("role") != "system":
+            # 从新到旧保留，一旦放不下就停止，保证保留的历史是连续的最近一段
+            break
+
+    kept_history = [m for i, m in enumerate(history) if keep[i]]
+    budget = {
+        "tokenizer": tokenizer_name(),
+        "limit": settings.AI_MAX_CONTEXT_TOKENS,
+        "reserved_for_response": settings.AI_RESPONSE_RESERVE_TOKENS,
+        "prompt_tokens": used,
+        "history_kept": len(kept_history),
+        "history_dropped": len(history) - len(kept_history),
+    }
+    if budget["history_dropped"]:
+        logger.warning(f"对话历史超出预算，丢弃了 {budget['history_dropped']} 条较早的消息。")
+    return [system_message, *kept_history, user_message], budget
+
+
 # --- Core Function ---
 async def get_ai_response(
     system_prompt: str,
     user_prompt: str,
     history: list[dict] | None = None,
-    model=settings.OPENAI_MODEL
+    model=settings.OPENAI_MODEL,
+    call_info: dict | None = None,
+    priority: int = DEFAULT_PRIORITY
 ) -> str:
     """
     从 OpenAI API 获取响应。
@@ -52,6 +285,8 @@ async def get_ai_response(
         system_prompt: 系统级别的指令。
         user_prompt: 用户的具体提示或数据。
         history: 对话的先前消息列表。
+        call_info: 可选，用于回传本次调用的元信息 (如上下文预算)。
+        priority: 排队优先级，数值越小越先调用，见 CYCLE_PRIORITY。
 
     Returns:
         AI 的响应消息，或错误字符串。
@@ -59,56 +294,214 @@ async def get_ai_response(
     if not client:
         return "错误：OpenAI客户端未初始化。请在 backend/.env 文件中正确设置您的 OPENAI_API_KEY。"
 
-    messages = [{"role": "system", "content": system_prompt}]
-    if history:
-        messages.extend(history)
-    messages.append({"role": "user", "content": user_prompt})
+    messages, budget = _apply_context_budget(system_prompt, user_prompt, history)
+    logger.debug(f"上下文预算: {budget}")
+    if call_info is not None:
+        call_info["budget"] = budget
+
+    request_params: dict = {}
+    if not settings.AI_RESPONSE_CACHE_ENABLED:
+        return await _request_with_retries(messages, model, request_params, call_info, priority, budget)
+
+    cache_key = make_cache_key(model, messages, request_params)
+    cached = await response_cache.get(cache_key)
+    if call_info is not None:
+        call_info["cache_hit"] = cached is not None
+    if cached is not None:
+        logger.info(f"AI 响应缓存命中: {cache_key[:12]}")
+        return cached
+
+    async def _shared_request() -> tuple[str, dict]:
+        shared_info: dict = {}
+        text = await _request_with_retries(messages, model, request_params, shared_info, priority, budget)
+        return text, shared_info
 
-    total_tokens = sum(len(m["content"]) for m in messages)
-    logger.debug(f"发送到OpenAI的消息总令牌数: {total_tokens}")
+    # 同一时刻的相同请求只调用一次模型；调用元信息 (模型、重试次数等) 随结果一起共享给所有等待者
+    ret, shared_info = await _ai_singleflight.do(cache_key, _shared_request)
+    if call_info is not None:
+        call_info.update(shared_info)
+    if not ret.startswith("错误："):
+        response_cache.put(cache_key, ret)
+    return ret
 
-    _max_loop = 10000
-    if history:
-        while total_tokens > 100000 and _max_loop > 0:
-            random_id = random.randint(1, (len(history) - 1) // 2)
-            # if history[random_id]["role"] != "system":  # 不删除系统消息
-            total_tokens -= len(history[random_id]["content"])
-            #     logger.warning("对话历史过长，随机删除一条消息以节省令牌。")
-            history.pop(random_id)
-            _max_loop -= 1
 
-    if _max_loop == 0:
-        raise ValueError("对话历史过长，无法通过删除消息节省足够的令牌。")
+async def _consume_stream(model: str, messages: list[dict], request_params: dict, timings: dict) -> tuple[str, int]:
+    """
+    以流式方式调用模型：边接收边丢弃思考段并增量解析 JSON，
+    JSON 对象完整后立即停止接收。返回 (JSON 文本, 估算的输出令牌数)。
+    """
+    started = time.monotonic()
+    extractor = StreamingJSONExtractor(max_preamble=settings.AI_STREAM_MAX_PREAMBLE_CHARS)
+    stream = await client.chat.completions.create(
+        model=model, messages=messages, stream=True, **request_params
+    )
+    result = None
+    reasoning_tokens = 0
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            delta = choice.delta
+            text = getattr(delta, "content", None) if delta is not None else None
+            # 部分服务商把思考内容放在单独的 reasoning_content 字段，直接丢弃
+            reasoning = getattr(delta, "reasoning_content", None) if delta is not None else None
+            if reasoning:
+                reasoning_tokens += estimate_tokens(reasoning)
+            if "ttft" not in timings and (text or reasoning):
+                timings["ttft"] = round(time.monotonic() - started, 3)
+            if text:
+                result = extractor.feed(text)
+                if result is not None:
+                    timings["time_to_json"] = round(time.monotonic() - started, 3)
+                    break
+            if choice.finish_reason == "length":
+                raise StreamAbort("输出达到长度上限，JSON 不完整")
+    finally:
+        await stream.close()
+
+    if result is None:
+        raise StreamAbort("流式响应已结束，但未得到完整的 JSON 对象")
+    return result, extractor.consumed_tokens + reasoning_tokens
+
+
+async def _call_model(
+    model: str,
+    messages: list[dict],
+    request_params: dict,
+    priority: int,
+    budget: dict,
+    timings: dict | None = None
+) -> str:
+    """调用一次模型并记录其延迟与成败，供路由器使用。失败时抛出异常。"""
+    base_url = str(client.base_url)
+    timings = timings if timings is not None else {}
+    async with admission.slot(model, budget["prompt_tokens"], priority):
+        logger.info(f"向 OpenAI API 发送请求: model={model}, base_url={base_url}")
+        started = time.monotonic()
+        try:
+            if settings.AI_STREAMING_ENABLED:
+                ret, completion_tokens = await _consume_stream(model, messages, request_params, timings)
+            else:
+                response = await client.chat.completions.create(
+                    model=model, messages=messages, **request_params
+                )
+                ai_message = response.choices[0].message.content
+                if not ai_message:
+                    raise ValueError("AI 响应为空")
+                usage = getattr(response, "usage", None)
+                completion_tokens = getattr(usage, "completion_tokens", None) or 0
+        except asyncio.CancelledError:
+            # 被对冲请求取消：已耗时只是被截断的延迟，不计入路由器的样本，只记录指标
+            LLM_CALL_SECONDS.labels(model, "cancelled").observe(time.monotonic() - started)
+            raise
+        except Exception:
+            elapsed = time.monotonic() - started
+            model_router.record(model, base_url, elapsed, ok=False)
+            LLM_CALL_SECONDS.labels(model, "error").observe(elapsed)
+            raise
+        elapsed = time.monotonic() - started
+        model_router.record(model, base_url, elapsed, ok=True)
+        LLM_CALL_SECONDS.labels(model, "ok").observe(elapsed)
+        timings["completion_tokens"] = completion_tokens
 
+    admission.record_usage(model, completion_tokens)
+    LLM_TOKENS.labels(model, "prompt").inc(budget["prompt_tokens"])
+    LLM_TOKENS.labels(model, "completion").inc(completion_tokens)
+    if settings.AI_STREAMING_ENABLED:
+        return ret
+
+    ret = ai_message.strip()
+    if "<think>" in ret and "</think>" in ret:
+        ret = ret[ret.rfind("</think>") + 8 :].strip()
+    return ret
+
+
+def _merge_timings(call_info: dict | None, timings: dict):
+    if call_info is not None:
+        call_info.update(timings)
+
+
+async def _call_with_hedge(
+    primary: str,
+    options: list[str],
+    messages: list[dict],
+    request_params: dict,
+    priority: int,
+    budget: dict,
+    call_info: dict | None
+) -> tuple[str, str]:
+    """
+    向 primary 发送请求；若其耗时超过历史延迟分位数，再向另一个模型发送对冲请求，
+    采用先成功返回的结果并取消另一个。返回 (响应, 实际应答的模型)。
+    """
+    base_url = str(client.base_url)
+    delay = model_router.hedge_delay(primary, base_url) if settings.AI_HEDGE_ENABLED else None
+    timings: dict[str, dict] = {primary: {}}
+    if delay is None or len(options) < 2:
+        ret = await _call_model(primary, messages, request_params, priority, budget, timings[primary])
+        _merge_timings(call_info, timings[primary])
+        return ret, primary
+
+    tasks: dict[asyncio.Task, str] = {}
+    error: BaseException | None = None
+    try:
+        # 任务在 try 内创建：调用方在对冲等待期间被取消时，finally 同样会取消已发出的请求，释放准入名额
+        tasks[asyncio.create_task(_call_model(primary, messages, request_params, priority, budget, timings[primary]))] = primary
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            secondary = model_router.choose(options, base_url, exclude=[primary])
+            logger.info(f"模型 {primary} 超过 {delay:.2f}s 未响应，对冲请求 {secondary}")
+            if call_info is not None:
+                call_info["hedged"] = True
+            timings[secondary] = {}
+            tasks[asyncio.create_task(_call_model(secondary, messages, request_params, priority, budget, timings[secondary]))] = secondary
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    _merge_timings(call_info, timings[tasks[task]])
+                    return task.result(), tasks[task]
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def _request_with_retries(
+    messages: list[dict],
+    model: str,
+    request_params: dict,
+    call_info: dict | None,
+    priority: int,
+    budget: dict
+) -> str:
+    """带指数退避重试地调用模型。失败时返回以 "错误：" 开头的字符串。"""
     max_retries = 7
     base_delay = 1  # 基础延迟时间（秒）
+    model_options = [m.strip() for m in model.split(",") if m.strip()] or [model]
+    last_failed: str | None = None
 
     for attempt in range(max_retries):
-        _model = model
-        if "," in model:
-            model_options = [m.strip() for m in model.split(",") if m.strip()]
-            if model_options:
-                if attempt == 0:
-                    _model = model_options[0]
-                    logger.debug(f"首次尝试使用模型: {_model}")
-                else:
-                    _model = random.choice(model_options)
-                    logger.debug(f"从列表中选择模型: {_model}")
+        # 多个模型时按延迟与健康度选择；重试时避开上一次失败的模型
+        _model = model_router.choose(model_options, str(client.base_url), exclude=[last_failed] if last_failed else [])
+        logger.debug(f"尝试 {attempt + 1} 使用模型: {_model}")
+        if call_info is not None:
+            call_info["attempts"] = attempt + 1
         try:
-            logger.info(f"向 OpenAI API 发送请求: model={_model}, base_url={client.base_url}")
-            response = await client.chat.completions.create(
-                model=_model, messages=messages
+            ret, answered_by = await _call_with_hedge(
+                _model, model_options, messages, request_params, priority, budget, call_info
             )
-            ai_message = response.choices[0].message.content
-            if not ai_message:
-                raise ValueError("AI 响应为空")
-            ret = ai_message.strip()
-            if "<think>" in ret and "</think>" in ret:
-                ret = ret[ret.rfind("</think>") + 8 :].strip()
-
+            if call_info is not None:
+                call_info["model"] = answered_by
             return ret
 
         except APIError as e:
+            last_failed = _model
             logger.error(f"OpenAI API 错误 (尝试 {attempt + 1}/{max_retries}): {e}")
             if attempt == max_retries - 1:
                 return f"错误：AI服务出现问题。详情: {e}"
@@ -117,7 +510,15 @@ async def get_ai_response(
             delay = base_delay * (2**attempt) + random.uniform(0, 1)
             await asyncio.sleep(delay)
 
+        except StreamAbort as e:
+            # 流式输出已无法产生有效 JSON：立即重试，无需退避
+            last_failed = _model
+            logger.warning(f"流式响应提前中止 (尝试 {attempt + 1}/{max_retries}): {e}")
+            if attempt == max_retries - 1:
+                return f"错误：模型未返回有效 JSON。详情: {e}"
+
         except Exception as e:
+            last_failed = _model
             logger.error(
                 f"联系OpenAI时发生意外错误 (尝试 {attempt + 1}/{max_retries}): {e}"
             )
@@ -0,0 +1,167 @@
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from core.config import settings
+from core.database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# 可移植的建表语句 (MySQL 与 SQLite 通用)；MySQL 部署以 schema.sql 为准
+NODES_DDL = (
+    "CREATE TABLE IF NOT EXISTS scheduler_nodes ("
+    "node_id VARCHAR(64) PRIMARY KEY, hostname VARCHAR(255), pid INT, "
+    "started_at DOUBLE NOT NULL, heartbeat_at DOUBLE NOT NULL)"
+)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.sha1(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """带虚拟节点的一致性哈希环：节点增减时只有约 1/N 的任务换主。"""
+
+    def __init__(self, nodes: List[str], vnodes: int = 64):
+        self.nodes = sorted(nodes)
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._keys = [p[0] for p in points]
+        self._owners = [p[1] for p in points]
+
+    def owner(self, task_id: int) -> Optional[str]:
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(f"task:{task_id}")) % len(self._keys)
+        return self._owners[index]
+
+
+class ClusterMembership:
+    """
+    基于数据库租约的集群成员管理。
+
+    每个节点定期在 scheduler_nodes 中刷新心跳；心跳在 (租约 - 心跳间隔) 内的节点视为存活，
+    因此节点失联后最迟一个租约周期内，其余节点就会在下一次心跳时重建哈希环并接管它的任务。
+    节点之间依赖时钟同步 (NTP)。
+    """
+
+    def __init__(self, node_id: Optional[str] = None, connect: Callable = get_db_connection,
+                 placeholder: str = "%s"):
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.started_at = time.time()
+        self._connect = connect
+        self._placeholder = placeholder
+        self.ring = HashRing([self.node_id], settings.CLUSTER_VIRTUAL_NODES)
+        self.live_nodes: List[str] = [self.node_id]
+        self.heartbeats = 0
+        self.heartbeat_failures = 0
+        self.membership_changes = 0
+        self.last_heartbeat = 0.0
+
+    @property
+    def lease_seconds(self) -> float:
+        return settings.CLUSTER_LEASE_SECONDS
+
+    @property
+    def heartbeat_interval(self) -> float:
+        return settings.CLUSTER_LEASE_SECONDS / 3.0
+
+    def _sql(self, query: str) -> str:
+        return query if self._placeholder == "%s" else query.replace("%s", self._placeholder)
+
+    def heartbeat(self) -> bool:
+        """
+        刷新本节点租约并读取存活节点 (同步，异步代码应通过 db_executor 调用)。
+        成员变化时重建哈希环并返回 True。
+        """
+        conn = self._connect()
+        if not conn:
+            self.heartbeat_failures += 1
+            logger.error("集群心跳失败：无法获取数据库连接。")
+            return False
+        try:
+            now = time.time()
+            cursor = conn.cursor()
+            cursor.execute(
+                self._sql("UPDATE scheduler_nodes SET heartbeat_at = %s WHERE node_id = %s"),
+                (now, self.node_id)
+            )
+            if cursor.rowcount == 0:
+                cursor.execute(
+                    self._sql(
+                        "INSERT INTO scheduler_nodes (node_id, hostname, pid, started_at, heartbeat_at) "
+                        "VALUES (%s, %s, %s, %s, %s)"
+                    ),
+                    (self.node_id, socket.gethostname(), os.getpid(), self.started_at, now)
+                )
+                logger.info(f"集群节点 {self.node_id} 已注册。")
+            cursor.execute(
+                self._sql("SELECT node_id FROM scheduler_nodes WHERE heartbeat_at >= %s"),
+                (now - (self.lease_seconds - self.heartbeat_interval),)
+            )
+            live = sorted({row[0] for row in cursor.fetchall()} | {self.node_id})
+            # 清理早已过期的节点记录
+            cursor.execute(
+                self._sql("DELETE FROM scheduler_nodes WHERE heartbeat_at < %s"),
+                (now - 10 * self.lease_seconds,)
+            )
+            conn.commit()
+        except Exception as e:
+            self.heartbeat_failures += 1
+            logger.error(f"集群心跳失败: {e}", exc_info=True)
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+
+        self.heartbeats += 1
+        self.last_heartbeat = now
+        if live == self.live_nodes:
+            return False
+        joined = set(live) - set(self.live_nodes)
+        left = set(self.live_nodes) - set(live)
+        self.live_nodes = live
+        self.ring = HashRing(live, settings.CLUSTER_VIRTUAL_NODES)
+        self.membership_changes += 1
+        logger.info(f"集群成员变化: 加入 {sorted(joined)}, 离开 {sorted(left)}, 当前 {len(live)} 个节点。")
+        return True
+
+    def leave(self):
+        """正常退出时删除本节点租约，其他节点下一次心跳即可接管。"""
+        conn = self._connect()
+        if not conn:
+            return
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self._sql("DELETE FROM scheduler_nodes WHERE node_id = %s"), (self.node_id,))
+            conn.commit()
+            logger.info(f"集群节点 {self.node_id} 已注销。")
+        except Exception as e:
+            logger.error(f"注销集群节点失败: {e}")
+        finally:
+            conn.close()
+
+    def owns(self, task_id: int) -> bool:
+        return self.ring.owner(task_id) == self.node_id
+
+    def stats(self, task_ids: Optional[List[int]] = None) -> Dict:
+        data = {
+            "node_id": self.node_id,
+            "live_nodes": self.live_nodes,
+            "lease_seconds": self.lease_seconds,
+            "heartbeats": self.heartbeats,
+            "heartbeat_failures": self.heartbeat_failures,
+            "membership_changes": self.membership_changes,
+            "seconds_since_heartbeat": round(time.time() - self.last_heartbeat, 1) if self.last_heartbeat else None,
+        }
+        if task_ids is not None:
+            data["owned_tasks"] = sum(1 for task_id in task_ids if self.owns(task_id))
+        return data
+
+
+cluster = ClusterMembership(settings.CLUSTER_NODE_ID)
+
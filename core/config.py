@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import model_validator
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     # --- 数据库设置 ---
@@ -11,15 +11,95 @@ class Settings(BaseSettings):
     DB_USER: Optional[str] = None
     DB_PASSWORD: Optional[str] = None
     DB_NAME: Optional[str] = None
+    DB_POOL_SIZE: int = 10  # 连接池大小，同时也是异步代码使用的数据库线程池大小
+    RESULT_WRITER_BATCH_SIZE: int = 50  # 分析结果每批最多写入的条数
+    RESULT_WRITER_FLUSH_INTERVAL: float = 0.2  # 首条结果到达后最多等待多久凑批 (秒)
+    TASK_RUN_LEDGER_ENABLED: bool = True  # 是否把每次分析运行的分阶段耗时写入 task_runs 表
+    TASK_RUN_BATCH_SIZE: int = 100  # 运行记录每批最多写入的条数
+    TASK_RUN_FLUSH_INTERVAL: float = 5.0  # 运行记录最多缓冲多久再写入 (秒)
+    TASK_RUN_MAX_PENDING: int = 10000  # 缓冲的运行记录上限，数据库不可用时超出部分直接丢弃
+    TASK_RUN_RETENTION_DAYS: int = 30  # 运行记录保留天数
 
     # --- OpenAI API 设置 ---
     OPENAI_API_KEY: Optional[str] = None
     OPENAI_BASE_URL: str = "https://api.openai.com/v1"
     OPENAI_MODEL: str = "gpt-4-turbo"
+    AI_MAX_CONTEXT_TOKENS: int = 100000  # 发送给模型的上下文上限 (含为响应预留的部分)
+    AI_RESPONSE_RESERVE_TOKENS: int = 4096  # 为模型响应预留的令牌数
+    AI_TOKENIZER_ENCODING: str = "cl100k_base"  # 本地 tiktoken 编码名称
+    AI_MAX_CONCURRENCY: int = 8  # 全局同时进行的模型调用上限
+    AI_MODEL_RPM: int = 0  # 每个模型每分钟请求数上限，0 表示不限制
+    AI_MODEL_TPM: int = 0  # 每个模型每分钟令牌数上限，0 表示不限制
+    AI_MODEL_LIMITS: Dict[str, Dict[str, int]] = {}  # 按模型覆盖，例如 {"gpt-4o": {"rpm": 500, "tpm": 300000}}
+    AI_ROUTER_EWMA_ALPHA: float = 0.2  # 模型延迟/错误率 EWMA 的平滑系数
+    AI_ROUTER_MAX_ERROR_RATE: float = 0.5  # 错误率超过该值的模型视为不健康
+    AI_ROUTER_COOLDOWN_SECONDS: float = 60.0  # 不健康模型在最近一次失败后多久可再次尝试
+    AI_ROUTER_EXPLORE_RATE: float = 0.05  # 随机探索其他健康模型的概率
+    AI_ROUTER_FAILURE_PENALTY_SECONDS: float = 60.0  # 失败的调用按该延迟 (或实际耗时，取较大者) 计入 EWMA
+    AI_HEDGE_ENABLED: bool = False  # 主请求过慢时向另一个模型发送对冲请求
+    AI_HEDGE_PERCENTILE: float = 95.0  # 对冲触发延迟取主模型历史延迟的该分位数
+    AI_HEDGE_MIN_SAMPLES: int = 10  # 样本不足时不做对冲
+    AI_STREAMING_ENABLED: bool = False  # 以流式接收响应，JSON 完整后立即停止
+    AI_STREAM_MAX_PREAMBLE_CHARS: int = 4000  # 思考段之外输出超过该字符数仍无 JSON 时提前中止并重试
+    AI_RESPONSE_CACHE_ENABLED: bool = False  # 相同 (模型, 消息, 参数) 的请求直接复用缓存的响应
+    AI_RESPONSE_CACHE_TTL: float = 900.0  # 缓存有效期 (秒)
+    AI_RESPONSE_CACHE_MAX_ENTRIES: int = 256  # 内存中最多缓存的响应数，超出按 LRU 淘汰
+    AI_RESPONSE_CACHE_FILE: Optional[str] = None  # 可选，SQLite 持久化文件路径
     
     # --- K-line API 设置 ---
     KLINE_API_SECRET_KEY: Optional[str] = None
     KLINE_API_BASE_URL: str = ""
+    KLINE_HTTP_TIMEOUT: float = 15.0
+    KLINE_HTTP_CONNECT_TIMEOUT: float = 5.0
+    KLINE_HTTP_MAX_CONNECTIONS: int = 50
+    KLINE_HTTP_MAX_KEEPALIVE: int = 20
+    KLINE_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    KLINE_HTTP_PER_HOST_LIMIT: int = 10  # 对同一上游主机的最大并发请求数
+    KLINE_CACHE_ENABLED: bool = True  # 启用增量K线缓存
+    KLINE_CACHE_SIZE: int = 100  # 每个 (symbol, type, interval) 保留的K线数量
+
+    # --- 调度器设置 ---
+    SCHEDULER_RECONCILE_INTERVAL: int = 300  # 定期全量对账数据库任务与调度作业的间隔 (秒)
+    SCHEDULER_CHANGE_POLL_INTERVAL: float = 2.0  # 调度进程轮询任务变更通知的间隔 (秒)
+    SCHEDULER_JITTER_SECONDS: float = 30.0  # 按任务ID确定性错开触发时间的窗口 (秒)，应小于最短的 cron 周期
+    SCHEDULER_MAX_STARTS_PER_SECOND: float = 2.0  # 所有分析进程合计每秒最多启动的分析任务数，0 表示不限制
+    SCHEDULER_CATCHUP_POLICY: str = "spread"  # 错过的触发：collapse 合并为一次；spread 全部补跑但按启动速率摊开
+    SCHEDULER_MISFIRE_GRACE_TIME: int = 300  # 超过该秒数的错过触发直接丢弃
+    CLUSTER_ENABLED: bool = False  # 多实例部署时按一致性哈希在存活节点间分配任务
+    CLUSTER_NODE_ID: Optional[str] = None  # 节点ID，默认由主机名与进程号生成
+    CLUSTER_LEASE_SECONDS: float = 15.0  # 节点租约时长；节点失联后最迟该时间内由其他节点接管
+    CLUSTER_VIRTUAL_NODES: int = 64  # 一致性哈希环上每个节点的虚拟节点数
+    ANALYSIS_WORKERS: int = 4  # 本进程内执行分析作业的工作者数，0 表示只入队不执行
+    JOB_POLL_INTERVAL: float = 2.0  # 队列为空时工作者的轮询间隔 (秒)
+    JOB_VISIBILITY_TIMEOUT: int = 600  # 作业租约时长 (秒)；执行者失联超过该时间后作业可被重新领取
+    JOB_MAX_ATTEMPTS: int = 3  # 每个作业最多尝试次数，用完后转入死信
+    JOB_RETRY_BACKOFF: int = 30  # 首次重试的延迟 (秒)，之后按 2 的幂递增
+    JOB_RETENTION_DAYS: int = 7  # 已完成作业的保留天数
+    CANDLE_CLOSE_SETTLE_SECONDS: float = 5.0  # candle_close 任务在周期边界后等待多久再检查上游
+    CANDLE_CLOSE_POLL_INTERVAL: float = 3.0  # 上游尚未收盘时的重试间隔 (秒)
+    CANDLE_CLOSE_MAX_WAIT: float = 60.0  # 最多等待上游收盘的时间 (秒)，超时则跳过本次
+
+    # --- 技术指标设置 ---
+    INDICATOR_ZIGZAG_THRESHOLD: float = 3.0  # Zig-Zag 反转的百分比阈值
+    ANALYSIS_INCLUDE_INDICATORS: bool = False  # 是否将预计算的技术指标注入 Prompt
+    PROMPT_CACHE_TTL: float = 3600.0  # 已解析提示词的缓存有效期 (秒)，最后的兜底
+    PROMPT_CACHE_SYNC_INTERVAL: float = 5.0  # 最多每隔多少秒检查一次 prompts 表是否被其他进程修改
+    KLINE_PROMPT_ENCODING: str = "json"  # K线在 Prompt 中的默认编码: json / csv / fixed / delta
+    
+    # --- 列表分页设置 ---
+    PAGINATION_COUNT_CACHE_TTL: float = 30.0  # 列表总数 COUNT(*) 的缓存有效期 (秒)
+    
+    # --- 日志设置 ---
+    TASK_LOG_FILE: str = "logs/tasks/tasks.jsonl"  # 汇总的分析任务日志 (JSONL)，每天轮转并压缩
+    TASK_LOG_RETENTION_DAYS: int = 14  # 任务日志保留天数
+    
+    # --- 进程拓扑设置 ---
+    APP_ROLE: str = "all"  # 本进程的角色: all (单进程，开发用) / api / scheduler / worker
+    SERVE_HOST: str = "0.0.0.0"
+    SERVE_PORT: int = 8000  # API 端口；manage.py serve 中调度进程使用 +1，分析进程依次使用 +2、+3 ...
+    SERVE_API_WORKERS: int = 0  # API 进程数，0 表示 CPU 核数
+    SERVE_ANALYSIS_PROCESSES: int = 1  # 分析执行进程数，每个进程内有 ANALYSIS_WORKERS 个工作者
+    SERVE_SHUTDOWN_TIMEOUT: float = 60.0  # 停止或重启子进程时等待其优雅退出的时间 (秒)
     
     # --- 应用安全设置 ---
     APP_LOGIN_SECRET_KEY: Optional[str] = None
@@ -27,6 +107,20 @@ class Settings(BaseSettings):
     # model_config 指向 .env 文件
     model_config = SettingsConfigDict(env_file=".env", extra='ignore')
 
+    @property
+    def runs_scheduler(self) -> bool:
+        return self.APP_ROLE in ("all", "scheduler")
+
+    @property
+    def runs_analysis_workers(self) -> bool:
+        return self.APP_ROLE in ("all", "worker")
+
+    @model_validator(mode='after')
+    def check_app_role(self) -> 'Settings':
+        if self.APP_ROLE not in ("all", "api", "scheduler", "worker"):
+            raise ValueError(f"APP_ROLE 必须是 all / api / scheduler / worker 之一，当前为 {self.APP_ROLE!r}")
+        return self
+
     @model_validator(mode='after')
     def assemble_db_connection(self) -> 'Settings':
         if self.DATABASE_URL is None:
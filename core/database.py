@@ -3,6 +3,7 @@ import mysql.connector
 from mysql.connector import pooling
 from urllib.parse import urlparse
 from core.config import settings
+from core.metrics import GaugeFunc
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
@@ -32,6 +33,16 @@ class Direction(str, enum.Enum):
     SHORT = 'SHORT'
     NONE = 'NONE'
 
+class KlineEncoding(str, enum.Enum):
+    JSON = 'json'
+    CSV = 'csv'
+    FIXED = 'fixed'
+    DELTA = 'delta'
+
+class TriggerMode(str, enum.Enum):
+    CRON = 'cron'
+    CANDLE_CLOSE = 'candle_close'
+
 class PlanStatus(str, enum.Enum):
     ACTIVE = 'ACTIVE'
     EXECUTED = 'EXECUTED'
@@ -52,6 +63,7 @@ class Prompt(BaseModel):
     version: int
     content: str
     is_active: bool
+    kline_encoding: Optional[KlineEncoding] = None
     created_at: datetime
 
 class ScheduledTask(BaseModel):
@@ -60,6 +72,8 @@ class ScheduledTask(BaseModel):
     prompt_id: int
     cycle: Cycle
     cron_expression: str
+    kline_encoding: Optional[KlineEncoding] = None
+    trigger_mode: TriggerMode = TriggerMode.CRON
     is_active: bool
     created_at: datetime
     updated_at: datetime
@@ -73,6 +87,8 @@ class TradeAnalysis(BaseModel):
     trend: Optional[str] = None
     confidence: Optional[float] = None
     conclusion: Optional[str] = None
+    kline_encoding: Optional[KlineEncoding] = None
+    prompt_tokens: Optional[int] = None
     extra_info: Optional[dict] = None
 
 class TradePlan(BaseModel):
@@ -99,6 +115,55 @@ class Dictionary(BaseModel):
     label: str
     description: Optional[str] = None
 
+# --- Schema Migrations ---
+
+# schema.sql 只在表不存在时建表；对已有表新增的列在这里登记，init_db 会补齐缺失的列。
+COLUMN_MIGRATIONS = [
+    ("prompts", "kline_encoding", "VARCHAR(20) NULL COMMENT 'K线在Prompt中的编码方式，NULL 表示使用全局默认'"),
+    ("scheduled_tasks", "kline_encoding", "VARCHAR(20) NULL COMMENT 'K线编码方式，非空时覆盖提示词的设置'"),
+    ("scheduled_tasks", "trigger_mode", "VARCHAR(20) NOT NULL DEFAULT 'cron' COMMENT '触发方式: cron 按表达式; candle_close 在该周期K线收盘后触发'"),
+    ("trade_analysis", "kline_encoding", "VARCHAR(20) NULL COMMENT '本次分析使用的K线编码方式'"),
+    ("trade_analysis", "prompt_tokens", "INT NULL COMMENT '本次分析 Prompt 的估算令牌数'"),
+    ("task_runs", "ttft_ms", "INT NULL COMMENT '流式响应的首令牌耗时 (应答模型的单次调用内)'"),
+    ("task_runs", "time_to_json_ms", "INT NULL COMMENT '流式响应中 JSON 完整的耗时'"),
+    ("analysis_jobs", "candle_open_time", "BIGINT NULL COMMENT 'candle_close 任务成功分析的K线开盘时间 (毫秒)'"),
+]
+
+def _apply_column_migrations(cursor):
+    """为已存在的表补齐 COLUMN_MIGRATIONS 中登记的列。"""
+    for table, column, definition in COLUMN_MIGRATIONS:
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+            (table, column)
+        )
+        if cursor.fetchone()[0] == 0:
+            logger.info(f"Adding missing column {table}.{column}")
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+# 同理，对已有表新增的索引登记在这里 (表, 索引名, 列)。
+INDEX_MIGRATIONS = [
+    ("trade_analysis", "idx_timestamp", "timestamp, id"),
+    ("analysis_jobs", "idx_task_candle", "task_id, candle_open_time"),
+    ("trade_plan", "idx_created_at", "created_at"),
+    ("trade_plan", "idx_status_time", "status, created_at"),
+    ("trade_plan", "idx_status_dir_time", "status, direction, created_at"),
+    ("trade_plan", "idx_asset_cycle_status_dir_time", "asset, cycle, status, direction, created_at"),
+    ("trade_plan", "idx_prompt_time", "prompt_id, created_at"),
+]
+
+def _apply_index_migrations(cursor):
+    """为已存在的表补齐 INDEX_MIGRATIONS 中登记的索引。"""
+    for table, index, columns in INDEX_MIGRATIONS:
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+            (table, index)
+        )
+        if cursor.fetchone()[0] == 0:
+            logger.info(f"Adding missing index {table}.{index} ({columns})")
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX {index} ({columns})")
+
 # --- Database Connection ---
 
 def init_connection_pool():
@@ -121,7 +186,7 @@ def init_connection_pool():
 
         connection_pool = pooling.MySQLConnectionPool(
             pool_name="mysql_pool",
-            pool_size=10,
+            pool_size=settings.DB_POOL_SIZE,
             **db_config
         )
         logger.info(f"MySQL connection pool '{connection_pool.pool_name}' created successfully.")
@@ -137,6 +202,15 @@ def close_connection_pool():
         logger.info("MySQL connection pool will be managed by the connector's lifecycle.")
         connection_pool = None
 
+def _pool_in_use() -> Optional[int]:
+    # 连接池空闲连接放在内部队列里；正在使用的连接数 = 池大小 - 空闲数
+    if connection_pool is None:
+        return None
+    return connection_pool.pool_size - connection_pool._cnx_queue.qsize()
+
+GaugeFunc("db_pool_in_use", "MySQL 连接池中正在使用的连接数 (含同步 API 路由)", _pool_in_use)
+GaugeFunc("db_pool_size", "MySQL 连接池大小", lambda: connection_pool.pool_size if connection_pool else None)
+
 def get_db_connection():
     """从连接池获取一个数据库连接。"""
     if connection_pool is None:
@@ -168,7 +242,9 @@ def init_db():
         for statement in sql_script.split(';'):
             if statement.strip():
                 cursor.execute(statement)
-        
+
+        _apply_column_migrations(cursor)
+        _apply_index_migrations(cursor)
         conn.commit()
         logger.info("Database schema checked/created successfully.")
 
@@ -0,0 +1,93 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from core.config import settings
+from core.metrics import DB_POOL_WAIT_SECONDS, GaugeFunc
+
+logger = logging.getLogger(__name__)
+
+
+class DBExecutor:
+    """
+    专用于数据库访问的有界线程池。
+
+    mysql.connector 是同步驱动，直接在协程中调用会阻塞事件循环 (调度器与 API 同时停顿)。
+    异步代码通过 `await db_executor.run(fn, ...)` 把整段数据库操作 (取连接、执行、提交、归还)
+    放到这里执行。线程数与连接池大小一致，因此异步路径永远不会把连接池耗尽；
+    超出部分在线程池队列中等待，而不是像连接池那样直接报 "pool exhausted"。
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.active = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="db")
+        return self._executor
+
+    def _wrap(self, fn: Callable[..., Any], submitted_at: float) -> Any:
+        wait = time.perf_counter() - submitted_at
+        DB_POOL_WAIT_SECONDS.observe(wait)
+        with self._lock:
+            self.active += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        try:
+            result = fn()
+        except BaseException:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+        return result
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """在数据库线程池中执行同步函数并等待其结果。"""
+        loop = asyncio.get_running_loop()
+        # 带上调用方的上下文 (例如分析运行ID)，线程中产生的日志也能归属到这次运行
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        self.submitted += 1
+        return await loop.run_in_executor(
+            self._get_executor(), self._wrap, call, time.perf_counter()
+        )
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            logger.info("正在关闭数据库线程池...")
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "active": self.active,
+            "queued": self.submitted - self.completed - self.active,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait": round(self.total_wait / self.completed, 4) if self.completed else 0.0,
+            "max_wait": round(self.max_wait, 4),
+        }
+
+
+db_executor = DBExecutor(settings.DB_POOL_SIZE)
+GaugeFunc("db_executor_in_use", "数据库线程池中正在执行的操作数 (即异步路径占用的连接数)", lambda: db_executor.active)
+GaugeFunc("db_executor_queued", "数据库线程池中排队等待的操作数", lambda: db_executor.submitted - db_executor.completed - db_executor.active)
+
@@ -0,0 +1,488 @@
+import logging
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from core.config import settings
+from core.kline_cache import INTERVAL_MS
+from core.kline_series import KlineSeries
+
+logger = logging.getLogger(__name__)
+
+EMA_PERIODS = (20, 50)
+SMA_PERIOD = 20
+RSI_PERIOD = 14
+ATR_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BOLL_PERIOD, BOLL_STD = 20, 2.0
+SWING_WINDOW = 2
+SUMMARY_PIVOTS = 6
+
+
+# ==============================================================================
+# 向量化指标计算 (整段数组一次完成)
+# ==============================================================================
+
+def _ewm(values: np.ndarray, alpha: float, init: float) -> np.ndarray:
+    """
+    递推式 y[t] = (1 - alpha) * y[t-1] + alpha * x[t] 的向量化实现。
+
+    按块展开为 cumsum 的闭式解；块大小保证 beta^-k 不超过 1e12，以保持数值精度。
+    """
+    n = values.shape[0]
+    out = np.empty(n, dtype=np.float64)
+    if n == 0:
+        return out
+    beta = 1.0 - alpha
+    if beta <= 0.0:
+        out[:] = values
+        return out
+    block = max(1, int(12 * math.log(10) / -math.log(beta)))
+    prev = init
+    for start in range(0, n, block):
+        chunk = values[start:start + block]
+        k = np.arange(1, chunk.shape[0] + 1, dtype=np.float64)
+        decay = beta ** k
+        out[start:start + chunk.shape[0]] = decay * (prev + alpha * np.cumsum(chunk / decay))
+        prev = out[start + chunk.shape[0] - 1]
+    return out
+
+
+def _seeded_ewm(values: np.ndarray, period: int, alpha: float) -> np.ndarray:
+    """以前 `period` 个值的均值作为种子的 EMA，种子之前的位置为 NaN。"""
+    out = np.full(values.shape[0], np.nan)
+    valid = np.flatnonzero(~np.isnan(values))
+    if valid.size < period:
+        return out
+    first = valid[0]
+    seed_end = first + period
+    out[seed_end - 1] = values[first:seed_end].mean()
+    out[seed_end:] = _ewm(values[seed_end:], alpha, out[seed_end - 1])
+    return out
+
+
+def sma(values: np.ndarray, period: int) -> np.ndarray:
+    out = np.full(values.shape[0], np.nan)
+    if values.shape[0] >= period:
+        csum = np.cumsum(np.insert(values, 0, 0.0))
+        out[period - 1:] = (csum[period:] - csum[:-period]) / period
+    return out
+
+
+def ema(values: np.ndarray, period: int) -> np.ndarray:
+    return _seeded_ewm(values, period, 2.0 / (period + 1))
+
+
+def _wilder(values: np.ndarray, period: int) -> np.ndarray:
+    return _seeded_ewm(values, period, 1.0 / period)
+
+
+def _rsi_components(close: np.ndarray, period: int) -> Tuple[np.ndarray, np.ndarray]:
+    delta = np.diff(close, prepend=np.nan)
+    gains = np.where(delta > 0, delta, 0.0)
+    losses = np.where(delta < 0, -delta, 0.0)
+    gains[0] = losses[0] = np.nan
+    return _wilder(gains, period), _wilder(losses, period)
+
+
+def _rsi_from_averages(avg_gain, avg_loss):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        return np.where(avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + rs))
+
+
+def rsi(close: np.ndarray, period: int = RSI_PERIOD) -> np.ndarray:
+    return _rsi_from_averages(*_rsi_components(close, period))
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    prev_close = np.roll(close, 1)
+    tr = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+    if tr.shape[0]:
+        tr[0] = high[0] - low[0]
+    return tr
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = ATR_PERIOD) -> np.ndarray:
+    return _wilder(true_range(high, low, close), period)
+
+
+def macd(close: np.ndarray, fast: int = MACD_FAST, slow: int = MACD_SLOW, signal: int = MACD_SIGNAL):
+    fast_ema = ema(close, fast)
+    slow_ema = ema(close, slow)
+    line = fast_ema - slow_ema
+    signal_line = ema(line, signal)
+    return fast_ema, slow_ema, line, signal_line, line - signal_line
+
+
+def bollinger(close: np.ndarray, period: int = BOLL_PERIOD, num_std: float = BOLL_STD):
+    middle = np.full(close.shape[0], np.nan)
+    width = np.full(close.shape[0], np.nan)
+    if close.shape[0] >= period:
+        windows = sliding_window_view(close, period)
+        middle[period - 1:] = windows.mean(axis=1)
+        width[period - 1:] = windows.std(axis=1) * num_std
+    return middle + width, middle, middle - width
+
+
+def swing_points(high: np.ndarray, low: np.ndarray, window: int = SWING_WINDOW) -> Tuple[np.ndarray, np.ndarray]:
+    """返回摆动高点与低点的索引：该K线的高/低点是左右各 `window` 根内的极值。"""
+    size = 2 * window + 1
+    if high.shape[0] < size:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    center = high[window:high.shape[0] - window]
+    highs = np.flatnonzero(center >= sliding_window_view(high, size).max(axis=1)) + window
+    center = low[window:low.shape[0] - window]
+    lows = np.flatnonzero(center <= sliding_window_view(low, size).min(axis=1)) + window
+    return highs, lows
+
+
+def zigzag(high: np.ndarray, low: np.ndarray, threshold: float = 3.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Zig-Zag 转折点，语义与 `zigzag_implementation.md` 中逐K线的 `calculate_zigzag` 一致。
+
+    每段趋势内用累计极值 (maximum/minimum.accumulate) 一次定位反转K线，
+    因此 Python 层的循环次数等于转折点数量，而不是K线数量。
+    返回 (转折点索引, 转折点价格)。
+    """
+    n = high.shape[0]
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    up = high[1:] > high[0]
+    down = low[1:] < low[0]
+    moved = np.flatnonzero(up | down)
+    if moved.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    start = int(moved[0]) + 1
+    trend = 1 if up[start - 1] else -1
+    extreme, extreme_idx = (high[0], 0) if trend == 1 else (low[0], 0)
+
+    ratio = threshold / 100.0
+    indices, prices = [], []
+    while True:
+        # 逐步扩大前瞻窗口，每段只扫描到反转点附近，总成本与K线数量成线性
+        window = 64
+        while True:
+            stop = min(n, start + window)
+            if trend == 1:
+                run = np.maximum.accumulate(np.maximum(high[start:stop], extreme))
+                prev = np.concatenate(([extreme], run[:-1]))
+                reversal = (high[start:stop] <= prev) & (low[start:stop] < prev * (1 - ratio))
+            else:
+                run = np.minimum.accumulate(np.minimum(low[start:stop], extreme))
+                prev = np.concatenate(([extreme], run[:-1]))
+                reversal = (low[start:stop] >= prev) & (high[start:stop] > prev * (1 + ratio))
+            hits = np.flatnonzero(reversal)
+            if hits.size or stop == n:
+                break
+            window *= 4
+
+        end = int(hits[0]) if hits.size else stop - start
+        # 极值所在索引：段内第一次严格刷新极值的位置
+        segment = high[start:start + end] if trend == 1 else low[start:start + end]
+        if segment.size:
+            best = int(np.argmax(segment) if trend == 1 else np.argmin(segment))
+            if (segment[best] > extreme) if trend == 1 else (segment[best] < extreme):
+                extreme, extreme_idx = segment[best], start + best
+
+        indices.append(extreme_idx)
+        prices.append(extreme)
+        if not hits.size:
+            break
+        pivot = start + end
+        trend = -trend
+        extreme, extreme_idx = (high[pivot], pivot) if trend == 1 else (low[pivot], pivot)
+        start = pivot + 1
+        if start >= n:
+            indices.append(extreme_idx)
+            prices.append(extreme)
+            break
+
+    return np.asarray(indices, dtype=np.int64), np.asarray(prices, dtype=np.float64)
+
+
+# ==============================================================================
+# 特征汇总与增量更新
+# ==============================================================================
+
+class IndicatorState:
+    """递推型指标 (EMA/MACD/RSI/ATR) 在最后一根已收盘K线处的状态。"""
+
+    __slots__ = ("open_time", "close", "ema", "macd_fast", "macd_slow", "macd_signal", "avg_gain", "avg_loss", "atr")
+
+    def __init__(self, open_time, close, ema, macd_fast, macd_slow, macd_signal, avg_gain, avg_loss, atr):
+        self.open_time = open_time
+        self.close = close
+        self.ema = ema
+        self.macd_fast = macd_fast
+        self.macd_slow = macd_slow
+        self.macd_signal = macd_signal
+        self.avg_gain = avg_gain
+        self.avg_loss = avg_loss
+        self.atr = atr
+
+    def step(self, open_time: int, high: float, low: float, close: float) -> "IndicatorState":
+        """用一根新K线推进状态，O(1)。"""
+        def _ema(prev, value, period):
+            return prev + (2.0 / (period + 1)) * (value - prev)
+
+        def _wilder_step(prev, value, period):
+            return prev + (value - prev) / period
+
+        delta = close - self.close
+        fast = _ema(self.macd_fast, close, MACD_FAST)
+        slow = _ema(self.macd_slow, close, MACD_SLOW)
+        tr = max(high - low, abs(high - self.close), abs(low - self.close))
+        return IndicatorState(
+            open_time=open_time,
+            close=close,
+            ema={period: _ema(value, close, period) for period, value in self.ema.items()},
+            macd_fast=fast,
+            macd_slow=slow,
+            macd_signal=_ema(self.macd_signal, fast - slow, MACD_SIGNAL),
+            avg_gain=_wilder_step(self.avg_gain, max(delta, 0.0), RSI_PERIOD),
+            avg_loss=_wilder_step(self.avg_loss, max(-delta, 0.0), RSI_PERIOD),
+            atr=_wilder_step(self.atr, tr, ATR_PERIOD),
+        )
+
+    def values(self) -> dict:
+        line = self.macd_fast - self.macd_slow
+        rsi_value = float(_rsi_from_averages(np.float64(self.avg_gain), np.float64(self.avg_loss)))
+        result = {f"ema{period}": value for period, value in self.ema.items()}
+        result.update({
+            "rsi14": rsi_value,
+            "atr14": self.atr,
+            "macd": {"macd": line, "signal": self.macd_signal, "hist": line - self.macd_signal},
+        })
+        return result
+
+
+def _round(value) -> Optional[float]:
+    if value is None:
+        return None
+    value = float(value)
+    return None if math.isnan(value) else round(value, 8)
+
+
+def _round_tree(obj):
+    if isinstance(obj, dict):
+        return {k: _round_tree(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_round_tree(v) for v in obj]
+    if isinstance(obj, (int, np.integer)) and not isinstance(obj, bool):
+        return int(obj)
+    return _round(obj)
+
+
+def _closed_count(series: KlineSeries, interval: str, now_ms: int) -> int:
+    interval_ms = INTERVAL_MS.get(interval)
+    if not len(series) or interval_ms is None:
+        return len(series)
+    return len(series) - (1 if int(series.open_time[-1]) + interval_ms > now_ms else 0)
+
+
+def recursive_indicators(series: KlineSeries) -> Dict[str, np.ndarray]:
+    """递推型指标：EMA、RSI、ATR、MACD。"""
+    close = series.close
+    avg_gain, avg_loss = _rsi_components(close, RSI_PERIOD)
+    fast_ema, slow_ema, macd_line, signal_line, hist = macd(close)
+    result = {f"ema{period}": ema(close, period) for period in EMA_PERIODS}
+    result.update({
+        "avg_gain": avg_gain,
+        "avg_loss": avg_loss,
+        "rsi14": _rsi_from_averages(avg_gain, avg_loss),
+        "atr14": atr(series.high, series.low, close, ATR_PERIOD),
+        "macd_fast": fast_ema,
+        "macd_slow": slow_ema,
+        "macd": macd_line,
+        "macd_signal": signal_line,
+        "macd_hist": hist,
+    })
+    return result
+
+
+def window_indicators(series: KlineSeries, zigzag_threshold: Optional[float] = None) -> Dict[str, np.ndarray]:
+    """窗口型指标：SMA、布林带、摆动高低点、Zig-Zag 转折点。"""
+    threshold = zigzag_threshold if zigzag_threshold is not None else settings.INDICATOR_ZIGZAG_THRESHOLD
+    upper, middle, lower = bollinger(series.close)
+    swing_highs, swing_lows = swing_points(series.high, series.low)
+    zz_idx, zz_price = zigzag(series.high, series.low, threshold)
+    return {
+        f"sma{SMA_PERIOD}": sma(series.close, SMA_PERIOD),
+        "boll_upper": upper,
+        "boll_middle": middle,
+        "boll_lower": lower,
+        "swing_highs": swing_highs,
+        "swing_lows": swing_lows,
+        "zigzag_idx": zz_idx,
+        "zigzag_price": zz_price,
+    }
+
+
+def compute_indicators(series: KlineSeries, zigzag_threshold: Optional[float] = None) -> Dict[str, np.ndarray]:
+    """对整段K线一次性计算全部指标。"""
+    return {**recursive_indicators(series), **window_indicators(series, zigzag_threshold)}
+
+
+def _state_at(series: KlineSeries, arrays: Dict[str, np.ndarray], idx: int) -> Optional[IndicatorState]:
+    keys = [f"ema{p}" for p in EMA_PERIODS] + ["macd_fast", "macd_slow", "macd_signal", "avg_gain", "avg_loss", "atr14"]
+    if idx < 0 or any(np.isnan(arrays[k][idx]) for k in keys):
+        return None
+    return IndicatorState(
+        open_time=int(series.open_time[idx]),
+        close=float(series.close[idx]),
+        ema={p: float(arrays[f"ema{p}"][idx]) for p in EMA_PERIODS},
+        macd_fast=float(arrays["macd_fast"][idx]),
+        macd_slow=float(arrays["macd_slow"][idx]),
+        macd_signal=float(arrays["macd_signal"][idx]),
+        avg_gain=float(arrays["avg_gain"][idx]),
+        avg_loss=float(arrays["avg_loss"][idx]),
+        atr=float(arrays["atr14"][idx]),
+    )
+
+
+def _window_features(series: KlineSeries, arrays: Dict[str, np.ndarray]) -> dict:
+    """基于窗口的指标 (SMA、布林带、摆动点、Zig-Zag) 的最新值。"""
+    times = series.open_time
+    return {
+        f"sma{SMA_PERIOD}": arrays[f"sma{SMA_PERIOD}"][-1],
+        "bollinger": {
+            "upper": arrays["boll_upper"][-1],
+            "middle": arrays["boll_middle"][-1],
+            "lower": arrays["boll_lower"][-1],
+        },
+        "swing_highs": [[times[i], series.high[i]] for i in arrays["swing_highs"][-3:]],
+        "swing_lows": [[times[i], series.low[i]] for i in arrays["swing_lows"][-3:]],
+        "zigzag": [[times[i], p] for i, p in zip(arrays["zigzag_idx"][-SUMMARY_PIVOTS:], arrays["zigzag_price"][-SUMMARY_PIVOTS:])],
+    }
+
+
+class IndicatorEngine:
+    """
+    为每个 (symbol, asset_type, interval) 维护递推指标状态。
+
+    新的K线收盘后只需 O(1) 推进 EMA/MACD/RSI/ATR；窗口型指标在缓存窗口上向量化重算。
+    状态无法衔接 (首次运行、数据断档) 时回退为整段计算。
+    """
+
+    def __init__(self):
+        self._states: Dict[tuple, IndicatorState] = {}
+        self.full_computes = 0
+        self.incremental_updates = 0
+
+    def features(self, key: tuple, series: KlineSeries, now_ms: Optional[int] = None) -> dict:
+        if not len(series):
+            return {}
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        closed = _closed_count(series, key[-1], now_ms)
+        window = _window_features(series, window_indicators(series))
+
+        state = self._states.get(key)
+        start = None
+        if state is not None:
+            pos = int(np.searchsorted(series.open_time, state.open_time))
+            # 状态必须落在本次窗口内且不晚于最后一根已收盘K线
+            if pos < closed and int(series.open_time[pos]) == state.open_time:
+                start = pos + 1
+
+        if start is None:
+            arrays = recursive_indicators(series)
+            self.full_computes += 1
+            state = _state_at(series, arrays, closed - 1)
+            if state is None:
+                # 数据不足以给出递推指标的种子值，直接返回数组末尾 (可能为 NaN)
+                latest = {f"ema{p}": arrays[f"ema{p}"][-1] for p in EMA_PERIODS}
+                latest.update({
+                    "rsi14": arrays["rsi14"][-1],
+                    "atr14": arrays["atr14"][-1],
+                    "macd": {"macd": arrays["macd"][-1], "signal": arrays["macd_signal"][-1], "hist": arrays["macd_hist"][-1]},
+                })
+                return _round_tree({"close": series.close[-1], **latest, **window})
+        else:
+            for i in range(start, closed):
+                state = state.step(int(series.open_time[i]), float(series.high[i]), float(series.low[i]), float(series.close[i]))
+            self.incremental_updates += 1
+
+        self._states[key] = state
+        current = state
+        if closed < len(series):
+            # 未收盘K线只做临时推进，不写回状态
+            i = len(series) - 1
+            current = state.step(int(series.open_time[i]), float(series.high[i]), float(series.low[i]), float(series.close[i]))
+        return _round_tree({"close": series.close[-1], **current.values(), **window})
+
+    def compute_all(self, symbol: str, asset_type: int, kline_data: Dict[str, KlineSeries]) -> Dict[str, dict]:
+        """一次性计算所有周期的特征，供 Prompt 注入。"""
+        return {
+            interval: self.features((symbol, asset_type, interval), series)
+            for interval, series in kline_data.items()
+            if len(series)
+        }
+
+    def stats(self) -> dict:
+        return {
+            "states": len(self._states),
+            "full_computes": self.full_computes,
+            "incremental_updates": self.incremental_updates,
+        }
+
+
+# 进程内共享的指标引擎
+indicator_engine = IndicatorEngine()
+
+
+# ==============================================================================
+# 逐K线参考实现：供 scripts/bench_indicators.py 与 tests/test_indicators.py 对比
+# ==============================================================================
+
+def _calculate_zigzag_loop(kline_data: list, threshold: float = 3.0) -> list:
+    """`zigzag_implementation.md` 中的逐K线参考实现，仅用于基准与一致性测试。"""
+    if not kline_data:
+        return []
+    points = []
+    trend = None
+    high_price = kline_data[0]['high']
+    low_price = kline_data[0]['low']
+    for i in range(1, len(kline_data)):
+        current_high = kline_data[i]['high']
+        current_low = kline_data[i]['low']
+        if trend is None:
+            if current_high > high_price:
+                trend = 1
+            elif current_low < low_price:
+                trend = -1
+        if trend == 1:
+            if current_high > high_price:
+                high_price = current_high
+            elif current_low < high_price * (1 - threshold / 100):
+                points.append(high_price)
+                trend = -1
+                low_price = current_low
+        elif trend == -1:
+            if current_low < low_price:
+                low_price = current_low
+            elif current_high > low_price * (1 + threshold / 100):
+                points.append(low_price)
+                trend = 1
+                high_price = current_high
+    if trend == 1:
+        points.append(high_price)
+    elif trend == -1:
+        points.append(low_price)
+    return points
+
+
+def _ema_loop(values: list, period: int) -> list:
+    alpha = 2.0 / (period + 1)
+    out = [float("nan")] * len(values)
+    if len(values) < period:
+        return out
+    out[period - 1] = sum(values[:period]) / period
+    for i in range(period, len(values)):
+        out[i] = out[i - 1] + alpha * (values[i] - out[i - 1])
+    return out
+
@@ -0,0 +1,302 @@
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from core.config import settings
+from core.database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# 作业状态：DEAD 即死信，超过最大尝试次数后停在这里等待人工处理
+PENDING = "PENDING"
+RUNNING = "RUNNING"
+DONE = "DONE"
+DEAD = "DEAD"
+JOB_STATUSES = (PENDING, RUNNING, DONE, DEAD)
+
+JOB_COLUMNS = (
+    "id, task_id, fire_time, payload, status, attempts, max_attempts, available_at, "
+    "lease_token, leased_by, last_error, created_at, started_at, finished_at"
+)
+
+
+def _decode(row: Dict[str, Any]) -> Dict[str, Any]:
+    if isinstance(row.get("payload"), (str, bytes, bytearray)):
+        row["payload"] = json.loads(row["payload"])
+    return row
+
+
+def enqueue_job(task_id: int, fire_time: datetime, payload: Dict[str, Any]) -> bool:
+    """
+    以 (task_id, fire_time) 为幂等键写入一个待执行作业 (同步，异步代码应通过 db_executor 调用)。
+
+    同一次触发重复入队 (例如集群换主期间两个节点都触发了) 只会保留一行，此时返回 False。
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("未能获取数据库连接以写入分析作业。")
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT IGNORE INTO analysis_jobs (task_id, fire_time, payload, status, max_attempts, available_at) "
+            "VALUES (%s, %s, %s, %s, %s, NOW())",
+            (task_id, fire_time.replace(tzinfo=None), json.dumps(payload), PENDING, settings.JOB_MAX_ATTEMPTS)
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def candle_analysed(task_id: int, candle_open_time: int) -> bool:
+    """该任务是否已经成功分析过开盘时间不早于 candle_open_time 的K线 (candle_close 模式)。"""
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("未能获取数据库连接以查询已分析的K线。")
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT 1 FROM analysis_jobs WHERE task_id = %s AND candle_open_time >= %s LIMIT 1",
+            (task_id, candle_open_time)
+        )
+        return cursor.fetchone() is not None
+    finally:
+        conn.close()
+
+
+def record_analysed_candle(job_id: int, candle_open_time: int):
+    """分析成功后把K线开盘时间记到作业行上，供之后的触发判断是否重复。"""
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("未能获取数据库连接以记录已分析的K线。")
+    try:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE analysis_jobs SET candle_open_time = %s WHERE id = %s", (candle_open_time, job_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def reserve_start_slot(interval: float) -> float:
+    """
+    在所有进程间共享的启动节拍上预约下一个时间槽，返回需要等待的秒数。
+
+    槽位记录在 job_start_slots 的一行中并按数据库时钟计算，多个分析进程 (或节点) 合计
+    每 interval 秒只启动一个作业。
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("未能获取数据库连接以预约启动时间。")
+    try:
+        cursor = conn.cursor()
+        cursor.execute("INSERT IGNORE INTO job_start_slots (name, next_slot) VALUES ('analysis', 0)")
+        cursor.execute(
+            "SELECT UNIX_TIMESTAMP(NOW(3)), next_slot FROM job_start_slots WHERE name = 'analysis' FOR UPDATE"
+        )
+        now, next_slot = (float(value) for value in cursor.fetchone())
+        slot = max(now, next_slot)
+        cursor.execute("UPDATE job_start_slots SET next_slot = %s WHERE name = 'analysis'", (slot + interval,))
+        conn.commit()
+        return slot - now
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def claim_jobs(worker_id: str, limit: int) -> List[Dict[str, Any]]:
+    """
+    领取最多 limit 个可见的作业并租用 JOB_VISIBILITY_TIMEOUT 秒。
+
+    可见的作业包括到期的 PENDING 作业，以及租约已过期 (执行者崩溃或失联) 的 RUNNING 作业。
+    使用 FOR UPDATE SKIP LOCKED，多个工作者并发领取时互不阻塞、也不会拿到同一行。
+    每次领取生成新的租约令牌，之前的执行者即使恢复也无法再提交它的结果。
+    过期的作业如果已经用完尝试次数，直接转入死信。
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("未能获取数据库连接以领取分析作业。")
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            "SELECT id, status, attempts, max_attempts FROM analysis_jobs "
+            "WHERE status IN (%s, %s) AND available_at <= NOW() "
+            "ORDER BY available_at LIMIT %s FOR UPDATE SKIP LOCKED",
+            (PENDING, RUNNING, limit)
+        )
+        rows = cursor.fetchall()
+        expired = [row["id"] for row in rows if row["attempts"] >= row["max_attempts"]]
+        claimable = [row["id"] for row in rows if row["attempts"] < row["max_attempts"]]
+        if expired:
+            marks = ", ".join(["%s"] * len(expired))
+            cursor.execute(
+                f"UPDATE analysis_jobs SET status = %s, lease_token = NULL, finished_at = NOW(), "
+                f"last_error = %s WHERE id IN ({marks})",
+                (DEAD, "租约超时且已达到最大尝试次数", *expired)
+            )
+            logger.error(f"作业 {expired} 执行超时且已用完重试次数，已转入死信。")
+        jobs = []
+        if claimable:
+            token = uuid.uuid4().hex
+            marks = ", ".join(["%s"] * len(claimable))
+            cursor.execute(
+                f"UPDATE analysis_jobs SET status = %s, attempts = attempts + 1, lease_token = %s, leased_by = %s, "
+                f"available_at = NOW() + INTERVAL %s SECOND, started_at = NOW() WHERE id IN ({marks})",
+                (RUNNING, token, worker_id, settings.JOB_VISIBILITY_TIMEOUT, *claimable)
+            )
+            cursor.execute(
+                f"SELECT {JOB_COLUMNS} FROM analysis_jobs WHERE id IN ({marks}) ORDER BY available_at",
+                tuple(claimable)
+            )
+            jobs = [_decode(row) for row in cursor.fetchall()]
+        conn.commit()
+        return jobs
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _finish(sql: str, params: tuple) -> bool:
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("未能获取数据库连接以更新分析作业。")
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        conn.commit()
+        return cursor.rowcount > 0
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def extend_lease(job: Dict[str, Any]) -> bool:
+    """为仍在执行的作业续租；租约已被他人接管时返回 False。"""
+    return _finish(
+        "UPDATE analysis_jobs SET available_at = NOW() + INTERVAL %s SECOND "
+        "WHERE id = %s AND lease_token = %s AND status = %s",
+        (settings.JOB_VISIBILITY_TIMEOUT, job["id"], job["lease_token"], RUNNING)
+    )
+
+
+def complete_job(job: Dict[str, Any]) -> bool:
+    """标记作业完成；租约已失效 (作业已被重新领取) 时不做修改并返回 False。"""
+    return _finish(
+        "UPDATE analysis_jobs SET status = %s, lease_token = NULL, last_error = NULL, finished_at = NOW() "
+        "WHERE id = %s AND lease_token = %s AND status = %s",
+        (DONE, job["id"], job["lease_token"], RUNNING)
+    )
+
+
+def fail_job(job: Dict[str, Any], error: str, permanent: bool = False) -> str:
+    """
+    记录一次失败：尚有尝试次数时按指数退避重新排队，否则转入死信。
+    permanent 为 True 表示重试也不会成功 (例如提示词不存在)，直接转入死信。
+    返回作业的新状态；租约已失效时返回空字符串。
+    """
+    error = error[:2000]
+    if permanent or job["attempts"] >= job["max_attempts"]:
+        updated = _finish(
+            "UPDATE analysis_jobs SET status = %s, lease_token = NULL, last_error = %s, finished_at = NOW() "
+            "WHERE id = %s AND lease_token = %s AND status = %s",
+            (DEAD, error, job["id"], job["lease_token"], RUNNING)
+        )
+        return DEAD if updated else ""
+    backoff = settings.JOB_RETRY_BACKOFF * 2 ** (job["attempts"] - 1)
+    updated = _finish(
+        "UPDATE analysis_jobs SET status = %s, lease_token = NULL, last_error = %s, "
+        "available_at = NOW() + INTERVAL %s SECOND WHERE id = %s AND lease_token = %s AND status = %s",
+        (PENDING, error, backoff, job["id"], job["lease_token"], RUNNING)
+    )
+    return PENDING if updated else ""
+
+
+def release_job(job: Dict[str, Any]) -> bool:
+    """停机时归还未执行完的作业：立即可见，且不计入尝试次数。"""
+    return _finish(
+        "UPDATE analysis_jobs SET status = %s, attempts = GREATEST(attempts - 1, 0), lease_token = NULL, "
+        "available_at = NOW() WHERE id = %s AND lease_token = %s AND status = %s",
+        (PENDING, job["id"], job["lease_token"], RUNNING)
+    )
+
+
+def retry_dead_job(job_id: int) -> bool:
+    """把死信作业重新放回队列，尝试次数清零。"""
+    return _finish(
+        "UPDATE analysis_jobs SET status = %s, attempts = 0, available_at = NOW(), finished_at = NULL "
+        "WHERE id = %s AND status = %s",
+        (PENDING, job_id, DEAD)
+    )
+
+
+def purge_finished_jobs(retention_days: int) -> int:
+    """删除超过保留期的已完成作业 (死信保留，等待人工处理)。"""
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM analysis_jobs WHERE status = %s AND finished_at < NOW() - INTERVAL %s DAY",
+            (DONE, retention_days)
+        )
+        conn.commit()
+        return cursor.rowcount
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"清理已完成的分析作业时出错: {e}", exc_info=True)
+        return 0
+    finally:
+        conn.close()
+
+
+def list_jobs(status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("未能获取数据库连接以查询分析作业。")
+    try:
+        cursor = conn.cursor(dictionary=True)
+        if status:
+            cursor.execute(
+                f"SELECT {JOB_COLUMNS} FROM analysis_jobs WHERE status = %s ORDER BY id DESC LIMIT %s",
+                (status, limit)
+            )
+        else:
+            cursor.execute(f"SELECT {JOB_COLUMNS} FROM analysis_jobs ORDER BY id DESC LIMIT %s", (limit,))
+        return [_decode(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def queue_depth() -> Dict[str, Any]:
+    """按状态统计作业数，以及最早一个可执行作业已等待的秒数。"""
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("未能获取数据库连接以统计分析作业。")
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT status, COUNT(*) FROM analysis_jobs GROUP BY status")
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({status: count for status, count in cursor.fetchall()})
+        cursor.execute(
+            "SELECT TIMESTAMPDIFF(SECOND, MIN(available_at), NOW()) FROM analysis_jobs "
+            "WHERE status = %s AND available_at <= NOW()",
+            (PENDING,)
+        )
+        oldest = cursor.fetchone()[0]
+        return {"counts": counts, "oldest_ready_seconds": oldest or 0}
+    finally:
+        conn.close()
@@ -0,0 +1,111 @@
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+from core.config import settings
+from core.kline_series import KlineSeries
+
+logger = logging.getLogger(__name__)
+
+# 各周期对应的毫秒数，用于判断K线是否已收盘以及估算增量请求的数量
+INTERVAL_MS = {
+    "1m": 60_000,
+    "5m": 5 * 60_000,
+    "15m": 15 * 60_000,
+    "1h": 60 * 60_000,
+    "4h": 4 * 60 * 60_000,
+    "1d": 24 * 60 * 60_000,
+}
+
+CacheKey = Tuple[str, int, str]
+
+
+class KlineCache:
+    """
+    本地K线缓存，按 (symbol, asset_type, interval) 分组。
+
+    只保留最近 `max_closed` 根已收盘K线和当前未收盘的一根。命中缓存时，
+    上游只需返回从缓存中最新一根K线开始的增量数据。
+    """
+
+    def __init__(self, max_closed: int = 100):
+        self.max_closed = max_closed
+        self._entries: Dict[CacheKey, KlineSeries] = {}
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+        self.candles_fetched = 0
+
+    def incremental_params(self, key: CacheKey, now_ms: Optional[int] = None) -> Optional[dict]:
+        """
+        返回增量请求所需的参数 (startTime / limit)。
+        缓存为空或缓存已过于陈旧时返回 None，调用方应做全量请求。
+        """
+        series = self._entries.get(key)
+        interval_ms = INTERVAL_MS.get(key[2])
+        if not series or interval_ms is None:
+            return None
+        start_time = int(series.open_time[-1])
+
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        # 从最新一根（可能未收盘的）K线开始重新拉取，+2 覆盖边界情况
+        needed = (now_ms - start_time) // interval_ms + 2
+        if needed > self.max_closed:
+            return None
+        return {"startTime": start_time, "limit": str(needed)}
+
+    def merge(self, key: CacheKey, candles: KlineSeries, incremental: bool, now_ms: Optional[int] = None) -> Optional[KlineSeries]:
+        """
+        将上游返回的K线合并进缓存并返回最新的完整窗口。
+        增量数据与缓存无法衔接时返回 None，调用方应回退到全量请求。
+        """
+        interval_ms = INTERVAL_MS.get(key[2])
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        self.candles_fetched += len(candles)
+
+        cached = self._entries.get(key)
+        if incremental and cached:
+            if not len(candles) or int(candles.open_time[0]) != int(cached.open_time[-1]):
+                self.fallbacks += 1
+                logger.warning(f"K线增量数据无法与缓存衔接，回退全量请求: {key}")
+                return None
+            self.hits += 1
+            # 新数据从缓存最新一根开始，覆盖该根（可能是之前未收盘的K线）
+            merged = KlineSeries.concat([cached[:-1], candles])
+        else:
+            self.misses += 1
+            merged = candles
+
+        # 保留 max_closed 根已收盘K线，外加可能存在的一根未收盘K线
+        has_open = bool(len(merged)) and interval_ms is not None and int(merged.open_time[-1]) + interval_ms > now_ms
+        self._entries[key] = merged.tail(self.max_closed + (1 if has_open else 0))
+        return self.window(key)
+
+    def window(self, key: CacheKey) -> KlineSeries:
+        """返回最近 `max_closed` 根K线 (包含未收盘的一根)。"""
+        series = self._entries.get(key)
+        if series is None:
+            return KlineSeries.empty()
+        return series.tail(self.max_closed)
+
+    def invalidate(self, key: Optional[CacheKey] = None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": sum(series.nbytes for series in self._entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "fallbacks": self.fallbacks,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "candles_fetched": self.candles_fetched,
+        }
+
+
+# 进程内共享的K线缓存单例
+kline_cache = KlineCache(max_closed=settings.KLINE_CACHE_SIZE)
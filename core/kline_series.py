@@ -0,0 +1,100 @@
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+COLUMNS = ("open_time", "open", "high", "low", "close", "volume")
+
+
+class KlineSeries:
+    """
+    列式存储的K线序列：开盘时间与 OHLCV 各占一个类型化的 NumPy 数组。
+
+    上游返回的字符串价格只在抓取时解析一次；之后市场数据、指标计算与
+    Prompt 构建都直接使用这些数组。按时间切片返回的是原数组的视图，不复制数据。
+    """
+
+    __slots__ = COLUMNS
+
+    def __init__(
+        self,
+        open_time: np.ndarray,
+        open: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        close: np.ndarray,
+        volume: np.ndarray,
+    ):
+        self.open_time = open_time
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def empty(cls) -> "KlineSeries":
+        return cls(np.empty(0, dtype=np.int64), *(np.empty(0, dtype=np.float64) for _ in range(5)))
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Sequence]) -> "KlineSeries":
+        """从上游的 `[open_time, open, high, low, close, volume, ...]` 行解析。"""
+        if not rows:
+            return cls.empty()
+        # 一次性解析为 float64 矩阵；开盘时间是毫秒整数，float64 可无损表示
+        matrix = np.array([row[:6] for row in rows], dtype=np.float64)
+        return cls(
+            matrix[:, 0].astype(np.int64),
+            *(np.ascontiguousarray(matrix[:, i]) for i in range(1, 6)),
+        )
+
+    @classmethod
+    def concat(cls, parts: Iterable["KlineSeries"]) -> "KlineSeries":
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+        return cls(*(np.concatenate([getattr(p, col) for p in parts]) for col in COLUMNS))
+
+    def __len__(self) -> int:
+        return int(self.open_time.shape[0])
+
+    def __getitem__(self, index: slice) -> "KlineSeries":
+        if not isinstance(index, slice):
+            raise TypeError("KlineSeries 仅支持切片索引。")
+        return KlineSeries(*(getattr(self, col)[index] for col in COLUMNS))
+
+    def __repr__(self) -> str:
+        if not len(self):
+            return "KlineSeries(len=0)"
+        return f"KlineSeries(len={len(self)}, from={int(self.open_time[0])}, to={int(self.open_time[-1])})"
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, col).nbytes for col in COLUMNS)
+
+    def between(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> "KlineSeries":
+        """返回开盘时间位于 [start_ms, end_ms) 的K线视图（零拷贝）。"""
+        lo = 0 if start_ms is None else int(np.searchsorted(self.open_time, start_ms, side="left"))
+        hi = len(self) if end_ms is None else int(np.searchsorted(self.open_time, end_ms, side="left"))
+        return self[lo:hi]
+
+    def since(self, start_ms: int) -> "KlineSeries":
+        return self.between(start_ms, None)
+
+    def tail(self, n: int) -> "KlineSeries":
+        return self[-n:] if n > 0 else self[0:0]
+
+    def to_rows(self) -> List[list]:
+        """转换回 `[open_time, open, high, low, close, volume]` 行，用于 JSON 序列化。"""
+        return [
+            [int(t), o, h, l, c, v]
+            for t, o, h, l, c, v in zip(
+                self.open_time.tolist(),
+                self.open.tolist(),
+                self.high.tolist(),
+                self.low.tolist(),
+                self.close.tolist(),
+                self.volume.tolist(),
+            )
+        ]
@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from typing import Optional
+
+from apscheduler.triggers.base import BaseTrigger
+from apscheduler.triggers.cron import CronTrigger
+
+
+def task_jitter(task_id: int, window_seconds: float) -> float:
+    """由任务ID哈希得到的确定性偏移 (0 <= 偏移 < window_seconds)，重启后保持不变。"""
+    if window_seconds <= 0:
+        return 0.0
+    digest = hashlib.sha1(f"task:{task_id}".encode("utf-8")).digest()
+    millis = int.from_bytes(digest[:8], "big") % int(window_seconds * 1000)
+    return millis / 1000.0
+
+
+class OffsetCronTrigger(BaseTrigger):
+    """
+    在 CronTrigger 的每个触发时间上加固定偏移。
+
+    与 CronTrigger 自带的 jitter 不同，偏移是确定的：同一任务每次都在同一秒触发，
+    不同任务均匀错开，整点对齐的 cron 不再在同一秒集中触发。
+    """
+
+    def __init__(self, cron: CronTrigger, offset_seconds: float):
+        self.cron = cron
+        self.offset = timedelta(seconds=offset_seconds)
+
+    def get_next_fire_time(self, previous_fire_time: Optional[datetime], now: datetime) -> Optional[datetime]:
+        previous = previous_fire_time - self.offset if previous_fire_time else None
+        # 从 now - offset 开始找：基准时间已过但加上偏移后仍在未来的那次触发不能漏掉
+        base = self.cron.get_next_fire_time(previous, now - self.offset)
+        return base + self.offset if base else None
+
+    def __str__(self) -> str:
+        return f"{self.cron} +{self.offset.total_seconds():.3f}s"
+
+    def __repr__(self) -> str:
+        return f"<OffsetCronTrigger ({self.cron!r}, offset={self.offset.total_seconds():.3f}s)>"
+
+
+class CandleCloseTrigger(BaseTrigger):
+    """
+    在每根K线收盘 (按 UTC 纪元对齐的周期边界) 之后 offset 秒触发。
+
+    offset 通常是收盘后的等待时间加上按任务ID的确定性偏移。
+    """
+
+    def __init__(self, interval_ms: int, offset_seconds: float, timezone):
+        self.interval_ms = interval_ms
+        self.offset = timedelta(seconds=offset_seconds)
+        self.timezone = timezone
+
+    def get_next_fire_time(self, previous_fire_time: Optional[datetime], now: datetime) -> Optional[datetime]:
+        start = now if previous_fire_time is None else min(now, previous_fire_time + timedelta(microseconds=1))
+        start_ms = (start - self.offset).timestamp() * 1000
+        boundary_ms = -(-start_ms // self.interval_ms) * self.interval_ms
+        return datetime.fromtimestamp(boundary_ms / 1000, self.timezone) + self.offset
+
+    def __str__(self) -> str:
+        return f"candle_close[{self.interval_ms // 1000}s] +{self.offset.total_seconds():.3f}s"
+
+    def __repr__(self) -> str:
+        return f"<CandleCloseTrigger (interval={self.interval_ms}ms, offset={self.offset.total_seconds():.3f}s)>"
+
+
+class StartPacer:
+    """
+    限制每秒启动的任务数：按到达顺序为每次启动预约一个时间槽，槽间隔为 1/rate 秒。
+    rate <= 0 表示不限制。
+    """
+
+    def __init__(self, starts_per_second: float):
+        self.interval = 1.0 / starts_per_second if starts_per_second > 0 else 0.0
+        self._next_slot = 0.0
+
+    async def wait(self) -> float:
+        """等待轮到自己启动，返回等待的秒数。"""
+        if self.interval <= 0:
+            return 0.0
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+
+class StartRecorder:
+    """记录最近的任务实际启动时间，用于观察削峰后的启动分布。"""
+
+    def __init__(self, max_samples: int = 2000):
+        self._samples: deque = deque(maxlen=max_samples)  # (启动时间戳, 限速等待秒数)
+        self.total = 0
+
+    def record(self, waited: float):
+        self._samples.append((time.time(), waited))
+        self.total += 1
+
+    def stats(self, window_seconds: float = 900.0) -> dict:
+        now = time.time()
+        recent = [(ts, waited) for ts, waited in self._samples if now - ts <= window_seconds]
+        per_second = Counter(int(ts) for ts, _ in recent)
+        # 启动时刻在分钟内的秒数分布：削峰前集中在第 0 秒，削峰后应大致均匀
+        second_of_minute = Counter(int(ts) % 60 for ts, _ in recent)
+        waits = sorted(waited for _, waited in recent)
+
+        def _pct(q: float) -> float:
+            return round(waits[min(len(waits) - 1, int(q * (len(waits) - 1)))], 3) if waits else 0.0
+
+        return {
+            "window_seconds": window_seconds,
+            "starts": len(recent),
+            "starts_total": self.total,
+            "max_starts_per_second": max(per_second.values()) if per_second else 0,
+            "busy_seconds": len(per_second),
+            "pacer_wait_p50": _pct(0.5),
+            "pacer_wait_p99": _pct(0.99),
+            "pacer_wait_max": round(waits[-1], 3) if waits else 0.0,
+            "second_of_minute": {str(k): v for k, v in sorted(second_of_minute.items())},
+        }
@@ -1,21 +1,57 @@
+import atexit
+import copy
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
+from typing import Optional
+
 import colorlog
 
+from core.config import settings
+from core.task_log import TASK_LOGGER_NAME, RunContextFilter, build_task_log_handler
+
+_listener: Optional[QueueListener] = None
+
+
+class _ContextQueueHandler(QueueHandler):
+    """
+    默认的 QueueHandler.prepare 会把异常堆栈拼进 msg 并清空 exc_info/exc_text，下游的 JSON 格式化器就
+    无法单独输出堆栈。这里只合并消息参数，堆栈文本保留在 exc_text 中 (控制台和 app.log 的格式化器
+    同样会追加 exc_text)。队列在进程内，记录不需要可序列化。
+    """
+
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self._exc_formatter.formatException(record.exc_info)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
 def setup_logging():
     """
-    配置全局日志记录器，将日志同时输出到控制台和文件。
+    配置全局日志记录器。
+
+    所有记录器只往内存队列里放记录 (QueueHandler)，由后台线程 (QueueListener) 写控制台和文件，
+    事件循环上不做磁盘 I/O。带运行上下文 (run_id 等) 的记录另外写入汇总的 JSONL 任务日志。
     """
+    global _listener
     LOGS_DIR = Path("logs")
     LOGS_DIR.mkdir(exist_ok=True)
     APP_LOG_FILE = LOGS_DIR / "app.log"
 
     # 获取根记录器
     root_logger = logging.getLogger()
-    # 只有在没有配置 handlers 的情况下才进行配置，防止重复
-    if not root_logger.handlers:
+    # 只配置一次，防止重复
+    if _listener is None:
         root_logger.setLevel(logging.INFO) # 设置根日志级别为 INFO，适用于生产环境
+        # 任务日志只写入任务日志文件，不进入控制台和 app.log
+        not_task_log = lambda record: record.name != TASK_LOGGER_NAME
 
         # 1. 控制台 Handler (带颜色)
         color_formatter = colorlog.ColoredFormatter(
@@ -31,7 +67,7 @@ def setup_logging():
         )
         stream_handler = colorlog.StreamHandler(sys.stdout)
         stream_handler.setFormatter(color_formatter)
-        root_logger.addHandler(stream_handler)
+        stream_handler.addFilter(not_task_log)
 
         # 2. 文件 Handler (不带颜色)
         file_formatter = logging.Formatter(
@@ -40,14 +76,35 @@ def setup_logging():
         )
         file_handler = logging.FileHandler(APP_LOG_FILE, mode='a', encoding='utf-8')
         file_handler.setFormatter(file_formatter)
-        root_logger.addHandler(file_handler)
+        file_handler.addFilter(not_task_log)
+
+        # 3. 汇总的任务日志 (JSONL，按天轮转并压缩)
+        task_handler = build_task_log_handler(settings.TASK_LOG_FILE, settings.TASK_LOG_RETENTION_DAYS)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = _ContextQueueHandler(log_queue)
+        queue_handler.addFilter(RunContextFilter())
+        for handler in list(root_logger.handlers):
+            root_logger.removeHandler(handler)
+        root_logger.addHandler(queue_handler)
 
-        logging.info("全局日志记录器已成功配置 (控制台带颜色)。")
+        _listener = QueueListener(log_queue, stream_handler, file_handler, task_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+        logging.info("全局日志记录器已成功配置 (队列写入，控制台带颜色)。")
+
+    # 将 uvicorn 的日志也交由根记录器处理，以统一格式和输出 (只经过根记录器一次，避免重复)
+    for name in ("uvicorn", "uvicorn.access", "uvicorn.error"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
 
-    # 将 uvicorn 的日志也交由根记录器处理，以统一格式和输出
-    logging.getLogger("uvicorn").handlers = root_logger.handlers
-    logging.getLogger("uvicorn.access").handlers = root_logger.handlers
-    logging.getLogger("uvicorn.error").handlers = root_logger.handlers
-    
     # 调度器问题已解决，不再需要为 apscheduler 设置 DEBUG 级别
     # logging.getLogger("apscheduler").setLevel(logging.DEBUG)
+
+def stop_logging():
+    """写完队列中剩余的日志并停止后台写入线程。"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
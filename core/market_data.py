@@ -1,64 +1,198 @@
-import requests
+import asyncio
 import json
 import os
 import argparse
 from datetime import datetime
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
 from core.config import settings
+from core.kline_cache import INTERVAL_MS, kline_cache
+from core.kline_series import KlineSeries
+from core.metrics import KLINE_FETCH_SECONDS
+from core.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
-def fetch_single_kline(symbol: str, interval: str, asset_type: int):
-    """获取单个交易对、时间周期和资产类型的K线数据。"""
-    if not settings.KLINE_API_SECRET_KEY:
-        logger.error("K-line API 密钥未配置。无法获取市场数据。")
-        return interval, []
+KLINE_INTERVALS = ["15m", "1h", "4h"]
+
+# --- 共享的 HTTP 连接池 ---
+# 整个进程共用一个长连接客户端，避免每次任务都重新建立 TCP/TLS 连接。
+_async_client: Optional[httpx.AsyncClient] = None
+_host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+# 多个任务在同一秒请求相同 (symbol, type, interval) 时，只向上游发出一次请求
+kline_singleflight = SingleFlight("kline")
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    """获取（必要时创建）共享的异步 HTTP 客户端。"""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                settings.KLINE_HTTP_TIMEOUT,
+                connect=settings.KLINE_HTTP_CONNECT_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.KLINE_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.KLINE_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.KLINE_HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        logger.info("K-line 异步 HTTP 连接池已创建。")
+    return _async_client
+
+
+def _get_host_semaphore(url: str) -> asyncio.Semaphore:
+    """按目标主机返回并发信号量，限制对同一上游的并发请求数。"""
+    host = urlparse(url).netloc or url
+    semaphore = _host_semaphores.get(host)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(settings.KLINE_HTTP_PER_HOST_LIMIT)
+        _host_semaphores[host] = semaphore
+    return semaphore
+
+
+async def close_async_client():
+    """关闭共享的异步 HTTP 客户端，应用关闭时调用。"""
+    global _async_client
+    if _async_client is not None and not _async_client.is_closed:
+        await _async_client.aclose()
+        logger.info("K-line 异步 HTTP 连接池已关闭。")
+    _async_client = None
+    _host_semaphores.clear()
 
+
+def _build_kline_request(symbol: str, interval: str, asset_type: int, extra_params: Optional[dict] = None) -> Tuple[dict, dict]:
     headers = {
         'accept': 'application/json',
         'Authorization': f'Basic {settings.KLINE_API_SECRET_KEY}'
     }
-    
     params = {
         'type': asset_type,
         'symbol': symbol,
         'interval': interval,
-        'limit': '100'
+        'limit': str(settings.KLINE_CACHE_SIZE)
     }
+    if extra_params:
+        params.update(extra_params)
+    return headers, params
+
+
+async def _request_klines(symbol: str, interval: str, asset_type: int, extra_params: Optional[dict] = None) -> KlineSeries:
+    """向上游请求K线并一次性解析为 KlineSeries。失败时抛出异常。"""
+    headers, params = _build_kline_request(symbol, interval, asset_type, extra_params)
     logger.info(
         f"发送 K-line 数据请求: symbol={symbol}, interval={interval}, type={asset_type}, "
-        f"url={settings.KLINE_API_BASE_URL}"
+        f"limit={params['limit']}, url={settings.KLINE_API_BASE_URL}"
     )
+    client = _get_async_client()
+    started = time.perf_counter()
     try:
-        response = requests.get(settings.KLINE_API_BASE_URL, headers=headers, params=params, timeout=15)
-        response.raise_for_status()
+        async with _get_host_semaphore(settings.KLINE_API_BASE_URL):
+            response = await client.get(settings.KLINE_API_BASE_URL, headers=headers, params=params)
+    finally:
+        KLINE_FETCH_SECONDS.labels(interval).observe(time.perf_counter() - started)
+    response.raise_for_status()
+    return KlineSeries.from_rows(response.json())
+
+
+async def fetch_single_kline_async(symbol: str, interval: str, asset_type: int) -> Tuple[str, KlineSeries]:
+    """
+    异步获取单个交易对、时间周期和资产类型的K线数据。
+    相同 key 的并发调用共享同一个进行中的上游请求。
+    """
+    return await kline_singleflight.do(
+        (symbol, asset_type, interval),
+        lambda: _fetch_single_kline(symbol, interval, asset_type),
+    )
+
+
+async def _fetch_single_kline(symbol: str, interval: str, asset_type: int) -> Tuple[str, KlineSeries]:
+    """启用缓存时，只向上游请求缓存中最新K线之后的增量数据。"""
+    if not settings.KLINE_API_SECRET_KEY:
+        logger.error("K-line API 密钥未配置。无法获取市场数据。")
+        return interval, KlineSeries.empty()
+
+    try:
+        if not settings.KLINE_CACHE_ENABLED:
+            data = await _request_klines(symbol, interval, asset_type)
+            logger.info(f"成功获取 {symbol} - {interval} 的数据。")
+            return interval, data
+
+        key = (symbol, asset_type, interval)
+        incremental_params = kline_cache.incremental_params(key)
+        if incremental_params is not None:
+            data = await _request_klines(symbol, interval, asset_type, incremental_params)
+            merged = kline_cache.merge(key, data, incremental=True)
+            if merged is not None:
+                logger.info(f"成功增量获取 {symbol} - {interval} 的数据 ({len(data)} 根新K线)。")
+                return interval, merged
+
+        data = await _request_klines(symbol, interval, asset_type)
         logger.info(f"成功获取 {symbol} - {interval} 的数据。")
-        # 筛选每条K线，只保留前6个元素
-        filtered_data = [kline[:6] for kline in response.json()]
-        return interval, filtered_data
-    except requests.exceptions.RequestException as e:
+        return interval, kline_cache.merge(key, data, incremental=False)
+    except (httpx.HTTPError, ValueError) as e:
         logger.error(f"获取 {symbol} - {interval} 的数据失败: {e}")
-        return interval, []
+        return interval, KlineSeries.empty()
+
+
+async def latest_closed_candle(symbol: str, interval: str, asset_type: int, settle_ms: int = 0) -> Optional[int]:
+    """
+    返回上游最近一根已收盘K线的开盘时间；获取失败时返回 None。
+
+    上游已经出现下一根K线时，前一根视为已收盘；最新一根只有在其结束时间再过 settle_ms 后
+    仍是最新时才算已收盘 (部分上游不返回未收盘的K线)。
+    """
+    _, series = await fetch_single_kline_async(symbol, interval, asset_type)
+    interval_ms = INTERVAL_MS.get(interval)
+    if not len(series) or interval_ms is None:
+        return None
+    last = int(series.open_time[-1])
+    if last + interval_ms + settle_ms <= int(time.time() * 1000):
+        return last
+    return int(series.open_time[-2]) if len(series) > 1 else None
+
+
+async def _timed_fetch(symbol: str, interval: str, asset_type: int, timings: Dict[str, float]):
+    started = time.perf_counter()
+    try:
+        return await fetch_single_kline_async(symbol, interval, asset_type)
+    finally:
+        timings[interval] = time.perf_counter() - started
+
+
+async def fetch_all_kline_data_async(symbol: str, asset_type: int,
+                                     timings: Optional[Dict[str, float]] = None) -> Dict[str, KlineSeries]:
+    """
+    在事件循环内并发获取多个时间周期的K线数据，不会阻塞其他协程。
+    传入 timings 时，各周期的获取耗时 (秒) 按周期写入其中。
+    """
+    if timings is None:
+        fetches = (fetch_single_kline_async(symbol, interval, asset_type) for interval in KLINE_INTERVALS)
+    else:
+        fetches = (_timed_fetch(symbol, interval, asset_type, timings) for interval in KLINE_INTERVALS)
+    results = await asyncio.gather(*fetches)
+    return dict(results)
+
 
 def fetch_all_kline_data_concurrently(symbol: str, asset_type: int):
     """
-    为一个给定的资产类型并发地获取多个时间周期的K线数据。
+    同步包装器：供命令行等非异步场景使用。
+    在事件循环中请使用 `fetch_all_kline_data_async`。
     """
-    intervals = ["15m", "1h", "4h"]
-    combined_data = {}
-    
-    with ThreadPoolExecutor(max_workers=len(intervals)) as executor:
-        future_to_interval = {
-            executor.submit(fetch_single_kline, symbol, interval, asset_type): interval
-            for interval in intervals
-        }
-        
-        for future in as_completed(future_to_interval):
-            interval, data = future.result()
-            combined_data[interval] = data
-            
-    return combined_data
+    async def _run():
+        try:
+            return await fetch_all_kline_data_async(symbol, asset_type)
+        finally:
+            await close_async_client()
+
+    return asyncio.run(_run())
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="为给定的交易对获取K线数据。")
@@ -84,7 +218,7 @@ if __name__ == "__main__":
     if any(all_kline_data.values()): # 仅在获取到数据时写入
         try:
             with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(all_kline_data, f, indent=4)
+                json.dump({k: v.to_rows() for k, v in all_kline_data.items()}, f, indent=4)
             logging.info(f"成功将K线数据写入到 {filepath}")
         except IOError as e:
             logging.error(f"写入文件 {filepath} 时出错: {e}")
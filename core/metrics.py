@@ -0,0 +1,225 @@
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 延迟直方图的默认分桶 (秒)，覆盖毫秒级的数据库操作到分钟级的模型调用
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class _HistogramChild:
+    """各桶计数预先分配；observe 只做一次二分查找和两次加法，不分配对象、不加锁。"""
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最后一个是 +Inf 桶；导出时再累加
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values) -> object:
+        """
+        返回该组标签值对应的子指标。只有首次出现的标签组合需要加锁创建；
+        热路径上可以预先取得子指标并保存，避免每次查找。
+        """
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} 需要标签 {self.labelnames}，实际为 {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def collect(self) -> List[str]:
+        raise NotImplementedError
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def collect(self) -> List[str]:
+        lines = self._header()
+        for key, child in list(self._children.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def collect(self) -> List[str]:
+        lines = self._header()
+        for key, child in list(self._children.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}")
+        return lines
+
+
+class GaugeFunc(_Metric):
+    """导出时调用函数取值的仪表 (例如队列长度)，热路径上没有任何开销。"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, func: Callable[[], Optional[float]]):
+        self.func = func
+        super().__init__(name, documentation)
+
+    def collect(self) -> List[str]:
+        try:
+            value = self.func()
+        except Exception:
+            value = None
+        if value is None:
+            return []
+        return self._header() + [f"{self.name} {_format_value(float(value))}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def collect(self) -> List[str]:
+        lines = self._header()
+        for key, child in list(self._children.items()):
+            counts = list(child.counts)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    进程内的指标注册表，按 Prometheus 文本格式 (0.0.4) 导出。
+
+    每个进程各自计数；manage.py serve 下每个角色进程在自己的端口上提供 /metrics，分别抓取。
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# --- 分析流水线 ---
+KLINE_FETCH_SECONDS = Histogram("kline_fetch_seconds", "上游K线请求耗时", ["interval"])
+LLM_CALL_SECONDS = Histogram("llm_call_seconds", "单次模型调用耗时", ["model", "outcome"])
+LLM_TOKENS = Counter("llm_tokens_total", "模型调用消耗的令牌数", ["model", "kind"])
+JSON_EXTRACT_SECONDS = Histogram("json_extract_seconds", "从模型响应中提取并解析 JSON 的耗时")
+DB_SAVE_SECONDS = Histogram("db_save_seconds", "分析结果从提交到写入完成的耗时")
+RESULT_FLUSH_SECONDS = Histogram("result_writer_flush_seconds", "结果写入器单个批次的写入耗时")
+ANALYSIS_RUNS = Counter("analysis_runs_total", "分析运行次数", ["outcome"])
+
+# --- 调度与队列 ---
+SCHEDULER_FIRE_LAG_SECONDS = Histogram("scheduler_fire_lag_seconds", "作业实际入队时间相对计划触发时间的延迟")
+JOB_QUEUE_WAIT_SECONDS = Histogram("job_queue_wait_seconds", "作业从计划触发到被工作者开始执行的等待时间")
+ANALYSIS_JOBS = Counter("analysis_jobs_total", "工作者处理的作业数", ["outcome"])
+
+# --- 数据库 ---
+DB_POOL_WAIT_SECONDS = Histogram("db_executor_wait_seconds", "数据库操作在线程池中排队等待的时间")
+
+# --- API ---
+HTTP_REQUEST_SECONDS = Histogram("http_request_seconds", "API 请求耗时", ["method", "route", "status"])
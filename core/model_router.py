@@ -0,0 +1,115 @@
+import logging
+import random
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+RouteKey = Tuple[str, str]
+
+
+class _ModelStats:
+    """单个 (模型, base_url) 的滚动延迟与错误率。"""
+
+    __slots__ = ("ewma_latency", "ewma_error", "samples", "failures", "latencies", "last_failure_at")
+
+    def __init__(self):
+        self.ewma_latency: Optional[float] = None
+        self.ewma_error = 0.0
+        self.samples = 0
+        self.failures = 0
+        self.latencies: deque = deque(maxlen=200)
+        self.last_failure_at = 0.0
+
+    def record(self, latency: float, ok: bool, alpha: float):
+        self.samples += 1
+        self.ewma_error = (1 - alpha) * self.ewma_error + alpha * (0.0 if ok else 1.0)
+        if ok:
+            self.latencies.append(latency)
+        else:
+            self.failures += 1
+            self.last_failure_at = time.monotonic()
+            # 失败按惩罚延迟计入 EWMA (不进入对冲分位数的样本)，只会出错的模型不会因延迟为 0 而被优先选择
+            latency = max(latency, settings.AI_ROUTER_FAILURE_PENALTY_SECONDS)
+        self.ewma_latency = latency if self.ewma_latency is None else (1 - alpha) * self.ewma_latency + alpha * latency
+
+    def healthy(self, now: float) -> bool:
+        if self.ewma_error < settings.AI_ROUTER_MAX_ERROR_RATE:
+            return True
+        # 冷却期过后给不健康的模型一次恢复机会
+        return now - self.last_failure_at >= settings.AI_ROUTER_COOLDOWN_SECONDS
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if len(self.latencies) < settings.AI_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class ModelRouter:
+    """
+    根据各模型的 EWMA 延迟与错误率选择模型。
+
+    健康的模型中选延迟最低的；尚无样本的模型按配置顺序排在已知模型之后，
+    并以小概率 (AI_ROUTER_EXPLORE_RATE) 随机探索，以便持续获得样本。
+    """
+
+    def __init__(self):
+        self._stats: Dict[RouteKey, _ModelStats] = {}
+
+    def _get(self, model: str, base_url: str) -> _ModelStats:
+        key = (model, base_url)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = _ModelStats()
+            self._stats[key] = stats
+        return stats
+
+    def choose(self, options: List[str], base_url: str, exclude: Iterable[str] = ()) -> str:
+        excluded = set(exclude)
+        candidates = [m for m in options if m not in excluded] or list(options)
+        if len(candidates) == 1:
+            return candidates[0]
+
+        now = time.monotonic()
+        healthy = [m for m in candidates if self._get(m, base_url).healthy(now)] or candidates
+        if random.random() < settings.AI_ROUTER_EXPLORE_RATE:
+            return random.choice(healthy)
+
+        def _score(item):
+            index, model = item
+            latency = self._get(model, base_url).ewma_latency
+            # 有样本的模型按延迟排序；无样本的按配置顺序排在后面 (都没有样本时选首个模型)
+            if latency is None:
+                return (1, index)
+            return (0, latency)
+
+        return min(enumerate(healthy), key=_score)[1]
+
+    def record(self, model: str, base_url: str, latency: float, ok: bool):
+        self._get(model, base_url).record(latency, ok, settings.AI_ROUTER_EWMA_ALPHA)
+
+    def hedge_delay(self, model: str, base_url: str) -> Optional[float]:
+        """返回对冲请求的触发延迟 (该模型延迟的 AI_HEDGE_PERCENTILE 分位)；样本不足时返回 None。"""
+        return self._get(model, base_url).percentile(settings.AI_HEDGE_PERCENTILE)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            f"{model}@{base_url}": {
+                "ewma_latency": round(s.ewma_latency, 3) if s.ewma_latency is not None else None,
+                "error_rate": round(s.ewma_error, 3),
+                "samples": s.samples,
+                "failures": s.failures,
+                "healthy": s.healthy(now),
+                f"p{int(settings.AI_HEDGE_PERCENTILE)}": s.percentile(settings.AI_HEDGE_PERCENTILE),
+            }
+            for (model, base_url), s in self._stats.items()
+        }
+
+
+model_router = ModelRouter()
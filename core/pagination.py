@@ -0,0 +1,75 @@
+import base64
+import datetime
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from core.config import settings
+
+
+def encode_cursor(sort_value: datetime.datetime, row_id: int) -> str:
+    """把最后一行的 (排序时间, id) 编码为不透明的游标字符串。"""
+    payload = json.dumps([sort_value.isoformat(), int(row_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    """解析游标；格式不正确时抛出 ValueError。"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.datetime.fromisoformat(sort_value), int(row_id)
+    except Exception as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+
+def keyset_condition(sort_column: str, cursor: str) -> Tuple[str, tuple]:
+    """
+    返回 "排在游标之后" 的 WHERE 条件 (按 sort_column DESC, id DESC 排序)。
+
+    展开为 OR 形式而不是行构造器 `(a, b) < (x, y)`，MySQL 才能对其做索引范围扫描。
+    """
+    sort_value, row_id = decode_cursor(cursor)
+    clause = f"({sort_column} < %s OR ({sort_column} = %s AND id < %s))"
+    return clause, (sort_value, sort_value, row_id)
+
+
+def next_cursor(rows: list, sort_column: str, page_size: int) -> Optional[str]:
+    """取到的行数达到 page_size 时，以最后一行生成下一页的游标。"""
+    if len(rows) < page_size:
+        return None
+    last = rows[-1]
+    return encode_cursor(last[sort_column], last["id"])
+
+
+class CountCache:
+    """按 (表, 筛选条件) 缓存 COUNT(*) 结果，避免每次翻页都做一次全索引扫描。"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_count(self, key: Hashable, count: Callable[[], int]) -> int:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and now - entry[0] < self.ttl_seconds:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        total = count()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = (now, total)
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+count_cache = CountCache(settings.PAGINATION_COUNT_CACHE_TTL)
@@ -0,0 +1,197 @@
+import logging
+import string
+import threading
+import time
+from typing import Dict, FrozenSet, Optional
+
+from core.config import settings
+from core.database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+JSON_SEPARATOR = "---JSON---"
+
+# run_analysis_task 格式化系统提示词时提供的字段
+PROMPT_FORMAT_FIELDS = frozenset({"symbol", "asset_type", "cycle"})
+
+
+class ParsedPrompt:
+    """已解析的提示词：系统部分、JSON 结构部分，以及预先校验过的格式化字段。"""
+
+    __slots__ = (
+        "id", "version", "system_prompt", "json_structure", "kline_encoding",
+        "format_fields", "format_error", "loaded_at",
+    )
+
+    def __init__(self, prompt_id: int, version: int, content: str, kline_encoding: Optional[str]):
+        self.id = prompt_id
+        self.version = version
+        parts = content.split(JSON_SEPARATOR, 1)
+        self.system_prompt = parts[0].strip() if parts else content.strip()
+        self.json_structure = parts[1].strip() if len(parts) > 1 else ""
+        self.kline_encoding = kline_encoding
+        self.format_fields: FrozenSet[str] = frozenset()
+        self.format_error: Optional[str] = None
+        self.loaded_at = time.monotonic()
+        self._validate_format()
+
+    def _validate_format(self):
+        try:
+            fields = {
+                name.split(".", 1)[0].split("[", 1)[0]
+                for _, name, _, _ in string.Formatter().parse(self.system_prompt)
+                if name is not None
+            }
+        except ValueError as e:
+            self.format_error = f"提示词模板语法错误: {e}"
+            return
+        self.format_fields = frozenset(fields)
+        unknown = self.format_fields - PROMPT_FORMAT_FIELDS
+        if unknown:
+            self.format_error = (
+                f"提示词包含未知的格式化字段 {sorted(unknown)}，"
+                f"仅支持 {sorted(PROMPT_FORMAT_FIELDS)} (字面量花括号请写作 {{{{ }}}})"
+            )
+
+    def render(self, **values) -> str:
+        return self.system_prompt.format(**values)
+
+
+def _table_fingerprint(cursor) -> tuple:
+    """prompts 表的版本指纹。提示词只会新增或删除 (内容不会原地修改)，行数与最大ID足以发现变化。"""
+    cursor.execute("SELECT COUNT(*) AS n, MAX(id) AS max_id FROM prompts")
+    row = cursor.fetchone()
+    return (row["n"], row["max_id"])
+
+
+class PromptCache:
+    """
+    进程内的已解析提示词缓存。
+
+    提示词只通过 api/routes/prompts.py 修改，创建/删除时写穿失效；每次失效都会递增代数，
+    失效前开始、失效后才完成的数据库加载不会被写回缓存。其他进程 (例如 manage.py serve 下的
+    API 进程) 中的修改通过 sync() 发现：最多每 sync_interval 秒比较一次 prompts 表的指纹，
+    变化时清空本进程缓存。TTL 只是最后的兜底。
+    """
+
+    def __init__(self, ttl_seconds: float, sync_interval: float):
+        self.ttl_seconds = ttl_seconds
+        self.sync_interval = sync_interval
+        self._entries: Dict[int, ParsedPrompt] = {}
+        self._lock = threading.Lock()
+        self._fingerprint: Optional[tuple] = None
+        self._synced_at = float("-inf")
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.remote_invalidations = 0
+
+    def get(self, prompt_id: int) -> Optional[ParsedPrompt]:
+        """只查缓存，不访问数据库。"""
+        entry = self._entries.get(prompt_id)
+        if entry is not None and time.monotonic() - entry.loaded_at < self.ttl_seconds:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def sync_due(self) -> bool:
+        return time.monotonic() - self._synced_at >= self.sync_interval
+
+    def sync(self):
+        """
+        与数据库对比 prompts 表的指纹 (同步，异步代码应通过 db_executor 调用)；
+        表已被其他进程修改时清空本进程的缓存。
+        """
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError("未能获取数据库连接以检查提示词版本。")
+        try:
+            fingerprint = _table_fingerprint(conn.cursor(dictionary=True))
+        finally:
+            conn.close()
+        self._synced_at = time.monotonic()
+        if self._fingerprint is not None and fingerprint != self._fingerprint:
+            logger.info(f"提示词表已在其他进程中变更 ({self._fingerprint} -> {fingerprint})，清空提示词缓存。")
+            self.remote_invalidations += 1
+            self.invalidate()
+        self._fingerprint = fingerprint
+
+    def load(self, prompt_id: int) -> Optional[ParsedPrompt]:
+        """从数据库加载并缓存单个提示词 (同步，异步代码应通过 db_executor 调用)。"""
+        generation = self.generation
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError("未能获取数据库连接以加载提示词。")
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT id, version, content, kline_encoding FROM prompts WHERE id = %s", (prompt_id,))
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        parsed = self._parse(row)
+        with self._lock:
+            if generation == self.generation:
+                self._entries[prompt_id] = parsed
+        return parsed
+
+    def warm(self) -> int:
+        """启动时预加载所有提示词，返回加载的数量。"""
+        generation = self.generation
+        conn = get_db_connection()
+        if not conn:
+            logger.error("未能获取数据库连接，跳过提示词缓存预热。")
+            return 0
+        try:
+            cursor = conn.cursor(dictionary=True)
+            fingerprint = _table_fingerprint(cursor)
+            cursor.execute("SELECT id, version, content, kline_encoding FROM prompts")
+            rows = cursor.fetchall()
+        except Exception as e:
+            logger.error(f"预热提示词缓存时出错: {e}", exc_info=True)
+            return 0
+        finally:
+            conn.close()
+        parsed = [self._parse(row) for row in rows]
+        with self._lock:
+            if generation == self.generation:
+                self._entries.update((p.id, p) for p in parsed)
+                self._fingerprint = fingerprint
+                self._synced_at = time.monotonic()
+        for p in parsed:
+            if p.format_error:
+                logger.warning(f"提示词 ID {p.id} (v{p.version}) 无法使用: {p.format_error}")
+        logger.info(f"提示词缓存已预热，共 {len(parsed)} 条。")
+        return len(parsed)
+
+    def invalidate(self, prompt_id: Optional[int] = None):
+        """使单个提示词 (或全部，prompt_id 为 None 时) 的缓存失效。"""
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            if prompt_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(prompt_id, None)
+
+    @staticmethod
+    def _parse(row: dict) -> ParsedPrompt:
+        return ParsedPrompt(row["id"], row["version"], str(row["content"]), row.get("kline_encoding"))
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "generation": self.generation,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations,
+            "remote_invalidations": self.remote_invalidations,
+        }
+
+
+prompt_cache = PromptCache(settings.PROMPT_CACHE_TTL, settings.PROMPT_CACHE_SYNC_INTERVAL)
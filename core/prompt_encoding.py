@@ -0,0 +1,119 @@
+import json
+import math
+from datetime import datetime, timezone
+from typing import Dict, Tuple
+
+import numpy as np
+
+from core.database import KlineEncoding
+from core.kline_cache import INTERVAL_MS
+from core.kline_series import KlineSeries
+from core.tokenizer import estimate_tokens
+
+PRICE_SIGNIFICANT_DIGITS = 6
+VOLUME_SIGNIFICANT_DIGITS = 4
+
+_DESCRIPTIONS = {
+    KlineEncoding.JSON: "K线格式: {周期: [[开盘时间(ms), 开, 高, 低, 收, 成交量], ...]}",
+    KlineEncoding.CSV: "K线格式: 每个周期一段，`#` 行给出周期、首根K线的开盘时间(UTC)和间隔；之后每行按时间顺序为 开,高,低,收,量 (若含时间列则为 时间(ms),开,高,低,收,量)。",
+    KlineEncoding.FIXED: "K线格式: 与 CSV 相同，价格保留 6 位有效数字，成交量保留 4 位有效数字。",
+    KlineEncoding.DELTA: "K线格式: 与 CSV 相同，但开高低收为相对 `ref` (首根K线收盘价) 的变化，单位为基点 (1bp = 0.01%)，即 价格 = ref * (1 + 值/10000)。",
+}
+
+
+def _decimals(reference: float, significant: int) -> int:
+    if not reference or not math.isfinite(reference):
+        return 2
+    return max(0, significant - int(math.floor(math.log10(abs(reference)))) - 1)
+
+
+def _format_column(values: np.ndarray, decimals: int = None) -> list:
+    if decimals is None:
+        return [repr(v) for v in values.tolist()]
+    return [f"{v:.{decimals}f}" for v in values.tolist()]
+
+
+def _is_contiguous(series: KlineSeries, interval: str) -> bool:
+    interval_ms = INTERVAL_MS.get(interval)
+    if interval_ms is None or len(series) < 2:
+        return interval_ms is not None
+    return bool(np.all(np.diff(series.open_time) == interval_ms))
+
+
+def _encode_csv_block(interval: str, series: KlineSeries, encoding: KlineEncoding) -> str:
+    header = f"# {interval}"
+    if len(series):
+        start = datetime.fromtimestamp(int(series.open_time[0]) / 1000, tz=timezone.utc)
+        header += f" start={start:%Y-%m-%dT%H:%MZ} step={interval} n={len(series)}"
+
+    if encoding == KlineEncoding.DELTA and len(series):
+        ref = float(series.close[0])
+        header += f" ref={ref:.{_decimals(ref, PRICE_SIGNIFICANT_DIGITS)}f}"
+        prices = [
+            _format_column((getattr(series, col) / ref - 1.0) * 10000.0, 1)
+            for col in ("open", "high", "low", "close")
+        ]
+    elif encoding in (KlineEncoding.FIXED, KlineEncoding.DELTA):
+        decimals = _decimals(float(np.median(series.close)) if len(series) else 0.0, PRICE_SIGNIFICANT_DIGITS)
+        prices = [_format_column(getattr(series, col), decimals) for col in ("open", "high", "low", "close")]
+    else:
+        prices = [_format_column(getattr(series, col)) for col in ("open", "high", "low", "close")]
+
+    if encoding == KlineEncoding.CSV:
+        volume = _format_column(series.volume)
+    else:
+        volume = _format_column(
+            series.volume,
+            _decimals(float(np.median(series.volume)) if len(series) else 0.0, VOLUME_SIGNIFICANT_DIGITS),
+        )
+
+    columns = prices + [volume]
+    if _is_contiguous(series, interval):
+        header += "\no,h,l,c,v"
+    else:
+        # 存在断档时保留时间列，避免模型误判K线时间
+        columns.insert(0, [str(t) for t in series.open_time.tolist()])
+        header += "\nt,o,h,l,c,v"
+    rows = (",".join(row) for row in zip(*columns))
+    return "\n".join([header, *rows])
+
+
+def encode_klines(kline_data: Dict[str, KlineSeries], encoding: KlineEncoding) -> str:
+    """将多周期K线编码为 Prompt 中使用的文本。"""
+    encoding = KlineEncoding(encoding)
+    if encoding == KlineEncoding.JSON:
+        return json.dumps({interval: series.to_rows() for interval, series in kline_data.items()}, indent=2)
+    return "\n\n".join(
+        _encode_csv_block(interval, series, encoding) for interval, series in kline_data.items()
+    )
+
+
+def build_kline_prompt(kline_data: Dict[str, KlineSeries], encoding: KlineEncoding) -> Tuple[str, dict]:
+    """
+    构建包含K线数据的 user prompt 片段。
+
+    Returns:
+        (prompt 文本, 本次编码的统计信息 {encoding, chars, bytes, tokens})
+    """
+    encoding = KlineEncoding(encoding)
+    payload = encode_klines(kline_data, encoding)
+    fence = "json" if encoding == KlineEncoding.JSON else "csv"
+    text = (
+        f"以下是最新的K线数据 ({_DESCRIPTIONS[encoding]}):\n"
+        f"```{fence}\n{payload}\n```"
+    )
+    return text, {
+        "encoding": encoding.value,
+        "chars": len(payload),
+        "bytes": len(payload.encode("utf-8")),
+        "tokens": estimate_tokens(payload),
+    }
+
+
+def estimate_encodings(kline_data: Dict[str, KlineSeries]) -> Dict[str, dict]:
+    """比较同一份K线在各编码下的大小与估算令牌数。"""
+    result = {}
+    for encoding in KlineEncoding:
+        _, stats = build_kline_prompt(kline_data, encoding)
+        result[encoding.value] = stats
+    return result
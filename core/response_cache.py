@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(model: str, messages: list, params: dict) -> str:
+    """以 (模型, 消息, 参数) 的规范化 JSON 的 SHA-256 作为缓存键。"""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    基于内容寻址的 LLM 响应缓存：TTL 过期 + 按条目数的 LRU 淘汰。
+
+    可选地写穿到本地 SQLite 文件，进程重启后仍可命中。文件读写在专用的单线程中执行，
+    不阻塞事件循环；多个进程共用同一文件时可能遇到锁等待或 "database is locked"，读失败按未命中处理，
+    写失败只记录日志。
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int, persist_path: Optional[str] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._io: Optional[ThreadPoolExecutor] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if persist_path:
+            self._open_store(persist_path)
+
+    def _open_store(self, path: str):
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS ai_response_cache ("
+                "cache_key TEXT PRIMARY KEY, expires_at REAL NOT NULL, response TEXT NOT NULL)"
+            )
+            self._db.execute("DELETE FROM ai_response_cache WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+            logger.info(f"AI 响应缓存持久化文件: {path}")
+        except sqlite3.Error as e:
+            logger.error(f"打开 AI 响应缓存文件 {path} 失败，仅使用内存缓存: {e}")
+            self._db = None
+
+    def _io_executor(self) -> ThreadPoolExecutor:
+        # SQLite 连接只在这一个线程中使用，写入按提交顺序执行
+        if self._io is None:
+            self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache")
+        return self._io
+
+    async def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, response = entry
+            if expires_at >= now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return response
+            del self._entries[key]
+
+        if self._db is not None:
+            try:
+                row = await asyncio.get_running_loop().run_in_executor(self._io_executor(), self._read, key)
+            except sqlite3.Error as e:
+                logger.warning(f"读取 AI 响应缓存文件失败，按未命中处理: {e}")
+                row = None
+            if row and row[0] >= now:
+                self._store(key, row[0], row[1])
+                self.hits += 1
+                return row[1]
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, response: str):
+        """写入内存缓存；持久化文件在后台线程中写入，不等待其完成。"""
+        expires_at = time.time() + self.ttl_seconds
+        self._store(key, expires_at, response)
+        if self._db is not None:
+            self._io_executor().submit(self._write, key, expires_at, response)
+
+    def _read(self, key: str) -> Optional[tuple]:
+        return self._db.execute(
+            "SELECT expires_at, response FROM ai_response_cache WHERE cache_key = ?", (key,)
+        ).fetchone()
+
+    def _write(self, key: str, expires_at: float, response: str):
+        try:
+            self._db.execute(
+                "REPLACE INTO ai_response_cache (cache_key, expires_at, response) VALUES (?, ?, ?)",
+                (key, expires_at, response),
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"写入 AI 响应缓存文件失败: {e}")
+
+    def _store(self, key: str, expires_at: float, response: str):
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        if self._db is not None:
+            self._io_executor().submit(self._clear_store)
+
+    def _clear_store(self):
+        try:
+            self._db.execute("DELETE FROM ai_response_cache")
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"清空 AI 响应缓存文件失败: {e}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": settings.AI_RESPONSE_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self._db is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+# 进程内共享的响应缓存；是否启用由 AI_RESPONSE_CACHE_ENABLED 控制
+response_cache = ResponseCache(
+    ttl_seconds=settings.AI_RESPONSE_CACHE_TTL,
+    max_entries=settings.AI_RESPONSE_CACHE_MAX_ENTRIES,
+    persist_path=settings.AI_RESPONSE_CACHE_FILE if settings.AI_RESPONSE_CACHE_ENABLED else None,
+)
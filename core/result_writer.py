@@ -0,0 +1,265 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from core.config import settings
+from core.database import get_db_connection
+from core.db_executor import db_executor
+from core.metrics import RESULT_FLUSH_SECONDS, GaugeFunc
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_COLUMNS = (
+    "asset", "timestamp", "prompt_id", "cycle", "trend", "confidence", "conclusion",
+    "kline_encoding", "prompt_tokens", "extra_info",
+)
+PLAN_COLUMNS = (
+    "asset", "cycle", "created_at", "direction", "confidence", "entry_price",
+    "stop_loss", "take_profit_1", "take_profit_2", "risk_reward_ratio",
+    "analysis_id", "prompt_id", "extra_info", "status",
+)
+
+
+def _insert_sql(table: str, columns: tuple, rows: int) -> str:
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ", ".join([placeholders] * rows)
+
+
+class AnalysisResult:
+    """一次分析的待写入结果：trade_analysis 一行，以及可选的 trade_plan 一行。"""
+
+    __slots__ = ("data", "symbol", "cycle", "prompt_id", "prompt_stats", "created_at")
+
+    def __init__(self, data: Dict[str, Any], symbol: str, cycle: str, prompt_id: int,
+                 prompt_stats: Optional[Dict[str, Any]] = None):
+        self.data = data
+        self.symbol = symbol
+        self.cycle = cycle
+        self.prompt_id = prompt_id
+        self.prompt_stats = prompt_stats or {}
+        self.created_at = datetime.now()
+
+    @property
+    def plan(self) -> Dict[str, Any]:
+        return self.data.get('tradePlan') or {}
+
+    def analysis_params(self) -> tuple:
+        analysis_data = self.data.get('analysis', {})
+        return (
+            self.symbol,
+            self.created_at,
+            self.prompt_id,
+            self.cycle,
+            analysis_data.get('trend'),
+            analysis_data.get('confidence'),
+            analysis_data.get('conclusion'),
+            self.prompt_stats.get('encoding'),
+            self.prompt_stats.get('tokens'),
+            json.dumps(self.data)  # 将完整原始响应存入 extra_info
+        )
+
+    def plan_params(self, analysis_id: int) -> tuple:
+        plan = self.plan
+        return (
+            self.symbol,
+            self.cycle,
+            self.created_at,
+            plan.get('direction'),
+            plan.get('confidence'),
+            plan.get('entry_price'),
+            plan.get('stop_loss'),
+            plan.get('take_profit_1'),
+            plan.get('take_profit_2'),
+            plan.get('risk_reward_ratio'),
+            analysis_id,
+            self.prompt_id,
+            json.dumps(plan.get('extra_info', {})),
+            'ACTIVE'  # 默认状态
+        )
+
+
+def write_single(result: AnalysisResult) -> int:
+    """以单独的事务写入一条结果，返回 analysis_id。"""
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("未能获取数据库连接以保存分析。")
+    try:
+        cursor = conn.cursor()
+        cursor.execute(_insert_sql("trade_analysis", ANALYSIS_COLUMNS, 1), result.analysis_params())
+        analysis_id = cursor.lastrowid
+        if result.plan:
+            cursor.execute(_insert_sql("trade_plan", PLAN_COLUMNS, 1), result.plan_params(analysis_id))
+        conn.commit()
+        return analysis_id
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def write_batch(results: List[AnalysisResult]) -> List[int]:
+    """
+    在一个事务中用多行 INSERT 写入一批结果，返回与输入顺序一致的 analysis_id 列表。
+
+    InnoDB 为单条多行 INSERT 分配连续的自增 ID，lastrowid 是第一行的 ID。写入计划前在同一事务内
+    读回这段 ID 并核对 (asset, cycle) 顺序；不一致时回滚并抛出异常，由调用方逐条重写。
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("未能获取数据库连接以保存分析。")
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            _insert_sql("trade_analysis", ANALYSIS_COLUMNS, len(results)),
+            [value for r in results for value in r.analysis_params()]
+        )
+        first_id = cursor.lastrowid
+        ids = list(range(first_id, first_id + len(results)))
+
+        cursor.execute(
+            "SELECT id, asset, cycle FROM trade_analysis WHERE id BETWEEN %s AND %s ORDER BY id",
+            (ids[0], ids[-1])
+        )
+        rows = cursor.fetchall()
+        expected = [(i, r.symbol, r.cycle) for i, r in zip(ids, results)]
+        if [tuple(row) for row in rows] != expected:
+            raise RuntimeError("批量插入的自增 ID 不连续，无法关联交易计划。")
+
+        planned = [(i, r) for i, r in zip(ids, results) if r.plan]
+        if planned:
+            cursor.execute(
+                _insert_sql("trade_plan", PLAN_COLUMNS, len(planned)),
+                [value for i, r in planned for value in r.plan_params(i)]
+            )
+        conn.commit()
+        return ids
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+class ResultWriter:
+    """
+    后台结果写入器：缓冲已完成的分析，按批量大小或时间阈值组提交。
+
+    `await submit(result)` 在结果所在的批次提交后返回 analysis_id (组提交)。
+    一个批次只占用一个数据库连接和一个事务；批量写入失败时退回逐条写入，
+    单条失败只影响对应的调用者。
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._closing = False
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.fallbacks = 0
+        self.flush_seconds = 0.0
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._closing = False
+            self._worker = asyncio.create_task(self._run(), name="result-writer")
+            logger.info(f"结果写入器已启动 (批量 {self.batch_size}, 间隔 {self.flush_interval}s)。")
+
+    async def submit(self, result: AnalysisResult) -> int:
+        if self._closing:
+            raise RuntimeError("结果写入器已关闭。")
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self.submitted += 1
+        await self._queue.put((result, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch: list):
+        results = [r for r, _ in batch]
+        start = time.perf_counter()
+        try:
+            ids = await db_executor.run(write_batch, results)
+            outcomes = [(future, analysis_id, None) for (_, future), analysis_id in zip(batch, ids)]
+        except Exception as e:
+            self.fallbacks += 1
+            logger.warning(f"批量写入 {len(batch)} 条结果失败，改为逐条写入: {e}")
+            outcomes = []
+            for result, future in batch:
+                try:
+                    outcomes.append((future, await db_executor.run(write_single, result), None))
+                except Exception as single_error:
+                    outcomes.append((future, None, single_error))
+        elapsed = time.perf_counter() - start
+        RESULT_FLUSH_SECONDS.observe(elapsed)
+        self.batches += 1
+        self.flush_seconds += elapsed
+        for future, analysis_id, error in outcomes:
+            if error is None:
+                self.written += 1
+            else:
+                self.failed += 1
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(analysis_id)
+            else:
+                future.set_exception(error)
+
+    async def close(self):
+        """关闭钩子：写完缓冲中的所有结果后停止后台任务。"""
+        self._closing = True
+        if self._worker is None or self._worker.done():
+            return
+        pending = self._queue.qsize()
+        logger.info(f"正在写入剩余的 {pending} 条分析结果...")
+        await self._queue.put(None)
+        await self._worker
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._queue.qsize() if self._queue else 0,
+            "submitted": self.submitted,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "avg_batch_size": round(self.written / self.batches, 2) if self.batches else 0.0,
+            "fallbacks": self.fallbacks,
+            "avg_flush_seconds": round(self.flush_seconds / self.batches, 4) if self.batches else 0.0,
+        }
+
+
+result_writer = ResultWriter(settings.RESULT_WRITER_BATCH_SIZE, settings.RESULT_WRITER_FLUSH_INTERVAL)
+GaugeFunc("result_writer_pending", "等待写入的分析结果数", lambda: result_writer.stats()["pending"])
+
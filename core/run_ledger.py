@@ -0,0 +1,381 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from core.config import settings
+from core.database import get_db_connection
+from core.db_executor import db_executor
+from core.metrics import GaugeFunc
+
+logger = logging.getLogger(__name__)
+
+RUN_COLUMNS = (
+    "run_id", "task_id", "job_id", "job_attempt", "asset", "cycle", "prompt_id", "fire_time",
+    "started_at", "finished_at", "total_ms", "prompt_load_ms", "kline_ms", "kline_interval_ms",
+    "prepare_ms", "llm_ms", "ttft_ms", "time_to_json_ms", "parse_ms", "save_ms", "model", "retry_count", "cache_hit",
+    "prompt_chars", "response_chars", "prompt_tokens", "completion_tokens", "outcome",
+    "error_class", "analysis_id",
+)
+
+# 可查询的阶段与分组 (白名单，直接拼入 SQL)
+STAGE_COLUMNS = {
+    "total": "total_ms",
+    "prompt_load": "prompt_load_ms",
+    "kline": "kline_ms",
+    "prepare": "prepare_ms",
+    "llm": "llm_ms",
+    "ttft": "ttft_ms",
+    "time_to_json": "time_to_json_ms",
+    "parse": "parse_ms",
+    "save": "save_ms",
+}
+GROUP_COLUMNS = ("asset", "model", "cycle", "task_id", "error_class")
+
+OK = "ok"
+FAILED = "failed"        # 流程内已处理的失败 (如未取到K线、响应无法解析)
+ERROR = "error"          # 未捕获的异常
+CANCELLED = "cancelled"  # 停机时被取消，作业会重新执行
+FAILURE_OUTCOMES = (FAILED, ERROR)
+PERCENTILES = (50, 95, 99)
+
+
+def _ms(seconds: Optional[float]) -> Optional[int]:
+    return None if seconds is None else int(round(seconds * 1000))
+
+
+class TaskRun:
+    """一次 run_analysis_task 的运行记录：各阶段耗时与模型调用信息，结束后交给 run_ledger 批量写入。"""
+
+    __slots__ = (
+        "run_id", "task_id", "job_id", "job_attempt", "asset", "cycle", "prompt_id", "fire_time",
+        "started_at", "finished_at", "total_seconds", "stages", "kline_intervals", "model",
+        "retry_count", "cache_hit", "ttft_seconds", "time_to_json_seconds", "prompt_chars", "response_chars", "prompt_tokens",
+        "completion_tokens", "outcome", "error_class", "analysis_id", "_started",
+    )
+
+    def __init__(self, run_id: str, asset: str, cycle: str, prompt_id: Optional[int],
+                 task_id: Optional[int] = None, job_id: Optional[int] = None,
+                 job_attempt: Optional[int] = None, fire_time: Optional[datetime] = None):
+        self.run_id = run_id
+        self.task_id = task_id
+        self.job_id = job_id
+        self.job_attempt = job_attempt
+        self.asset = asset
+        self.cycle = cycle
+        self.prompt_id = prompt_id
+        self.fire_time = fire_time
+        self.started_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.total_seconds = 0.0
+        self.stages: Dict[str, float] = {}
+        self.kline_intervals: Dict[str, float] = {}
+        self.model: Optional[str] = None
+        self.retry_count = 0
+        self.cache_hit = False
+        self.ttft_seconds: Optional[float] = None
+        self.time_to_json_seconds: Optional[float] = None
+        self.prompt_chars: Optional[int] = None
+        self.response_chars: Optional[int] = None
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.outcome: Optional[str] = None
+        self.error_class: Optional[str] = None
+        self.analysis_id: Optional[int] = None
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        """计时一个阶段；阶段中途返回或抛出异常时同样记录已耗时。"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def record_call(self, call_info: Dict[str, Any]):
+        """从 get_ai_response 回传的 call_info 中取模型、重试次数、流式首令牌/JSON 完整耗时与令牌数。"""
+        self.model = call_info.get("model")
+        self.retry_count = max(0, call_info.get("attempts", 1) - 1)
+        self.cache_hit = bool(call_info.get("cache_hit"))
+        self.ttft_seconds = call_info.get("ttft")
+        self.time_to_json_seconds = call_info.get("time_to_json")
+        self.prompt_tokens = (call_info.get("budget") or {}).get("prompt_tokens")
+        self.completion_tokens = call_info.get("completion_tokens")
+
+    def fail(self, error_class: str) -> bool:
+        """标记流程内已处理的失败，返回 False 以便直接 return。"""
+        self.error_class = error_class
+        return False
+
+    def finish(self, outcome: str, error_class: Optional[str] = None):
+        self.total_seconds = time.perf_counter() - self._started
+        self.finished_at = self.started_at + timedelta(seconds=self.total_seconds)
+        self.outcome = outcome
+        if error_class is not None:
+            self.error_class = error_class
+
+    def params(self) -> tuple:
+        stages = self.stages
+        return (
+            self.run_id, self.task_id, self.job_id, self.job_attempt, self.asset, self.cycle,
+            self.prompt_id, self.fire_time, self.started_at, self.finished_at, _ms(self.total_seconds),
+            _ms(stages.get("prompt_load")), _ms(stages.get("kline")),
+            json.dumps({k: _ms(v) for k, v in self.kline_intervals.items()}) if self.kline_intervals else None,
+            _ms(stages.get("prepare")), _ms(stages.get("llm")), _ms(self.ttft_seconds),
+            _ms(self.time_to_json_seconds), _ms(stages.get("parse")),
+            _ms(stages.get("save")), self.model, self.retry_count, self.cache_hit,
+            self.prompt_chars, self.response_chars, self.prompt_tokens, self.completion_tokens,
+            self.outcome, self.error_class, self.analysis_id,
+        )
+
+
+def write_runs(runs: List[TaskRun]) -> int:
+    """用一条多行 INSERT 写入一批运行记录；重复的 run_id 忽略。"""
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("未能获取数据库连接以写入运行记录。")
+    try:
+        cursor = conn.cursor()
+        placeholders = "(" + ", ".join(["%s"] * len(RUN_COLUMNS)) + ")"
+        cursor.execute(
+            f"INSERT IGNORE INTO task_runs ({', '.join(RUN_COLUMNS)}) VALUES "
+            + ", ".join([placeholders] * len(runs)),
+            [value for run in runs for value in run.params()]
+        )
+        conn.commit()
+        return cursor.rowcount
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+class RunLedger:
+    """
+    运行台账的后台写入器。
+
+    `record(run)` 只把记录放进内存队列，不等待写入，分析流程不会因台账多出任何延迟；
+    后台任务按批量大小或时间阈值用一条多行 INSERT 写入。台账只用于排查和统计，
+    写入失败时丢弃该批并计数，不重试；队列超过上限时新记录直接丢弃。
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_pending: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue(self.max_pending)
+            self._worker = asyncio.create_task(self._run(), name="run-ledger")
+            logger.info(f"运行台账写入器已启动 (批量 {self.batch_size}, 间隔 {self.flush_interval}s)。")
+
+    def record(self, run: TaskRun):
+        if not settings.TASK_RUN_LEDGER_ENABLED:
+            return
+        self.start()
+        try:
+            self._queue.put_nowait(run)
+            self.recorded += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch: List[TaskRun]):
+        try:
+            await db_executor.run(write_runs, batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            logger.error(f"写入 {len(batch)} 条运行记录失败，已丢弃: {e}")
+        self.batches += 1
+
+    async def close(self):
+        """关闭钩子：写完缓冲中的运行记录后停止后台任务。"""
+        if self._worker is None or self._worker.done():
+            return
+        # 队列已满时 put 会等待后台任务腾出位置
+        await self._queue.put(None)
+        await self._worker
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.TASK_RUN_LEDGER_ENABLED,
+            "pending": self._queue.qsize() if self._queue else 0,
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+        }
+
+
+run_ledger = RunLedger(settings.TASK_RUN_BATCH_SIZE, settings.TASK_RUN_FLUSH_INTERVAL, settings.TASK_RUN_MAX_PENDING)
+GaugeFunc("task_run_ledger_pending", "等待写入的运行记录数", lambda: run_ledger.stats()["pending"])
+
+
+# --- 查询 ---
+
+def _window_start(hours: float) -> datetime:
+    return datetime.now() - timedelta(hours=hours)
+
+
+def _query(sql: str, params: tuple) -> List[Dict[str, Any]]:
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("未能获取数据库连接以查询运行记录。")
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def _decode(row: Dict[str, Any]) -> Dict[str, Any]:
+    if isinstance(row.get("kline_interval_ms"), (str, bytes)):
+        row["kline_interval_ms"] = json.loads(row["kline_interval_ms"])
+    return row
+
+
+def get_run(run_id: str) -> Optional[Dict[str, Any]]:
+    rows = _query(f"SELECT {', '.join(RUN_COLUMNS)} FROM task_runs WHERE run_id = %s", (run_id,))
+    return _decode(rows[0]) if rows else None
+
+
+def slowest_runs(hours: float, stage: str = "total", limit: int = 20, asset: Optional[str] = None,
+                 model: Optional[str] = None) -> List[Dict[str, Any]]:
+    """时间窗口内指定阶段耗时最长的运行。"""
+    column = STAGE_COLUMNS[stage]
+    conditions = ["started_at >= %s", f"{column} IS NOT NULL"]
+    params: List[Any] = [_window_start(hours)]
+    if asset:
+        conditions.append("asset = %s")
+        params.append(asset)
+    if model:
+        conditions.append("model = %s")
+        params.append(model)
+    params.append(limit)
+    rows = _query(
+        f"SELECT {', '.join(RUN_COLUMNS)} FROM task_runs WHERE {' AND '.join(conditions)} "
+        f"ORDER BY {column} DESC LIMIT %s",
+        tuple(params)
+    )
+    return [_decode(row) for row in rows]
+
+
+def latency_percentiles(hours: float, group_by: str = "asset", stage: str = "total",
+                        outcome: Optional[str] = OK) -> List[Dict[str, Any]]:
+    """
+    按分组计算时间窗口内某阶段耗时的 p50/p95/p99 (毫秒)。
+
+    MySQL 没有百分位聚合函数，这里用窗口函数在库内给每组样本排名，再按最近秩法取值，
+    每组只返回一行，不把窗口内的全部样本拉到 Python；
+    默认只统计成功的运行，失败的运行往往在中途结束，会拉低分位数。
+    """
+    column = STAGE_COLUMNS[stage]
+    if group_by not in GROUP_COLUMNS:
+        raise ValueError(f"不支持的分组: {group_by}")
+    where = f"started_at >= %s AND {column} IS NOT NULL"
+    params: List[Any] = [_window_start(hours)]
+    if outcome:
+        where += " AND outcome = %s"
+        params.append(outcome)
+    # 最近秩法: 第 p 分位数是排名 >= ceil(p/100 * n) 的最小值，写成 rn * 100 >= p * n 以避开 CEIL
+    percentiles = ", ".join(
+        f"MIN(CASE WHEN rn * 100 >= {p} * n THEN ms END) AS p{p}_ms" for p in PERCENTILES
+    )
+    sql = (
+        f"SELECT grp, COUNT(*) AS runs, {percentiles}, MAX(ms) AS max_ms, AVG(ms) AS avg_ms FROM ("
+        f"SELECT {group_by} AS grp, {column} AS ms, "
+        f"ROW_NUMBER() OVER (PARTITION BY {group_by} ORDER BY {column}) AS rn, "
+        f"COUNT(*) OVER (PARTITION BY {group_by}) AS n "
+        f"FROM task_runs WHERE {where}"
+        f") ranked GROUP BY grp"
+    )
+
+    result = []
+    for row in _query(sql, tuple(params)):
+        item = {group_by: row["grp"], "runs": row["runs"]}
+        for p in PERCENTILES:
+            item[f"p{p}_ms"] = int(row[f"p{p}_ms"])
+        item["max_ms"] = int(row["max_ms"])
+        item["avg_ms"] = round(float(row["avg_ms"]))
+        result.append(item)
+    result.sort(key=lambda item: item["p95_ms"], reverse=True)
+    return result
+
+
+def failure_rates(hours: float, group_by: str = "asset") -> List[Dict[str, Any]]:
+    """按分组统计时间窗口内的失败率，以及各失败类别的次数。被取消的运行不计入分母。"""
+    if group_by not in GROUP_COLUMNS:
+        raise ValueError(f"不支持的分组: {group_by}")
+    rows = _query(
+        f"SELECT {group_by} AS grp, outcome, error_class, COUNT(*) AS n FROM task_runs "
+        f"WHERE started_at >= %s AND outcome <> %s GROUP BY {group_by}, outcome, error_class",
+        (_window_start(hours), CANCELLED)
+    )
+    groups: Dict[Any, Dict[str, Any]] = {}
+    for row in rows:
+        item = groups.setdefault(row["grp"], {group_by: row["grp"], "runs": 0, "failed": 0, "errors": {}})
+        item["runs"] += row["n"]
+        if row["outcome"] in FAILURE_OUTCOMES:
+            item["failed"] += row["n"]
+            error_class = row["error_class"] or "unknown"
+            item["errors"][error_class] = item["errors"].get(error_class, 0) + row["n"]
+    result = list(groups.values())
+    for item in result:
+        item["failure_rate"] = round(item["failed"] / item["runs"], 4) if item["runs"] else 0.0
+    result.sort(key=lambda item: (item["failure_rate"], item["runs"]), reverse=True)
+    return result
+
+
+def purge_runs(retention_days: int) -> int:
+    """删除超过保留期的运行记录。"""
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM task_runs WHERE started_at < %s", (datetime.now() - timedelta(days=retention_days),))
+        conn.commit()
+        return cursor.rowcount
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"清理运行记录时出错: {e}", exc_info=True)
+        return 0
+    finally:
+        conn.close()
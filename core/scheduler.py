@@ -1,29 +1,113 @@
+import asyncio
+import hashlib
+import json
 import logging
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Optional
+
+from apscheduler.executors.asyncio import AsyncIOExecutor
+from apscheduler.executors.base import run_coroutine_job
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.util import iscoroutinefunction_partial
 from apscheduler.jobstores.base import JobLookupError
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from services.analysis_service import run_analysis_task
-from core.database import get_db_connection
+from core.cluster import cluster
+from core.config import settings
+from core.database import get_db_connection, TriggerMode
+from core.db_executor import db_executor
+from core.job_queue import candle_analysed, enqueue_job, record_analysed_candle, reserve_start_slot
+from core.kline_cache import INTERVAL_MS
+from core.load_shaping import CandleCloseTrigger, OffsetCronTrigger, StartPacer, StartRecorder, task_jitter
+from core.market_data import latest_closed_candle
+from core.metrics import ANALYSIS_RUNS, SCHEDULER_FIRE_LAG_SECONDS
 
 logger = logging.getLogger(__name__)
 
 job_defaults = {
-    'coalesce': False,
+    'coalesce': settings.SCHEDULER_CATCHUP_POLICY == "collapse",
     'max_instances': 5,
-    'misfire_grace_time': 300
+    'misfire_grace_time': settings.SCHEDULER_MISFIRE_GRACE_TIME
 }
 
-scheduler = AsyncIOScheduler(timezone="Asia/Shanghai", job_defaults=job_defaults)
+# 当前正在执行的那次触发的计划时间，由 _FireTimeExecutor 在调用作业函数前设置
+_current_fire_time: ContextVar[Optional[datetime]] = ContextVar("scheduled_fire_time", default=None)
 
-def _schedule_all_tasks():
-    """从数据库加载所有激活的定时任务并安排它们。"""
-    logger.info("正在从数据库加载并安排所有激活的定时任务...")
+
+class _FireTimeExecutor(AsyncIOExecutor):
+    """
+    APScheduler 3 不把计划触发时间传给作业函数。这里逐个 run_time 调用 run_coroutine_job，
+    调用前把 run_time 放进上下文变量；错过的触发 (超过 misfire_grace_time) 不会调用作业函数，
+    因此触发时间与调用总是一一对应。
+    """
+
+    def _do_submit_job(self, job, run_times):
+        if not iscoroutinefunction_partial(job.func):
+            return super()._do_submit_job(job, run_times)
+
+        async def run_each():
+            events = []
+            for run_time in run_times:
+                token = _current_fire_time.set(run_time)
+                try:
+                    events.extend(await run_coroutine_job(job, job._jobstore_alias, [run_time], self._logger.name))
+                finally:
+                    _current_fire_time.reset(token)
+            return events
+
+        def callback(f):
+            self._pending_futures.discard(f)
+            try:
+                events = f.result()
+            except BaseException:
+                self._run_job_error(job.id, *sys.exc_info()[1:])
+            else:
+                self._run_job_success(job.id, events)
+
+        f = self._eventloop.create_task(run_each())
+        f.add_done_callback(callback)
+        self._pending_futures.add(f)
+
+
+scheduler = AsyncIOScheduler(
+    timezone="Asia/Shanghai", job_defaults=job_defaults, executors={"default": _FireTimeExecutor()}
+)
+
+JOB_PREFIX = "analysis_task_"
+RECONCILE_JOB_ID = "scheduler_reconcile"
+CHANGE_POLL_JOB_ID = "scheduler_task_changes"
+
+# job_id -> 任务行指纹；只有指纹变化的任务才会被重新安排
+_job_fingerprints: Dict[str, str] = {}
+# cron 无效的任务的指纹，配置未变化时不重复报错
+_invalid_fingerprints: Dict[str, str] = {}
+_reconcile_lock = threading.Lock()
+start_pacer = StartPacer(settings.SCHEDULER_MAX_STARTS_PER_SECOND)
+start_recorder = StartRecorder()
+candle_stats = {"triggers": 0, "runs": 0, "redundant": 0, "not_closed": 0}
+enqueue_stats = {"enqueued": 0, "duplicates": 0, "errors": 0}
+reconcile_stats = {"runs": 0, "added": 0, "modified": 0, "removed": 0, "unchanged": 0, "invalid": 0}
+# 已处理到的 scheduler_task_changes 记录ID；None 表示尚未初始化
+_change_cursor: Optional[int] = None
+change_stats = {"signalled": 0, "received": 0, "errors": 0}
+
+def _fetch_active_tasks(task_id: Optional[int] = None) -> Optional[list]:
+    """
+    从数据库查询激活的定时任务 (同步，异步代码应通过 db_executor 调用)。
+    指定 task_id 时只查询该任务；数据库不可用时返回 None，以免被误判为 "没有任务"。
+    """
     conn = None
     try:
         conn = get_db_connection()
         if not conn:
             logger.error("无法安排任务，数据库连接失败。")
-            return
+            return None
 
         cursor = conn.cursor(dictionary=True)
         
@@ -35,88 +119,449 @@ def _schedule_all_tasks():
                 st.prompt_id, 
                 st.cycle, 
                 st.cron_expression,
+                st.kline_encoding,
+                st.trigger_mode,
                 a.symbol,
                 a.type as asset_type
             FROM scheduled_tasks st
             JOIN assets a ON st.asset_id = a.id
             WHERE st.is_active = TRUE
         """
-        cursor.execute(query)
-        tasks = cursor.fetchall()
-        
-        if not tasks:
-            logger.warning("在数据库中未找到激活的定时任务。")
-            return
+        params = ()
+        if task_id is not None:
+            query += " AND st.id = %s"
+            params = (task_id,)
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    except Exception as e:
+        logger.error(f"加载定时任务时出错: {e}", exc_info=True)
+        return None
+    finally:
+        if conn:
+            conn.close()
 
-        for task in tasks:
-            try:
-                task_id = task['id']
-                job_id = f"analysis_task_{task_id}"
-                cron_string = task['cron_expression']
-                
-                # 将 cron 字符串拆分为秒、分、时、日、月、周
-                cron_parts = cron_string.split()
-                if len(cron_parts) != 6:
-                    raise ValueError("Cron 表达式必须包含 6 个字段 (秒 分 时 日 月 周)。")
-
-                trigger = CronTrigger(
-                    second=cron_parts[0],
-                    minute=cron_parts[1],
-                    hour=cron_parts[2],
-                    day=cron_parts[3],
-                    month=cron_parts[4],
-                    day_of_week=cron_parts[5],
-                    timezone="Asia/Shanghai"
-                )
-                
-                # 准备传递给 run_analysis_task 的参数
-                task_kwargs = {
-                    "asset_id": task['asset_id'],
-                    "prompt_id": task['prompt_id'],
-                    "cycle": task['cycle'],
-                    "symbol": task['symbol'],
-                    "asset_type": task['asset_type']
-                }
-
-                scheduler.add_job(
-                    run_analysis_task,
-                    trigger=trigger,
-                    id=job_id,
-                    name=f"Task {task_id}: {task['symbol']} ({task['cycle']})",
-                    replace_existing=True,
-                    kwargs=task_kwargs
-                )
-                logger.info(f"成功为任务 '{job_id}' (ID: {task_id}) 设置定时: '{cron_string}'")
+def _fingerprint(task: dict) -> str:
+    """任务行中影响调度的所有字段的指纹。"""
+    payload = json.dumps(task, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
 
+def _build_trigger(cron_string: str) -> CronTrigger:
+    # 将 cron 字符串拆分为秒、分、时、日、月、周
+    cron_parts = cron_string.split()
+    if len(cron_parts) != 6:
+        raise ValueError("Cron 表达式必须包含 6 个字段 (秒 分 时 日 月 周)。")
+
+    return CronTrigger(
+        second=cron_parts[0],
+        minute=cron_parts[1],
+        hour=cron_parts[2],
+        day=cron_parts[3],
+        month=cron_parts[4],
+        day_of_week=cron_parts[5],
+        timezone="Asia/Shanghai"
+    )
+
+async def _wait_for_closed_candle(task_id: int, symbol: str, asset_type: int, cycle: str,
+                                  fire_time: Optional[datetime] = None) -> Optional[int]:
+    """
+    等待本次触发对应的那根K线在上游确认收盘，返回其开盘时间。
+
+    对应的K线由作业的触发时间决定，而不是执行时间：在队列中等待或退避重试后才执行的作业，
+    仍然分析它被触发时那根K线，不会跳到之后的K线上。没有触发时间时按当前时间推算。
+    超过 CANDLE_CLOSE_MAX_WAIT 仍未收盘，或该K线已被这个任务成功分析过 (例如补跑的重复触发) 时返回 None。
+    已分析的K线记录在 analysis_jobs 中，所有分析进程共享。
+    """
+    interval_ms = INTERVAL_MS[cycle]
+    settle_ms = int(settings.CANDLE_CLOSE_SETTLE_SECONDS * 1000)
+    if fire_time is None:
+        base_ms = int(time.time() * 1000)
+    else:
+        # 作业行中的触发时间是调度器时区的本地时间
+        aware = fire_time if fire_time.tzinfo else fire_time.replace(tzinfo=scheduler.timezone)
+        base_ms = int(aware.timestamp() * 1000)
+    # 触发时间在周期边界之后 (等待时间 + 偏移)，边界之前的那根就是应当收盘的K线
+    expected = (base_ms - settle_ms) // interval_ms * interval_ms - interval_ms
+    deadline = time.monotonic() + settings.CANDLE_CLOSE_MAX_WAIT
+    while True:
+        closed = await latest_closed_candle(symbol, cycle, asset_type, settle_ms)
+        if closed is not None and closed >= expected:
+            break
+        if time.monotonic() >= deadline:
+            candle_stats["not_closed"] += 1
+            logger.warning(f"任务 {task_id}: {symbol} {cycle} K线 {expected} 在等待后仍未收盘，跳过本次分析。")
+            return None
+        await asyncio.sleep(settings.CANDLE_CLOSE_POLL_INTERVAL)
+
+    if await db_executor.run(candle_analysed, task_id, expected):
+        candle_stats["redundant"] += 1
+        logger.info(f"任务 {task_id}: {symbol} {cycle} K线 {expected} 已分析过，跳过重复分析。")
+        return None
+    return expected
+
+async def _enqueue_scheduled_task(task_id: int, trigger_mode: str, task_kwargs: dict):
+    """定时作业入口：只把本次触发写入 analysis_jobs，由工作者池执行。"""
+    fire_time = _current_fire_time.get() or datetime.now(scheduler.timezone)
+    SCHEDULER_FIRE_LAG_SECONDS.observe(max(0.0, (datetime.now(scheduler.timezone) - fire_time).total_seconds()))
+    payload = {"trigger_mode": trigger_mode, "task_kwargs": task_kwargs}
+    try:
+        created = await db_executor.run(enqueue_job, task_id, fire_time, payload)
+    except Exception as e:
+        enqueue_stats["errors"] += 1
+        logger.error(f"任务 {task_id} 入队失败 (触发时间 {fire_time}): {e}", exc_info=True)
+        return
+    if created:
+        enqueue_stats["enqueued"] += 1
+    else:
+        enqueue_stats["duplicates"] += 1
+        logger.info(f"任务 {task_id} 在 {fire_time} 的触发已入队过，忽略重复触发。")
+
+async def _pace_start() -> float:
+    """
+    按 SCHEDULER_MAX_STARTS_PER_SECOND 排队启动，返回等待的秒数。
+
+    节拍在数据库中共享，上限对所有分析进程合计生效；数据库不可用时退回本进程内的节拍。
+    """
+    if settings.SCHEDULER_MAX_STARTS_PER_SECOND <= 0:
+        return 0.0
+    try:
+        delay = await db_executor.run(reserve_start_slot, 1.0 / settings.SCHEDULER_MAX_STARTS_PER_SECOND)
+    except Exception as e:
+        logger.warning(f"预约共享启动时间失败，改用本进程限速: {e}")
+        return await start_pacer.wait()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    return delay
+
+async def execute_task_job(task_id: int, trigger_mode: str, task_kwargs: dict, job_id: Optional[int] = None,
+                           run_info: Optional[dict] = None, fire_time: Optional[datetime] = None) -> bool:
+    """
+    执行一个已领取的分析作业：按每秒启动上限排队后再执行分析 (补跑的触发也在这里被摊开)。
+    返回 False 表示分析失败；candle_close 任务因K线未收盘或重复而跳过视为成功。
+    candle_close 任务只有在分析成功后才把该K线记到作业行上，失败重试时会重新分析同一根K线。
+    run_info 透传给 run_analysis_task，用于回传失败类别；fire_time 是作业的触发时间，决定 candle_close 任务分析哪根K线。
+    """
+    waited = await _pace_start()
+    start_recorder.record(waited)
+    closed = None
+    if trigger_mode == TriggerMode.CANDLE_CLOSE.value:
+        candle_stats["triggers"] += 1
+        closed = await _wait_for_closed_candle(
+            task_id, task_kwargs["symbol"], task_kwargs["asset_type"], task_kwargs["cycle"], fire_time
+        )
+        if closed is None:
+            ANALYSIS_RUNS.labels("skipped").inc()
+            return True
+        candle_stats["runs"] += 1
+    try:
+        ok = await run_analysis_task(**task_kwargs, run_info=run_info)
+    except Exception:
+        ANALYSIS_RUNS.labels("error").inc()
+        raise
+    ANALYSIS_RUNS.labels("ok" if ok else "failed").inc()
+    if ok and closed is not None and job_id is not None:
+        try:
+            await db_executor.run(record_analysed_candle, job_id, closed)
+        except Exception as e:
+            logger.error(f"任务 {task_id}: 记录已分析的K线 {closed} 失败: {e}")
+    return ok
+
+def _build_task_trigger(task: dict):
+    """按任务的触发方式构建触发器。cron 无效时抛出 ValueError。"""
+    jitter = task_jitter(task['id'], settings.SCHEDULER_JITTER_SECONDS)
+    if (task.get('trigger_mode') or TriggerMode.CRON.value) == TriggerMode.CANDLE_CLOSE.value:
+        return CandleCloseTrigger(
+            INTERVAL_MS[task['cycle']], settings.CANDLE_CLOSE_SETTLE_SECONDS + jitter, scheduler.timezone
+        )
+    return OffsetCronTrigger(_build_trigger(task['cron_expression']), jitter)
+
+def _schedule_task(task: dict):
+    """为单个任务安排 (或替换) 定时作业。cron 无效时抛出 ValueError。"""
+    task_id = task['id']
+    job_id = f"{JOB_PREFIX}{task_id}"
+    trigger = _build_task_trigger(task)
+
+    # 准备传递给 run_analysis_task 的参数
+    task_kwargs = {
+        "asset_id": task['asset_id'],
+        "prompt_id": task['prompt_id'],
+        "cycle": task['cycle'],
+        "symbol": task['symbol'],
+        "asset_type": task['asset_type'],
+        "kline_encoding": task['kline_encoding']
+    }
+
+    scheduler.add_job(
+        _enqueue_scheduled_task,
+        trigger=trigger,
+        id=job_id,
+        name=f"Task {task_id}: {task['symbol']} ({task['cycle']})",
+        replace_existing=True,
+        kwargs={
+            "task_id": task_id,
+            "trigger_mode": task.get('trigger_mode') or TriggerMode.CRON.value,
+            "task_kwargs": task_kwargs
+        }
+    )
+
+def _remove_job(job_id: str):
+    try:
+        scheduler.remove_job(job_id)
+    except JobLookupError:
+        pass
+    _job_fingerprints.pop(job_id, None)
+    _invalid_fingerprints.pop(job_id, None)
+
+def _apply_tasks(tasks: list, task_id: Optional[int] = None) -> dict:
+    """
+    将查询到的任务与当前作业对比，只新增、修改或删除有变化的作业。
+
+    task_id 为 None 时 tasks 是全部激活任务，不在其中的作业会被删除；
+    否则只对账该任务 (tasks 为空表示它已被删除或停用)。
+    """
+    summary = {"added": 0, "modified": 0, "removed": 0, "unchanged": 0, "invalid": 0}
+    if settings.CLUSTER_ENABLED:
+        # 集群模式下只安排哈希环分配给本节点的任务，其余的由其他节点负责
+        tasks = [task for task in tasks if cluster.owns(task['id'])]
+    with _reconcile_lock:
+        desired = {f"{JOB_PREFIX}{task['id']}": task for task in tasks}
+        if task_id is None:
+            existing = {job.id for job in scheduler.get_jobs() if job.id.startswith(JOB_PREFIX)}
+            existing |= set(_job_fingerprints) | set(_invalid_fingerprints)
+        else:
+            existing = {f"{JOB_PREFIX}{task_id}"}
+
+        for job_id in existing - set(desired):
+            if scheduler.get_job(job_id) is not None or job_id in _job_fingerprints or job_id in _invalid_fingerprints:
+                _remove_job(job_id)
+                summary["removed"] += 1
+                logger.info(f"已移除任务 '{job_id}'。")
+
+        for job_id, task in desired.items():
+            fingerprint = _fingerprint(task)
+            known = _job_fingerprints.get(job_id)
+            if known == fingerprint and scheduler.get_job(job_id) is not None:
+                summary["unchanged"] += 1
+                continue
+            if _invalid_fingerprints.get(job_id) == fingerprint:
+                summary["invalid"] += 1
+                continue
+            try:
+                _schedule_task(task)
             except ValueError as e:
                 logger.error(f"为任务ID {task.get('id')} 提供的 cron 字符串无效: '{task.get('cron_expression')}'。跳过该任务。错误: {e}")
+                # 旧的作业已不再反映数据库中的配置，一并移除
+                _remove_job(job_id)
+                _invalid_fingerprints[job_id] = fingerprint
+                summary["invalid"] += 1
+                continue
             except Exception as e:
-                logger.error(f"在启动时为任务ID {task.get('id')} 安排任务时发生未知错误: {e}", exc_info=True)
-            
+                logger.error(f"为任务ID {task.get('id')} 安排任务时发生未知错误: {e}", exc_info=True)
+                summary["invalid"] += 1
+                continue
+            _job_fingerprints[job_id] = fingerprint
+            _invalid_fingerprints.pop(job_id, None)
+            summary["added" if known is None else "modified"] += 1
+            logger.info(f"成功为任务 '{job_id}' (ID: {task['id']}) 设置定时: '{task['cron_expression']}'")
+
+        reconcile_stats["runs"] += 1
+        for key, value in summary.items():
+            reconcile_stats[key] += value
+    return summary
+
+def reconcile_tasks(task_id: Optional[int] = None) -> Optional[dict]:
+    """
+    按数据库对账调度器作业 (同步)。task_id 为 None 时对账全部任务。
+
+    由同步的 API 路由调用 (FastAPI 已在线程池中执行它们)，因此这里直接查询数据库。
+    """
+    tasks = _fetch_active_tasks(task_id)
+    if tasks is None:
+        return None
+    summary = _apply_tasks(tasks, task_id)
+    logger.info(f"调度器对账完成 (任务: {task_id if task_id is not None else '全部'}): {summary}")
+    return summary
+
+async def _periodic_reconcile():
+    """定期全量对账，兜底遗漏的变更 (例如直接修改数据库，或丢失的变更通知)。"""
+    tasks = await db_executor.run(_fetch_active_tasks)
+    if tasks is None:
+        return
+    summary = _apply_tasks(tasks)
+    if any(summary[key] for key in ("added", "modified", "removed", "invalid")):
+        logger.info(f"定期对账发现变更: {summary}")
+
+async def _cluster_heartbeat():
+    """刷新集群租约；随后做一次对账 (基于指纹，代价很小)，使成员变化和其他节点上的编辑及时生效。"""
+    changed = await db_executor.run(cluster.heartbeat)
+    if changed:
+        logger.info(f"集群成员变化，重新分配任务: {cluster.live_nodes}")
+    await _periodic_reconcile()
+
+def _record_task_change(task_id: Optional[int]):
+    """写入一条任务变更通知 (同步)，其他进程中的调度器轮询到后只对账该任务。"""
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("未能获取数据库连接以通知任务变更。")
+    try:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO scheduler_task_changes (task_id) VALUES (%s)", (task_id,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def _fetch_task_changes(after_id: Optional[int]) -> tuple:
+    """
+    返回 (最新的变更ID, after_id 之后变更过的任务ID列表)；列表中的 None 表示需要全量对账。
+    after_id 为 None 时只返回当前最新ID，用于启动时定位。
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("未能获取数据库连接以读取任务变更。")
+    try:
+        cursor = conn.cursor()
+        if after_id is None:
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM scheduler_task_changes")
+            return cursor.fetchone()[0], []
+        cursor.execute("SELECT id, task_id FROM scheduler_task_changes WHERE id > %s ORDER BY id", (after_id,))
+        rows = cursor.fetchall()
+        if not rows:
+            return after_id, []
+        return rows[-1][0], list(dict.fromkeys(task_id for _, task_id in rows))
+    finally:
+        conn.close()
+
+def _purge_task_changes():
+    """清理一天前的变更通知 (同步)。"""
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM scheduler_task_changes WHERE created_at < NOW() - INTERVAL 1 DAY")
+        conn.commit()
     except Exception as e:
-        logger.error(f"安排定时任务时出错: {e}", exc_info=True)
+        conn.rollback()
+        logger.warning(f"清理任务变更通知失败: {e}")
     finally:
-        if conn:
-            conn.close()
+        conn.close()
+
+async def _poll_task_changes():
+    """读取其他进程 (API 进程或集群中的其他节点) 写入的任务变更，逐个对账对应的任务。"""
+    global _change_cursor
+    try:
+        _change_cursor, task_ids = await db_executor.run(_fetch_task_changes, _change_cursor)
+    except Exception as e:
+        change_stats["errors"] += 1
+        logger.warning(f"读取任务变更通知失败，等待下次轮询或定期对账: {e}")
+        return
+    if not task_ids:
+        return
+    change_stats["received"] += len(task_ids)
+    if None in task_ids:
+        await _periodic_reconcile()
+        return
+    for task_id in task_ids:
+        tasks = await db_executor.run(_fetch_active_tasks, task_id)
+        if tasks is not None:
+            summary = _apply_tasks(tasks, task_id)
+            logger.info(f"收到任务 {task_id} 的变更通知，对账结果: {summary}")
+
+def reload_scheduler_tasks(task_id: Optional[int] = None):
+    """
+    兼容旧接口：对账指定任务 (或全部任务)，只改动有变化的作业。
 
-def reload_scheduler_tasks():
-    """清空现有任务并从数据库重新加载所有任务。"""
-    logger.info("正在重新加载所有调度器任务...")
-    scheduler.remove_all_jobs()
-    _schedule_all_tasks()
-    logger.info("调度器任务重新加载完成。")
+    调度器在本进程时立即对账；调度器在其他进程 (manage.py serve 的 API 进程) 或有其他集群节点时，
+    另外写入一条变更通知，由调度进程在 SCHEDULER_CHANGE_POLL_INTERVAL 秒内对账该任务。
+    """
+    if settings.runs_scheduler:
+        reconcile_tasks(task_id)
+    if settings.runs_scheduler and not settings.CLUSTER_ENABLED:
+        return
+    try:
+        _record_task_change(task_id)
+        change_stats["signalled"] += 1
+    except Exception as e:
+        change_stats["errors"] += 1
+        logger.error(f"通知调度进程任务 {task_id} 的变更失败，将在下次定期对账时生效: {e}")
 
-def start_scheduler():
-    """启动调度器并添加定时任务。"""
+async def start_scheduler():
+    """启动调度器并添加定时任务。数据库查询在 db_executor 中执行，不阻塞事件循环。"""
     if scheduler.running:
         logger.warning("调度器已在运行中。")
         return
 
-    _schedule_all_tasks()
+    if settings.CLUSTER_ENABLED:
+        await db_executor.run(cluster.heartbeat)
+        logger.info(f"集群模式: 本节点 {cluster.node_id}, 存活节点 {cluster.live_nodes}")
+
+    global _change_cursor
+    try:
+        # 先定位变更通知，之后写入的通知都会被轮询到
+        _change_cursor, _ = await db_executor.run(_fetch_task_changes, None)
+        await db_executor.run(_purge_task_changes)
+    except Exception as e:
+        logger.warning(f"读取任务变更通知失败，将只依赖定期对账: {e}")
+
+    logger.info("正在从数据库加载并安排所有激活的定时任务...")
+    tasks = await db_executor.run(_fetch_active_tasks)
+    if tasks is not None:
+        if not tasks:
+            logger.warning("在数据库中未找到激活的定时任务。")
+        logger.info(f"任务加载完成: {_apply_tasks(tasks)}")
+
+    if settings.CLUSTER_ENABLED:
+        scheduler.add_job(
+            _cluster_heartbeat,
+            trigger=IntervalTrigger(seconds=cluster.heartbeat_interval),
+            id=RECONCILE_JOB_ID,
+            name="Cluster heartbeat and reconcile",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
+        )
+    else:
+        scheduler.add_job(
+            _periodic_reconcile,
+            trigger=IntervalTrigger(seconds=settings.SCHEDULER_RECONCILE_INTERVAL),
+            id=RECONCILE_JOB_ID,
+            name="Scheduler reconcile",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
+        )
+    scheduler.add_job(
+        _poll_task_changes,
+        trigger=IntervalTrigger(seconds=settings.SCHEDULER_CHANGE_POLL_INTERVAL),
+        id=CHANGE_POLL_JOB_ID,
+        name="Scheduler task change poll",
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1
+    )
     
     scheduler.start()
     logger.info("调度器已启动。")
 
+def load_shaping_stats() -> dict:
+    """触发偏移与实际启动时间的分布。"""
+    offsets = [
+        job.trigger.offset.total_seconds() for job in scheduler.get_jobs()
+        if job.id.startswith(JOB_PREFIX) and isinstance(job.trigger, (OffsetCronTrigger, CandleCloseTrigger))
+    ]
+    return {
+        "jitter_window_seconds": settings.SCHEDULER_JITTER_SECONDS,
+        "max_starts_per_second": settings.SCHEDULER_MAX_STARTS_PER_SECOND,
+        "catchup_policy": settings.SCHEDULER_CATCHUP_POLICY,
+        # 各任务触发偏移按整秒分桶
+        "jitter_offsets": {str(k): v for k, v in sorted(Counter(int(o) for o in offsets).items())},
+        "starts": start_recorder.stats(),
+        "candle_close": candle_stats,
+        "enqueue": enqueue_stats,
+    }
+
 def shutdown_scheduler():
     """关闭调度器。"""
     if scheduler.running:
@@ -130,7 +575,7 @@ if __name__ == '__main__':
 
     async def main():
         # 假设数据库已初始化
-        start_scheduler()
+        await start_scheduler()
         try:
             while True:
                 await asyncio.sleep(3600)
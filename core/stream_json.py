@@ -0,0 +1,145 @@
+import json
+from typing import List, Optional
+
+from core.tokenizer import estimate_tokens
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+class StreamAbort(ValueError):
+    """流式输出已不可能产生有效 JSON，应提前中止并重试。"""
+
+
+class StreamingJSONExtractor:
+    """
+    增量消费模型的流式输出：
+
+    - 实时丢弃 `<think>...</think>` 思考段 (标签可能被拆分在多个分片中)；
+    - 在可见文本中逐字符跟踪括号与字符串状态，第一个完整且可被解析的 JSON 对象出现时立即返回；
+    - 可见文本超过 `max_preamble` 个字符仍未出现 `{` 时抛出 StreamAbort。
+    """
+
+    def __init__(self, max_preamble: int = 2000):
+        self.max_preamble = max_preamble
+        self.visible = ""
+        self.consumed_chars = 0
+        self.consumed_tokens = 0
+        self._pending = ""
+        self._in_think = False
+        self._pos = 0
+        self._start = -1
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str) -> Optional[str]:
+        """输入一个分片；JSON 对象完整时返回其文本，否则返回 None。"""
+        self.consumed_chars += len(text)
+        self.consumed_tokens += estimate_tokens(text)
+        visible = self._strip_think(text)
+        if visible:
+            self.visible += visible
+        return self._scan()
+
+    def _strip_think(self, text: str) -> str:
+        buf = self._pending + text
+        self._pending = ""
+        out = []
+        while buf:
+            if self._in_think:
+                idx = buf.find(THINK_CLOSE)
+                if idx == -1:
+                    self._pending = _partial_suffix(buf, THINK_CLOSE)
+                    return "".join(out)
+                buf = buf[idx + len(THINK_CLOSE):]
+                self._in_think = False
+                continue
+
+            close_idx = buf.find(THINK_CLOSE)
+            open_idx = buf.find(THINK_OPEN)
+            if close_idx != -1 and (open_idx == -1 or close_idx < open_idx):
+                # 部分模型省略开标签，只输出闭标签：此前的内容都属于思考
+                out.clear()
+                self._reset_visible()
+                buf = buf[close_idx + len(THINK_CLOSE):]
+                continue
+            if open_idx == -1:
+                suffix = _partial_suffix(buf, THINK_OPEN) or _partial_suffix(buf, THINK_CLOSE)
+                out.append(buf[:len(buf) - len(suffix)])
+                self._pending = suffix
+                return "".join(out)
+            out.append(buf[:open_idx])
+            buf = buf[open_idx + len(THINK_OPEN):]
+            self._in_think = True
+        return "".join(out)
+
+    def _reset_visible(self):
+        self.visible = ""
+        self._pos = 0
+        self._restart(-1)
+
+    def _restart(self, pos: int):
+        self._start = -1
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        if pos >= 0:
+            self._pos = pos
+
+    def _scan(self) -> Optional[str]:
+        text = self.visible
+        i = self._pos
+        while i < len(text):
+            c = text[i]
+            if self._start == -1:
+                if c == "{":
+                    self._start = i
+                    self._stack = ["}"]
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c == "{":
+                self._stack.append("}")
+            elif c == "[":
+                self._stack.append("]")
+            elif c in "}]":
+                if self._stack[-1] != c:
+                    # 括号不匹配：这个 `{` 不是 JSON 的开头，从其后重新寻找
+                    i = self._start + 1
+                    self._restart(i)
+                    continue
+                self._stack.pop()
+                if not self._stack:
+                    candidate = text[self._start:i + 1]
+                    try:
+                        json.loads(candidate)
+                    except ValueError:
+                        i = self._start + 1
+                        self._restart(i)
+                        continue
+                    self._pos = i + 1
+                    return candidate
+            i += 1
+
+        self._pos = i
+        if self._start == -1 and len(text) > self.max_preamble:
+            raise StreamAbort(f"输出 {len(text)} 个字符后仍未出现 JSON 对象")
+        return None
+
+
+def _partial_suffix(buf: str, tag: str) -> str:
+    """返回 buf 末尾可能是 tag 前缀的部分，用于处理被拆分的标签。"""
+    for size in range(min(len(tag) - 1, len(buf)), 0, -1):
+        if tag.startswith(buf[-size:]):
+            return buf[-size:]
+    return ""
@@ -0,0 +1,196 @@
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List, Optional
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+READY_PATH = "/api/system/ready"
+
+
+class ChildProcess:
+    """一个按角色运行 main:app 的 uvicorn 子进程。"""
+
+    def __init__(self, name: str, role: str, host: str, port: int, workers: int = 1,
+                 env: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.role = role
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.env = env or {}
+        self.process: Optional[subprocess.Popen] = None
+        self.restarts = 0
+        self.started_at = 0.0
+        self.backoff = 1.0
+        self.restart_at: Optional[float] = None  # 意外退出后计划重启的时间 (monotonic)
+
+    def command(self) -> List[str]:
+        return [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", self.host,
+            "--port", str(self.port),
+            "--workers", str(self.workers),
+            "--timeout-graceful-shutdown", str(int(settings.SERVE_SHUTDOWN_TIMEOUT)),
+        ]
+
+    def start(self):
+        env = dict(os.environ, APP_ROLE=self.role, **self.env)
+        # 独立的进程组：终端的 Ctrl-C 只发给管理进程，由它按顺序停止子进程
+        self.process = subprocess.Popen(self.command(), cwd=PROJECT_ROOT, env=env, start_new_session=True)
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        logger.info(f"[{self.name}] 已启动 (pid {self.process.pid}, 端口 {self.port}, 进程数 {self.workers})。")
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def ready(self) -> bool:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{self.port}{READY_PATH}", timeout=2) as response:
+                return response.status == 200
+        except Exception:
+            return False
+
+    def wait_ready(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self.alive():
+                return False
+            if self.ready():
+                return True
+            time.sleep(0.5)
+        return False
+
+    def signal(self, signum: int):
+        if self.alive():
+            self.process.send_signal(signum)
+
+    def stop(self, timeout: float):
+        """发送 SIGTERM 让 uvicorn 优雅退出 (执行 lifespan 关闭流程)，超时后强制结束。"""
+        if not self.alive():
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"[{self.name}] 在 {timeout}s 内未退出，强制结束。")
+            self.process.kill()
+            self.process.wait()
+        logger.info(f"[{self.name}] 已停止。")
+
+
+class ProcessSupervisor:
+    """
+    生产环境进程拓扑：N 个 API 进程 (不含调度器)、恰好一个调度进程、若干分析执行进程。
+
+    - 调度进程负责数据库迁移，因此最先启动，就绪后再启动其余进程。
+    - 子进程意外退出时按指数退避自动重启。
+    - SIGTERM/SIGINT：依次停止 API (不再接收请求)、分析进程 (归还执行中的作业)、调度进程。
+    - SIGHUP：滚动重启。多进程 API 由 uvicorn 逐个替换；其余进程逐个重启并等待就绪后再处理下一个。
+    """
+
+    def __init__(self, host: str, port: int, api_workers: int, analysis_processes: int):
+        self.scheduler = ChildProcess("scheduler", "scheduler", host, port + 1)
+        self.api = ChildProcess("api", "api", host, port, workers=api_workers)
+        # 每个分析进程写自己的任务日志文件 (同一目录)，避免多个进程同时轮转同一个文件
+        task_log_base = settings.TASK_LOG_FILE[:-len(".jsonl")] if settings.TASK_LOG_FILE.endswith(".jsonl") \
+            else settings.TASK_LOG_FILE
+        self.analysis = [
+            ChildProcess(f"analysis-{i}", "worker", host, port + 2 + i,
+                         env={"TASK_LOG_FILE": f"{task_log_base}-analysis-{i}.jsonl"})
+            for i in range(analysis_processes)
+        ]
+        self._stopping = False
+        self._reload_requested = False
+
+    @property
+    def children(self) -> List[ChildProcess]:
+        return [self.scheduler, self.api, *self.analysis]
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_reload(self, signum, frame):
+        self._reload_requested = True
+
+    def _restart(self, child: ChildProcess):
+        child.stop(settings.SERVE_SHUTDOWN_TIMEOUT)
+        child.start()
+        if not child.wait_ready(settings.SERVE_SHUTDOWN_TIMEOUT):
+            logger.warning(f"[{child.name}] 重启后未在 {settings.SERVE_SHUTDOWN_TIMEOUT}s 内就绪。")
+
+    def rolling_restart(self):
+        logger.info("收到 SIGHUP，开始滚动重启...")
+        if self.api.workers > 1:
+            # uvicorn 的多进程管理器会先启动新进程、就绪后再结束旧进程
+            self.api.signal(signal.SIGHUP)
+        else:
+            self._restart(self.api)
+        for child in self.analysis:
+            if self._stopping:
+                return
+            self._restart(child)
+        if not self._stopping:
+            self._restart(self.scheduler)
+        logger.info("滚动重启完成。")
+
+    def _supervise(self):
+        """
+        每 0.5 秒检查一次子进程。意外退出的子进程记下计划重启时间，到点后再启动；
+        等待退避期间照常检查其他子进程和信号，不在这里阻塞。
+        """
+        while not self._stopping:
+            if self._reload_requested:
+                self._reload_requested = False
+                self.rolling_restart()
+            now = time.monotonic()
+            for child in self.children:
+                if self._stopping or child.alive():
+                    continue
+                if child.restart_at is None:
+                    # 稳定运行一段时间后重置退避
+                    if now - child.started_at > 60:
+                        child.backoff = 1.0
+                    child.restart_at = now + child.backoff
+                    logger.error(
+                        f"[{child.name}] 意外退出 (返回码 {child.process.returncode})，"
+                        f"{child.backoff:.0f}s 后重启。"
+                    )
+                    child.backoff = min(child.backoff * 2, 30.0)
+                elif now >= child.restart_at:
+                    child.restart_at = None
+                    child.restarts += 1
+                    child.start()
+            time.sleep(0.5)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+
+        logger.info(
+            f"启动进程拓扑: API x{self.api.workers} (端口 {self.api.port}), 调度 x1 (端口 {self.scheduler.port}), "
+            f"分析执行 x{len(self.analysis)} (端口 {', '.join(str(c.port) for c in self.analysis) or '-'})"
+        )
+        self.scheduler.start()
+        if not self.scheduler.wait_ready(settings.SERVE_SHUTDOWN_TIMEOUT):
+            logger.warning("调度进程尚未就绪 (数据库不可用?)，继续启动其余进程。")
+        self.api.start()
+        for child in self.analysis:
+            child.start()
+
+        try:
+            self._supervise()
+        finally:
+            logger.info("正在停止所有子进程...")
+            for child in [self.api, *self.analysis, self.scheduler]:
+                child.stop(settings.SERVE_SHUTDOWN_TIMEOUT)
+            logger.info("所有子进程已停止。")
@@ -0,0 +1,177 @@
+import glob
+import gzip
+import json
+import logging
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import TimedRotatingFileHandler
+from typing import Any, Dict, Iterator, List, Optional
+
+# 分析任务日志使用固定名称的记录器；每次运行的区分放在记录的字段里，而不是记录器名称里
+TASK_LOGGER_NAME = "task"
+RUN_FIELDS = ("run_id", "task_id", "job_id", "symbol", "cycle")
+
+_run_context: ContextVar[Dict[str, Any]] = ContextVar("run_context", default={})
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_run() -> Dict[str, Any]:
+    return _run_context.get()
+
+
+@contextmanager
+def run_context(**fields):
+    """在当前协程 (及其派生的任务) 内附加运行上下文，期间的所有日志都会带上这些字段。"""
+    token = _run_context.set({**_run_context.get(), **fields})
+    try:
+        yield _run_context.get()
+    finally:
+        _run_context.reset(token)
+
+
+class RunContextFilter(logging.Filter):
+    """在产生日志的线程/协程中把运行上下文写入日志记录 (必须挂在 QueueHandler 上，而不是监听线程里)。"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _run_context.get()
+        for field in RUN_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, context.get(field))
+        return True
+
+
+class JsonLineFormatter(logging.Formatter):
+    """每条日志一行 JSON，运行上下文作为独立字段。"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in RUN_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # 经过队列的记录：堆栈已在 _ContextQueueHandler.prepare 中格式化
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _gzip_namer(name: str) -> str:
+    return name + ".gz"
+
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def build_task_log_handler(path: str, retention_days: int) -> logging.Handler:
+    """
+    汇总的任务日志文件：JSONL 格式，每天零点轮转并 gzip 压缩，保留 retention_days 天。
+    只接收带 run_id 的记录 (任务日志，以及运行期间其他模块产生的日志)。
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    handler = TimedRotatingFileHandler(path, when="midnight", backupCount=retention_days, encoding="utf-8")
+    handler.namer = _gzip_namer
+    handler.rotator = _gzip_rotator
+    handler.setFormatter(JsonLineFormatter())
+    handler.addFilter(lambda record: getattr(record, "run_id", None) is not None)
+    return handler
+
+
+# --- 查询 ---
+
+def _log_file_groups(directory: str, date: Optional[str]) -> List[List[str]]:
+    """
+    按日期分组选出要读取的文件，新的日期在前。
+
+    每个进程写自己的文件 (如 tasks-analysis-{i}.jsonl)，同一天的日志分散在多个文件里，
+    因此以"一天的全部文件"为读取单位：当天的日志在未轮转的 .jsonl 文件中，之前各天在 .jsonl.<日期>.gz 中。
+    """
+    current = sorted(glob.glob(os.path.join(directory, "*.jsonl")))
+    if date is not None and date != datetime.now().strftime("%Y-%m-%d"):
+        return [sorted(glob.glob(os.path.join(directory, f"*.jsonl.{date}.gz")))]
+    groups = [current]
+    if date is None:
+        rotated: Dict[str, List[str]] = {}
+        for path in glob.glob(os.path.join(directory, "*.jsonl.*.gz")):
+            rotated.setdefault(path[:-len(".gz")].rsplit(".", 1)[-1], []).append(path)
+        groups.extend(sorted(paths) for _, paths in sorted(rotated.items(), reverse=True))
+    return groups
+
+
+def _iter_entries(path: str) -> Iterator[Dict[str, Any]]:
+    opener = gzip.open if path.endswith(".gz") else open
+    try:
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        return
+
+
+def read_task_logs(directory: str, run_id: Optional[str] = None, task_id: Optional[int] = None,
+                   symbol: Optional[str] = None, level: Optional[str] = None, date: Optional[str] = None,
+                   limit: int = 500) -> List[Dict[str, Any]]:
+    """按运行ID / 任务ID / 交易对 / 级别筛选任务日志，按时间顺序返回最多 limit 条。"""
+    matched: List[Dict[str, Any]] = []
+    # 当天所有进程的文件总是读完；之后的每组都早于已收集的条目，够数即可停止
+    for paths in _log_file_groups(directory, date):
+        matched = [
+            entry for path in paths for entry in _iter_entries(path)
+            if (run_id is None or entry.get("run_id") == run_id)
+            and (task_id is None or entry.get("task_id") == task_id)
+            and (symbol is None or entry.get("symbol") == symbol)
+            and (level is None or entry.get("level") == level)
+        ] + matched
+        if len(matched) >= limit:
+            break
+    matched.sort(key=lambda entry: entry.get("ts", ""))
+    return matched[-limit:]
+
+
+def summarize_runs(directory: str, date: Optional[str] = None, task_id: Optional[int] = None,
+                   limit: int = 100) -> List[Dict[str, Any]]:
+    """按运行汇总：起止时间、日志条数和最高日志级别，最近的运行在前。"""
+    severity = {"DEBUG": 0, "INFO": 1, "WARNING": 2, "ERROR": 3, "CRITICAL": 4}
+    runs: Dict[str, Dict[str, Any]] = {}
+    for paths in _log_file_groups(directory, date):
+        for entry in (entry for path in paths for entry in _iter_entries(path)):
+            run_id = entry.get("run_id")
+            if run_id is None or (task_id is not None and entry.get("task_id") != task_id):
+                continue
+            run = runs.get(run_id)
+            if run is None:
+                run = runs[run_id] = {
+                    "run_id": run_id, "task_id": entry.get("task_id"), "symbol": entry.get("symbol"),
+                    "cycle": entry.get("cycle"), "started": entry["ts"], "finished": entry["ts"],
+                    "entries": 0, "max_level": entry["level"],
+                }
+            for field in ("task_id", "symbol", "cycle"):
+                run[field] = run[field] or entry.get(field)
+            run["started"] = min(run["started"], entry["ts"])
+            run["finished"] = max(run["finished"], entry["ts"])
+            run["entries"] += 1
+            if severity.get(entry["level"], 0) > severity.get(run["max_level"], 0):
+                run["max_level"] = entry["level"]
+        # 同 read_task_logs：当天的文件总是读完，之后的每组都早于已收集的运行
+        if len(runs) >= limit:
+            break
+    return sorted(runs.values(), key=lambda run: run["started"], reverse=True)[:limit]
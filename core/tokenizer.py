@@ -0,0 +1,58 @@
+import logging
+import re
+from functools import lru_cache
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 近似 BPE 分词器 (如 cl100k) 的切分方式：数字按最多 3 位一组，字母串、
+# 单个 CJK 字符和标点各算一个片段。tiktoken 不可用时作为回退。
+_TOKEN_PATTERN = re.compile(r"\d{1,3}|[A-Za-z]+|[一-鿿]|[^\sA-Za-z\d一-鿿]")
+
+# 每条消息在 chat 格式中的固定开销 (role、分隔符等)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """加载本地 tiktoken 编码；未安装或词表不可用时返回 None。"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(settings.AI_TOKENIZER_ENCODING)
+            logger.info(f"已加载本地分词器: {settings.AI_TOKENIZER_ENCODING}")
+        except Exception as e:
+            logger.warning(f"无法加载 tiktoken 分词器，将使用近似估算: {e}")
+            _encoding = None
+    return _encoding
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的令牌数 (不依赖分词器)。"""
+    if not text:
+        return 0
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+@lru_cache(maxsize=512)
+def count_tokens(text: str) -> int:
+    """计算文本的令牌数，结果按文本内容缓存。"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(message: dict) -> int:
+    return count_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+def tokenizer_name() -> str:
+    return settings.AI_TOKENIZER_ENCODING if _get_encoding() is not None else "estimate"
@@ -1,36 +1,69 @@
 import asyncio
 import logging
+import time
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
-from api.routes import analysis, assets, auth, prompts, tasks, plans, dictionary
-from core.scheduler import scheduler, start_scheduler
+from api.routes import analysis, assets, auth, prompts, tasks, plans, dictionary, jobs, metrics, runs, task_logs, system
+from core.scheduler import shutdown_scheduler, start_scheduler
 from core.database import init_db, init_connection_pool, close_connection_pool
+from core.cluster import cluster
+from core.config import settings
+from core.db_executor import db_executor
+from core.prompt_cache import prompt_cache
+from core.result_writer import result_writer
+from core.run_ledger import run_ledger
+from services.job_worker import worker_pool
 from core.logger import setup_logging
+from core.market_data import close_async_client
+from core.metrics import HTTP_REQUEST_SECONDS
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
-    应用生命周期管理：
-    1. 应用启动时，初始化数据库表结构。
-    2. 应用启动时，启动后台任务调度器。
+    应用生命周期管理 (按 APP_ROLE 决定本进程承担的部分)：
+    1. 应用启动时，初始化数据库表结构 (只由运行调度器的进程执行，避免多个进程同时迁移)。
+    2. 应用启动时，启动后台任务调度器 (all / scheduler)。
+    3. 应用启动时，启动分析工作者池 (all / worker)。
     """
     # 启动
     setup_logging()
-    logging.info("应用启动，正在初始化数据库连接池...")
+    logging.info(f"应用启动 (角色: {settings.APP_ROLE})，正在初始化数据库连接池...")
     init_connection_pool()
-    logging.info("应用启动，正在检查/初始化数据库 schema...")
-    init_db()
+    if settings.runs_scheduler:
+        logging.info("应用启动，正在检查/初始化数据库 schema...")
+        init_db()
+    if settings.runs_analysis_workers:
+        logging.info("应用启动，正在预热提示词缓存...")
+        await db_executor.run(prompt_cache.warm)
     
-    logging.info("应用启动，开始调度任务...")
-    start_scheduler()
+    if settings.runs_scheduler:
+        logging.info("应用启动，开始调度任务...")
+        await start_scheduler()
+    if settings.runs_analysis_workers:
+        worker_pool.start()
     yield
     # 关闭
-    logging.info("应用关闭，停止调度任务...")
-    scheduler.shutdown()
+    if settings.runs_scheduler:
+        logging.info("应用关闭，停止调度任务...")
+        shutdown_scheduler()
+        if settings.CLUSTER_ENABLED:
+            logging.info("应用关闭，正在注销集群节点...")
+            await db_executor.run(cluster.leave)
+    if settings.runs_analysis_workers:
+        logging.info("应用关闭，正在停止分析工作者池...")
+        await worker_pool.stop()
+    logging.info("应用关闭，正在关闭 K-line HTTP 连接池...")
+    await close_async_client()
+    logging.info("应用关闭，正在写入缓冲中的分析结果...")
+    await result_writer.close()
+    logging.info("应用关闭，正在写入缓冲中的运行记录...")
+    await run_ledger.close()
+    logging.info("应用关闭，正在等待数据库线程池中的操作完成...")
+    db_executor.shutdown()
     logging.info("应用关闭，正在关闭数据库连接池...")
     close_connection_pool()
 
@@ -50,6 +83,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def _route_template(request: Request) -> str:
+    """匹配到的路由模板 (如 /api/runs/{run_id})；未匹配到 API 路由的请求 (静态文件、404) 归为一类。"""
+    template = getattr(request.scope.get("route"), "path", None)
+    if not template:
+        return "other"
+    # 较新的 FastAPI 中 include_router 不复制路由，route.path 不含前缀 (如 /api)；
+    # 前缀是固定字面量，取实际路径中模板之前的那几段补上 (已含前缀时这部分为空)
+    prefix = request.url.path.split("/")[:-template.count("/")]
+    return "/".join(prefix) + template
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """按路由模板 (而不是实际路径) 记录 API 请求耗时，避免路径参数造成标签爆炸。"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_REQUEST_SECONDS.labels(request.method, _route_template(request), status).observe(
+            time.perf_counter() - started
+        )
+
 # 包含API路由
 app.include_router(analysis.router, prefix="/api", tags=["分析"])
 app.include_router(assets.router, prefix="/api", tags=["资产"])
@@ -58,6 +115,11 @@ app.include_router(prompts.router, prefix="/api", tags=["提示词"])
 app.include_router(tasks.router, prefix="/api", tags=["定时任务"])
 app.include_router(plans.router, prefix="/api", tags=["交易计划"])
 app.include_router(dictionary.router, prefix="/api", tags=["字典"])
+app.include_router(jobs.router, prefix="/api", tags=["分析作业"])
+app.include_router(task_logs.router, prefix="/api", tags=["任务日志"])
+app.include_router(runs.router, prefix="/api", tags=["运行记录"])
+app.include_router(system.router, prefix="/api", tags=["系统"])
+app.include_router(metrics.router)
 
 # 挂载静态文件目录
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -8,11 +8,15 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 import uvicorn
-from core.database import init_db
+from core.database import init_db, init_connection_pool
 
 def main():
     parser = argparse.ArgumentParser(description="AI 交易分析工具的管理脚本。")
-    parser.add_argument('command', help='要运行的命令', choices=['init-db', 'run'])
+    parser.add_argument('command', help='要运行的命令', choices=['init-db', 'run', 'serve', 'explain-plans'])
+    parser.add_argument('--host', help='serve: 监听地址 (默认 SERVE_HOST)')
+    parser.add_argument('--port', type=int, help='serve: API 端口 (默认 SERVE_PORT)')
+    parser.add_argument('--api-workers', type=int, help='serve: API 进程数 (默认 SERVE_API_WORKERS，0 表示 CPU 核数)')
+    parser.add_argument('--analysis-processes', type=int, help='serve: 分析执行进程数 (默认 SERVE_ANALYSIS_PROCESSES)')
 
     args = parser.parse_args()
 
@@ -24,6 +28,20 @@ def main():
         except Exception as e:
             print(f"数据库初始化过程中发生错误: {e}")
             sys.exit(1)
+    elif args.command == 'explain-plans':
+        # 检查交易计划常见筛选组合的执行计划，出现全表扫描或文件排序时以非零状态退出
+        from api.routes.plans import explain_plan_queries
+        init_connection_pool()
+        try:
+            report = explain_plan_queries()
+        except RuntimeError as e:
+            print(e)
+            sys.exit(1)
+        for item in report:
+            flag = "OK  " if item['ok'] else "FAIL"
+            print(f"[{flag}] {item['case']}: type={item['type']} key={item['key']} extra={item['extra']}")
+        if not all(item['ok'] for item in report):
+            sys.exit(1)
     elif args.command == 'run':
         print("正在使用 uvicorn 启动 Web 服务器...")
         # 注意: 我们将应用字符串传递给 uvicorn.run()
@@ -35,6 +53,22 @@ def main():
             reload=True,
             log_level="info"
         )
+    elif args.command == 'serve':
+        # 生产模式：API、调度、分析执行分别运行在独立进程中，见 core/supervisor.py
+        import logging
+        from core.config import settings
+        from core.supervisor import ProcessSupervisor
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - supervisor - %(levelname)s - %(message)s')
+        api_workers = args.api_workers if args.api_workers is not None else settings.SERVE_API_WORKERS
+        analysis_processes = (
+            args.analysis_processes if args.analysis_processes is not None else settings.SERVE_ANALYSIS_PROCESSES
+        )
+        ProcessSupervisor(
+            host=args.host or settings.SERVE_HOST,
+            port=args.port or settings.SERVE_PORT,
+            api_workers=api_workers or os.cpu_count() or 1,
+            analysis_processes=analysis_processes,
+        ).run()
     else:
         print(f"未知命令: {args.command}")
         parser.print_help()
@@ -2,9 +2,12 @@ from pydantic import BaseModel
 from typing import Optional
 import datetime
 
+from core.database import KlineEncoding
+
 class PromptBase(BaseModel):
     name: str
     content: str
+    kline_encoding: Optional[KlineEncoding] = None
 
 class PromptCreate(PromptBase):
     pass
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from core.database import Cycle, PlanStatus
+from typing import Optional
+from core.database import Cycle, KlineEncoding, PlanStatus, TriggerMode
 
 class TriggerRequest(BaseModel):
     asset: str
@@ -8,7 +9,9 @@ class CreateTaskRequest(BaseModel):
     asset_id: int
     prompt_id: int
     cycle: Cycle
-    cron_expression: str
+    cron_expression: str = ""  # trigger_mode 为 candle_close 时不使用
+    kline_encoding: Optional[KlineEncoding] = None
+    trigger_mode: TriggerMode = TriggerMode.CRON
     is_active: bool = True
 
 class UpdatePlanStatusRequest(BaseModel):
@@ -14,6 +14,7 @@ CREATE TABLE IF NOT EXISTS prompts (
     version INT NOT NULL COMMENT '版本号, 每个name下自增',
     content TEXT NOT NULL COMMENT '提示词的具体内容',
     is_active BOOLEAN NOT NULL DEFAULT FALSE COMMENT '是否为当前全局激活的版本',
+    kline_encoding VARCHAR(20) NULL COMMENT 'K线在Prompt中的编码方式，NULL 表示使用全局默认',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     UNIQUE KEY `idx_name_version` (`name`, `version`),
     INDEX `idx_is_active` (`is_active`)
@@ -26,6 +27,8 @@ CREATE TABLE IF NOT EXISTS scheduled_tasks (
     prompt_id INT NOT NULL COMMENT '关联的提示词ID',
     cycle ENUM('1m','5m','15m','1h','4h','1d') NOT NULL COMMENT '分析周期',
     cron_expression VARCHAR(100) NOT NULL COMMENT 'Cron表达式，定义执行周期',
+    kline_encoding VARCHAR(20) NULL COMMENT 'K线编码方式，非空时覆盖提示词的设置',
+    trigger_mode VARCHAR(20) NOT NULL DEFAULT 'cron' COMMENT '触发方式: cron 按表达式; candle_close 在该周期K线收盘后触发',
     is_active BOOLEAN NOT NULL DEFAULT TRUE COMMENT '任务是否激活',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
@@ -33,6 +36,92 @@ CREATE TABLE IF NOT EXISTS scheduled_tasks (
     FOREIGN KEY (prompt_id) REFERENCES prompts(id) ON DELETE CASCADE
 ) COMMENT='定时分析任务配置表';
 
+-- scheduler_nodes: 集群模式下的调度节点租约表
+CREATE TABLE IF NOT EXISTS scheduler_nodes (
+    node_id VARCHAR(64) PRIMARY KEY COMMENT '节点ID',
+    hostname VARCHAR(255) NULL COMMENT '主机名',
+    pid INT NULL COMMENT '进程号',
+    started_at DOUBLE NOT NULL COMMENT '节点启动时间 (Unix 秒)',
+    heartbeat_at DOUBLE NOT NULL COMMENT '最近一次心跳时间 (Unix 秒)'
+) COMMENT='调度节点租约表';
+
+-- scheduler_task_changes: 任务变更通知 (API 进程写入，调度进程轮询后只对账对应的任务)
+CREATE TABLE IF NOT EXISTS scheduler_task_changes (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY COMMENT '通知ID',
+    task_id INT NULL COMMENT '变更的任务ID，NULL 表示需要全量对账',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '写入时间',
+    INDEX idx_created_at (created_at)
+) COMMENT='定时任务变更通知';
+
+-- analysis_jobs: 持久化的分析作业队列 (调度器入队，工作者池领取执行)
+CREATE TABLE IF NOT EXISTS analysis_jobs (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY COMMENT '作业ID',
+    task_id INT NOT NULL COMMENT '关联的定时任务ID',
+    fire_time DATETIME(3) NOT NULL COMMENT '计划触发时间，与 task_id 一起作为幂等键',
+    payload JSON NOT NULL COMMENT '执行参数',
+    status VARCHAR(20) NOT NULL DEFAULT 'PENDING' COMMENT '状态: PENDING, RUNNING, DONE, DEAD (死信)',
+    attempts INT NOT NULL DEFAULT 0 COMMENT '已尝试次数',
+    max_attempts INT NOT NULL DEFAULT 3 COMMENT '最多尝试次数',
+    available_at DATETIME NOT NULL COMMENT 'PENDING: 可被领取的时间 / RUNNING: 租约到期时间',
+    lease_token VARCHAR(32) NULL COMMENT '当前租约令牌',
+    leased_by VARCHAR(128) NULL COMMENT '最近领取该作业的工作者',
+    last_error TEXT NULL COMMENT '最近一次失败原因',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '入队时间',
+    started_at DATETIME NULL COMMENT '最近一次开始执行的时间',
+    finished_at DATETIME NULL COMMENT '完成或转入死信的时间',
+    candle_open_time BIGINT NULL COMMENT 'candle_close 任务成功分析的K线开盘时间 (毫秒)',
+    UNIQUE KEY uk_task_fire (task_id, fire_time),
+    INDEX idx_status_available (status, available_at),
+    INDEX idx_status_finished (status, finished_at),
+    INDEX idx_task_candle (task_id, candle_open_time)
+) COMMENT='分析作业队列';
+
+-- job_start_slots: 所有分析进程共享的启动节拍 (每秒启动上限)
+CREATE TABLE IF NOT EXISTS job_start_slots (
+    name VARCHAR(32) PRIMARY KEY COMMENT '节拍名称',
+    next_slot DOUBLE NOT NULL COMMENT '下一个可用启动时间槽 (Unix 时间戳，按数据库时钟)'
+) COMMENT='分析作业启动节拍';
+
+-- task_runs: 每次分析运行的分阶段耗时台账 (由后台批量写入)
+CREATE TABLE IF NOT EXISTS task_runs (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY COMMENT '记录ID',
+    run_id VARCHAR(32) NOT NULL COMMENT '运行ID，与任务日志中的 run_id 一致',
+    task_id INT NULL COMMENT '定时任务ID (手动触发时为空)',
+    job_id BIGINT NULL COMMENT '分析作业ID',
+    job_attempt INT NULL COMMENT '作业的第几次尝试',
+    asset VARCHAR(50) NOT NULL COMMENT '资产符号',
+    cycle VARCHAR(10) NOT NULL COMMENT '分析周期',
+    prompt_id INT NULL COMMENT '使用的提示词ID',
+    fire_time DATETIME(3) NULL COMMENT '计划触发时间',
+    started_at DATETIME(3) NOT NULL COMMENT '开始执行时间',
+    finished_at DATETIME(3) NOT NULL COMMENT '结束时间',
+    total_ms INT NOT NULL COMMENT '总耗时 (毫秒)',
+    prompt_load_ms INT NULL COMMENT '加载提示词耗时',
+    kline_ms INT NULL COMMENT '获取全部K线耗时',
+    kline_interval_ms JSON NULL COMMENT '各K线周期的获取耗时',
+    prepare_ms INT NULL COMMENT '构建 Prompt (编码与指标) 耗时',
+    llm_ms INT NULL COMMENT '模型调用耗时 (含排队与重试)',
+    ttft_ms INT NULL COMMENT '流式响应的首令牌耗时 (应答模型的单次调用内)',
+    time_to_json_ms INT NULL COMMENT '流式响应中 JSON 完整的耗时',
+    parse_ms INT NULL COMMENT '提取并解析 JSON 耗时',
+    save_ms INT NULL COMMENT '保存结果耗时',
+    model VARCHAR(100) NULL COMMENT '实际应答的模型',
+    retry_count INT NOT NULL DEFAULT 0 COMMENT '模型调用重试次数',
+    cache_hit BOOLEAN NOT NULL DEFAULT FALSE COMMENT '是否命中响应缓存',
+    prompt_chars INT NULL COMMENT '系统提示词与用户输入的字符数',
+    response_chars INT NULL COMMENT '模型响应的字符数',
+    prompt_tokens INT NULL COMMENT '输入令牌数',
+    completion_tokens INT NULL COMMENT '输出令牌数',
+    outcome VARCHAR(20) NOT NULL COMMENT '结果: ok, failed, error, cancelled',
+    error_class VARCHAR(100) NULL COMMENT '失败类别或异常类名',
+    analysis_id INT NULL COMMENT '保存成功时对应的 trade_analysis ID',
+    UNIQUE KEY uk_run_id (run_id),
+    INDEX idx_started (started_at),
+    INDEX idx_asset_started (asset, started_at),
+    INDEX idx_model_started (model, started_at),
+    INDEX idx_task_started (task_id, started_at)
+) COMMENT='分析运行耗时台账';
+
 -- trade_analysis: AI行情分析结果表 (重构)
 CREATE TABLE IF NOT EXISTS trade_analysis (
     id INT AUTO_INCREMENT PRIMARY KEY COMMENT '记录ID',
@@ -43,9 +132,12 @@ CREATE TABLE IF NOT EXISTS trade_analysis (
     trend VARCHAR(50) NULL COMMENT '趋势判断 (e.g., BULLISH, BEARISH, SIDEWAYS)',
     confidence FLOAT NULL COMMENT '置信度 (0.0 to 1.0)',
     conclusion VARCHAR(255) NULL COMMENT '一句话结论',
+    kline_encoding VARCHAR(20) NULL COMMENT '本次分析使用的K线编码方式',
+    prompt_tokens INT NULL COMMENT '本次分析 Prompt 的估算令牌数',
     extra_info JSON NULL COMMENT 'AI返回的原始响应或其他扩展字段 (扩展字段)',
     FOREIGN KEY (prompt_id) REFERENCES prompts(id) ON DELETE SET NULL,
-    INDEX idx_asset_timestamp (asset, timestamp)
+    INDEX idx_asset_timestamp (asset, timestamp),
+    INDEX idx_timestamp (timestamp, id)
 ) COMMENT='AI行情分析结果表';
 
 -- trade_plan: AI 生成的交易计划表 (新增)
@@ -68,7 +160,12 @@ CREATE TABLE IF NOT EXISTS trade_plan (
   PRIMARY KEY (id),
   KEY idx_asset_time (asset, created_at),
   KEY idx_analysis_id (analysis_id),
-  KEY idx_status (status),
+  KEY idx_created_at (created_at),
+  -- 常见筛选组合：等值条件在前，created_at 在后，既能做范围筛选也能按时间倒序免排序
+  KEY idx_status_time (status, created_at),
+  KEY idx_status_dir_time (status, direction, created_at),
+  KEY idx_asset_cycle_status_dir_time (asset, cycle, status, direction, created_at),
+  KEY idx_prompt_time (prompt_id, created_at),
   CONSTRAINT trade_plan_ibfk_1
     FOREIGN KEY (analysis_id) REFERENCES trade_analysis (id) ON DELETE SET NULL,
   CONSTRAINT trade_plan_ibfk_2
@@ -0,0 +1,93 @@
+"""
+数据库访问对事件循环延迟的影响：对比在协程中直接执行阻塞查询与通过 db_executor 执行。
+
+在项目根目录运行: python -m scripts.bench_db_executor [--tasks N] [--real]
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from core.db_executor import db_executor
+
+
+async def lag_probe(stop: asyncio.Event, interval: float = 0.005) -> list:
+    """每隔 interval 醒来一次，记录实际醒来时间相对预期的延迟。"""
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+    return lags
+
+
+async def scenario(task_fn, tasks: int) -> tuple:
+    stop = asyncio.Event()
+    probe = asyncio.create_task(lag_probe(stop))
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    await asyncio.gather(*(task_fn() for _ in range(tasks)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    lags = sorted(await probe)
+    return elapsed, lags
+
+
+def report(name: str, elapsed: float, lags: list):
+    p = lambda q: lags[min(len(lags) - 1, int(q * (len(lags) - 1)))] * 1000 if lags else 0.0
+    print(
+        f"{name:<10} 总耗时 {elapsed:7.3f}s | 事件循环延迟 p50 {p(0.5):8.2f}ms  "
+        f"p99 {p(0.99):8.2f}ms  max {(lags[-1] * 1000 if lags else 0.0):8.2f}ms  (样本 {len(lags)})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库访问对事件循环延迟的影响")
+    parser.add_argument("--tasks", type=int, default=50, help="并发的分析任务数")
+    parser.add_argument("--queries", type=int, default=2, help="每个任务的数据库往返次数 (读取提示词 + 保存结果)")
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟的单次查询耗时 (秒)")
+    parser.add_argument("--real", action="store_true", help="使用真实的 MySQL 连接池执行 SELECT SLEEP(latency)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.real:
+        from core.database import get_db_connection, init_connection_pool
+        init_connection_pool()
+
+        def query():
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT SLEEP(%s)", (args.latency,))
+                cursor.fetchall()
+            finally:
+                conn.close()
+    else:
+        def query():
+            time.sleep(args.latency)
+
+    async def blocking_task():
+        for _ in range(args.queries):
+            query()
+            await asyncio.sleep(0)
+
+    async def executor_task():
+        for _ in range(args.queries):
+            await db_executor.run(query)
+
+    async def run():
+        print(
+            f"{args.tasks} 个任务 x {args.queries} 次查询, 单次 {args.latency * 1000:.0f}ms, "
+            f"线程池 {db_executor.max_workers} ({'MySQL' if args.real else '模拟'})"
+        )
+        report("直接调用", *await scenario(blocking_task, args.tasks))
+        report("线程池", *await scenario(executor_task, args.tasks))
+        print(db_executor.stats())
+        db_executor.shutdown()
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
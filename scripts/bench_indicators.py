@@ -0,0 +1,60 @@
+"""
+技术指标微基准：向量化实现 vs 逐K线循环。
+
+在项目根目录运行: python -m scripts.bench_indicators [--candles N] [--repeat N]
+实现之间的一致性由 tests/test_indicators.py 覆盖，这里只计时。
+"""
+import argparse
+import time
+
+import numpy as np
+
+from core.indicators import _calculate_zigzag_loop, _ema_loop, compute_indicators, ema, zigzag
+from core.kline_cache import INTERVAL_MS
+from core.kline_series import KlineSeries
+
+
+def random_series(candles: int, seed: int = 42) -> KlineSeries:
+    rng = np.random.default_rng(seed)
+    # 波动率接近 BTC 15m K线 (单根约 0.3%)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.003, candles)))
+    high = close * (1 + np.abs(rng.normal(0, 0.0015, candles)))
+    low = close * (1 - np.abs(rng.normal(0, 0.0015, candles)))
+    return KlineSeries(
+        np.arange(candles, dtype=np.int64) * INTERVAL_MS["15m"], close, high, low, close, np.ones(candles)
+    )
+
+
+def benchmark(candles: int, repeat: int):
+    series = random_series(candles)
+    high, low, close = series.high, series.low, series.close
+    dicts = [{"high": h, "low": l} for h, l in zip(high.tolist(), low.tolist())]
+    closes = close.tolist()
+
+    def _time(fn):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - started) / repeat * 1000
+
+    rows = [
+        ("zigzag loop", _time(lambda: _calculate_zigzag_loop(dicts))),
+        ("zigzag loop + dicts", _time(lambda: _calculate_zigzag_loop(
+            [{"high": float(row[2]), "low": float(row[3])} for row in series.to_rows()]
+        ))),
+        ("zigzag numpy", _time(lambda: zigzag(high, low))),
+        ("ema20 loop", _time(lambda: _ema_loop(closes, 20))),
+        ("ema20 numpy", _time(lambda: ema(close, 20))),
+        ("all indicators numpy", _time(lambda: compute_indicators(series, 3.0))),
+    ]
+    print(f"candles={candles}, repeat={repeat}")
+    for name, ms in rows:
+        print(f"  {name:<22} {ms:10.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="技术指标微基准：向量化实现 vs 逐K线循环。")
+    parser.add_argument("--candles", type=int, default=100_000, help="生成的K线数量。")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数。")
+    args = parser.parse_args()
+    benchmark(args.candles, args.repeat)
@@ -0,0 +1,115 @@
+"""
+分析结果写入吞吐量测试：对比逐条事务写入与批量组提交。
+
+在项目根目录运行: python -m scripts.bench_result_writer [--rows N] [--real]
+"""
+import argparse
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict
+
+import core.result_writer as result_writer_module
+from core.config import settings
+from core.db_executor import db_executor
+from core.result_writer import ANALYSIS_COLUMNS, AnalysisResult, result_writer, write_single
+
+
+def _install_simulated_pool(rtt: float, commit: float):
+    """模拟连接池：最多 DB_POOL_SIZE 个连接，每条语句 rtt，每次提交 commit 耗时。"""
+    pool = threading.BoundedSemaphore(settings.DB_POOL_SIZE)
+    id_lock = threading.Lock()
+    next_id = [1]
+    table: Dict[int, tuple] = {}
+
+    class _Cursor:
+        lastrowid = None
+
+        def execute(self, sql, params=()):
+            time.sleep(rtt)
+            if sql.startswith("INSERT INTO trade_analysis"):
+                n = sql.count("(%s") or 1
+                with id_lock:
+                    self.lastrowid = next_id[0]
+                    next_id[0] += n
+                width = len(ANALYSIS_COLUMNS)
+                for k in range(n):
+                    row = params[k * width:(k + 1) * width]
+                    table[self.lastrowid + k] = (self.lastrowid + k, row[0], row[3])
+                self._rows = []
+            elif sql.startswith("SELECT"):
+                self._rows = [table[i] for i in range(params[0], params[1] + 1)]
+
+        def fetchall(self):
+            return self._rows
+
+    class _Conn:
+        def __init__(self):
+            pool.acquire()
+
+        def cursor(self):
+            return _Cursor()
+
+        def commit(self):
+            time.sleep(commit)
+
+        def rollback(self):
+            pass
+
+        def close(self):
+            pool.release()
+
+    # write_single/write_batch 通过模块全局名查找连接
+    result_writer_module.get_db_connection = _Conn
+
+
+def make_result(i: int) -> AnalysisResult:
+    data = {
+        "analysis": {"trend": "UP", "confidence": 0.7, "conclusion": "benchmark"},
+        "tradePlan": {"direction": "LONG", "entry_price": 100.0 + i, "stop_loss": 95.0} if i % 2 == 0 else {},
+    }
+    return AnalysisResult(data, f"BENCH{i % 50}", "1h", 0, {"encoding": "json", "tokens": 1000})
+
+
+async def _run(args):
+    async def single_rows():
+        await asyncio.gather(*(db_executor.run(write_single, make_result(i)) for i in range(args.rows)))
+
+    async def batched():
+        await asyncio.gather(*(result_writer.submit(make_result(i)) for i in range(args.rows)))
+        await result_writer.close()
+
+    print(
+        f"{args.rows} 条结果, 连接池 {settings.DB_POOL_SIZE}, 批量 {result_writer.batch_size}"
+        + ("" if args.real else f", 模拟 rtt {args.rtt * 1000:.1f}ms / commit {args.commit * 1000:.1f}ms")
+    )
+    for name, scenario in (("逐条事务", single_rows), ("批量组提交", batched)):
+        start = time.perf_counter()
+        await scenario()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<8} {elapsed:7.3f}s  {args.rows / elapsed:9.1f} 条/秒")
+    print(result_writer.stats())
+    db_executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析结果写入吞吐量测试")
+    parser.add_argument("--rows", type=int, default=200, help="同时完成的分析数")
+    parser.add_argument("--rtt", type=float, default=0.001, help="模拟的单条语句往返耗时 (秒)")
+    parser.add_argument("--commit", type=float, default=0.005, help="模拟的提交 (刷盘) 耗时 (秒)")
+    parser.add_argument("--real", action="store_true", help="写入 DATABASE_URL 指向的真实 MySQL (会插入测试数据)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.real:
+        from core.database import init_connection_pool
+        init_connection_pool()
+    else:
+        _install_simulated_pool(args.rtt, args.commit)
+    asyncio.run(_run(args))
+
+
+if __name__ == '__main__':
+    main()
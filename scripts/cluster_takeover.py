@@ -0,0 +1,62 @@
+"""
+集群租约与任务分片的本地多进程演示。
+
+多个进程共享同一个数据库 (SQLite 文件或 DATABASE_URL 指向的 MySQL)，每个进程打印自己负责的任务数；
+结束其中一个进程后，其余进程应在一个租约周期内接管它的任务。在项目根目录启动多个：
+
+    python -m scripts.cluster_takeover --sqlite /tmp/cluster.db --tasks 200 &
+"""
+import argparse
+import logging
+import signal
+import sqlite3
+import threading
+import time
+
+from core.cluster import NODES_DDL, ClusterMembership
+from core.config import settings
+from core.database import get_db_connection
+
+
+def main():
+    parser = argparse.ArgumentParser(description="集群租约与任务分片的本地多进程测试")
+    parser.add_argument("--sqlite", help="SQLite 文件路径；不提供时使用 DATABASE_URL 指向的 MySQL")
+    parser.add_argument("--tasks", type=int, default=200, help="模拟的任务数 (任务ID 1..N)")
+    parser.add_argument("--node-id", help="节点ID，默认自动生成")
+    parser.add_argument("--lease", type=float, help="覆盖 CLUSTER_LEASE_SECONDS")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.lease:
+        settings.CLUSTER_LEASE_SECONDS = args.lease
+
+    if args.sqlite:
+        def connect():
+            return sqlite3.connect(args.sqlite, timeout=10)
+        node = ClusterMembership(args.node_id, connect=connect, placeholder="?")
+    else:
+        from core.database import init_connection_pool
+        init_connection_pool()
+        connect = get_db_connection
+        node = ClusterMembership(args.node_id)
+
+    conn = connect()
+    conn.cursor().execute(NODES_DDL)
+    conn.commit()
+    conn.close()
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+
+    task_ids = list(range(1, args.tasks + 1))
+    while not stopping.is_set():
+        node.heartbeat()
+        owned = [t for t in task_ids if node.owns(t)]
+        print(f"[{node.node_id}] {time.strftime('%H:%M:%S')} 存活节点 {len(node.live_nodes)}, 负责 {len(owned)} 个任务", flush=True)
+        stopping.wait(node.heartbeat_interval)
+    node.leave()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,24 @@
+import asyncio
 import logging
 import json
-import os
-from datetime import datetime
-from typing import Tuple, Optional, Dict, Any
-
-from core.market_data import fetch_all_kline_data_concurrently
-from core.ai_client import get_ai_response, _extract_json_from_response
-from core.database import get_db_connection
+import time
+from typing import Optional, Dict, Any
+
+from core.market_data import fetch_all_kline_data_async
+from core.ai_client import get_ai_response, _extract_json_from_response, CYCLE_PRIORITY, DEFAULT_PRIORITY
+from core.config import settings
+from core.indicators import indicator_engine
+from core.prompt_cache import ParsedPrompt, prompt_cache
+from core.prompt_encoding import build_kline_prompt
+from core.result_writer import AnalysisResult, result_writer
+from core.database import KlineEncoding
+from core.metrics import DB_SAVE_SECONDS, JSON_EXTRACT_SECONDS
+from core.db_executor import db_executor
+from core.run_ledger import CANCELLED, ERROR, FAILED, OK, TaskRun, run_ledger
+from core.task_log import TASK_LOGGER_NAME, current_run, new_run_id, run_context
 
 logger = logging.getLogger(__name__)
+task_logger = logging.getLogger(TASK_LOGGER_NAME)
 
 ASSET_TYPE_MAP = {
     0: "现货 (Spot)",
@@ -16,190 +26,177 @@ ASSET_TYPE_MAP = {
     2: "币本位合约 (COIN-M Futures)"
 }
 
-def _setup_task_logger(symbol: str, cycle: str):
-    """为单个分析任务设置专用的文件日志记录器。"""
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    log_dir = f"logs/tasks-{date_str}"
-    os.makedirs(log_dir, exist_ok=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_file = os.path.join(log_dir, f"{symbol}_{cycle}_{timestamp}.log")
-    
-    task_logger_name = f"task.{symbol}.{cycle}.{timestamp}"
-    task_logger = logging.getLogger(task_logger_name)
-    task_logger.setLevel(logging.INFO)
-    task_logger.propagate = False
-    
-    handler = logging.FileHandler(log_file, encoding='utf-8')
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    
-    task_logger.addHandler(handler)
-    
-    return task_logger, handler
-
-def _get_prompt_from_db(prompt_id: int, task_logger) -> Tuple[Optional[str], Optional[str]]:
-    """根据 prompt_id 从数据库获取指定的提示词内容。"""
-    conn = None
+async def _get_prompt(prompt_id: int, task_logger) -> Optional[ParsedPrompt]:
+    """获取已解析的提示词：优先使用进程内缓存，未命中时在数据库线程池中加载。"""
+    if prompt_cache.sync_due():
+        try:
+            await db_executor.run(prompt_cache.sync)
+        except Exception as e:
+            task_logger.warning(f"检查提示词版本失败，暂时沿用缓存: {e}")
+    parsed = prompt_cache.get(prompt_id)
+    if parsed is not None:
+        return parsed
     try:
-        conn = get_db_connection()
-        if not conn:
-            task_logger.error("未能获取数据库连接以加载提示词。")
-            return None, None
-        
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT content FROM prompts WHERE id = %s", (prompt_id,))
-        prompt_row = cursor.fetchone()
-        
-        if not prompt_row:
-            task_logger.error(f"数据库中未找到 ID 为 {prompt_id} 的提示词。")
-            return None, None
-
-        content = str(prompt_row['content'])
-            
-        parts = content.split('---JSON---', 1)
-        system_prompt = parts[0].strip() if parts else content.strip()
-        json_structure = parts[1].strip() if len(parts) > 1 else ""
-
-        return system_prompt, json_structure
-
+        parsed = await db_executor.run(prompt_cache.load, prompt_id)
     except Exception as e:
         task_logger.error(f"从数据库加载提示词 ID {prompt_id} 时出错: {e}", exc_info=True)
-        return None, None
-    finally:
-        if conn:
-            conn.close()
-
-def _save_results_to_db(data: Dict[str, Any], symbol: str, cycle: str, prompt_id: int, task_logger):
-    """将AI分析结果分别保存到 trade_analysis 和 trade_plan 表中。"""
-    conn = None
+        return None
+    if parsed is None:
+        task_logger.error(f"数据库中未找到 ID 为 {prompt_id} 的提示词。")
+    return parsed
+
+async def _save_results(data: Dict[str, Any], symbol: str, cycle: str, prompt_id: int, task_logger,
+                        prompt_stats: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    """将AI分析结果交给后台写入器，批量写入 trade_analysis 和 trade_plan 表。返回 analysis_id，失败时返回 None。"""
+    result = AnalysisResult(data, symbol, cycle, prompt_id, prompt_stats)
+    started = time.perf_counter()
     try:
-        conn = get_db_connection()
-        if not conn:
-            task_logger.error("未能获取数据库连接以保存分析。")
-            return
-
-        cursor = conn.cursor()
-        
-        # 1. 保存到 trade_analysis 表
-        analysis_data = data.get('analysis', {})
-        analysis_sql = """
-        INSERT INTO trade_analysis (asset, timestamp, prompt_id, cycle, trend, confidence, conclusion, extra_info)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        analysis_params = (
-            symbol,
-            datetime.now(),
-            prompt_id,
-            cycle,
-            analysis_data.get('trend'),
-            analysis_data.get('confidence'),
-            analysis_data.get('conclusion'),
-            json.dumps(data) # 将完整原始响应存入 extra_info
-        )
-        cursor.execute(analysis_sql, analysis_params)
-        analysis_id = cursor.lastrowid
-        task_logger.info(f"成功将分析摘要保存到 trade_analysis，获得 ID: {analysis_id}")
-
-        # 2. 保存到 trade_plan 表
-        trade_plan_data = data.get('tradePlan', {})
-        if not trade_plan_data:
-            task_logger.warning("AI响应中未包含 tradePlan 部分，不创建交易计划。")
-            conn.commit()
-            return
-
-        plan_sql = """
-        INSERT INTO trade_plan (
-            asset, cycle, created_at, direction, confidence, entry_price, 
-            stop_loss, take_profit_1, take_profit_2, risk_reward_ratio, 
-            analysis_id, prompt_id, extra_info, status
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        plan_params = (
-            symbol,
-            cycle,
-            datetime.now(),
-            trade_plan_data.get('direction'),
-            trade_plan_data.get('confidence'),
-            trade_plan_data.get('entry_price'),
-            trade_plan_data.get('stop_loss'),
-            trade_plan_data.get('take_profit_1'),
-            trade_plan_data.get('take_profit_2'),
-            trade_plan_data.get('risk_reward_ratio'),
-            analysis_id,
-            prompt_id,
-            json.dumps(trade_plan_data.get('extra_info', {})),
-            'ACTIVE' # 默认状态
-        )
-        cursor.execute(plan_sql, plan_params)
-        task_logger.info(f"成功将交易计划关联到 analysis_id {analysis_id} 并保存到 trade_plan。")
-
-        conn.commit()
-
+        analysis_id = await result_writer.submit(result)
     except Exception as e:
         task_logger.error(f"保存分析结果时发生数据库错误: {e}", exc_info=True)
-        if conn:
-            conn.rollback()
+        return None
     finally:
-        if conn:
-            conn.close()
-
-async def run_analysis_task(asset_id: int, prompt_id: int, cycle: str, symbol: str, asset_type: int):
-    """执行单次分析任务的完整流程。"""
-    task_logger, handler = _setup_task_logger(symbol, cycle)
-    try:
+        DB_SAVE_SECONDS.observe(time.perf_counter() - started)
+    task_logger.info(f"成功将分析摘要保存到 trade_analysis，获得 ID: {analysis_id}")
+    if result.plan:
+        task_logger.info(f"成功将交易计划关联到 analysis_id {analysis_id} 并保存到 trade_plan。")
+    else:
+        task_logger.warning("AI响应中未包含 tradePlan 部分，不创建交易计划。")
+    return analysis_id
+
+def _resolve_kline_encoding(task_encoding: Optional[str], prompt_encoding: Optional[str], task_logger) -> KlineEncoding:
+    """K线编码优先级：任务设置 > 提示词设置 > 全局默认。"""
+    for candidate in (task_encoding, prompt_encoding, settings.KLINE_PROMPT_ENCODING):
+        if not candidate:
+            continue
+        try:
+            return KlineEncoding(candidate)
+        except ValueError:
+            task_logger.warning(f"未知的K线编码方式 '{candidate}'，已忽略。")
+    return KlineEncoding.JSON
+
+async def run_analysis_task(asset_id: int, prompt_id: int, cycle: str, symbol: str, asset_type: int,
+                            kline_encoding: Optional[str] = None, run_info: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    执行单次分析任务的完整流程。返回是否成功保存了分析结果；
+    传入 run_info 时回写本次运行的 run_id、结果与失败类别。
+
+    日志写入固定的 task 记录器，运行ID、交易对和周期作为记录字段 (见 core/task_log.py)；
+    由工作者池调用时沿用其运行ID，否则生成新的。每次运行的分阶段耗时交给 run_ledger
+    在后台批量写入 task_runs 表。
+    """
+    context = current_run()
+    run_id = context.get("run_id") or new_run_id()
+    run = TaskRun(
+        run_id, symbol, cycle, prompt_id, task_id=context.get("task_id"), job_id=context.get("job_id"),
+        job_attempt=context.get("job_attempt"), fire_time=context.get("fire_time")
+    )
+    with run_context(run_id=run_id, symbol=symbol, cycle=cycle):
         task_logger.info(f"启动分析任务: asset_id={asset_id}, prompt_id={prompt_id}, symbol={symbol}, cycle={cycle}")
-        
-        # 1. 从数据库加载指定的提示词
-        system_prompt, json_structure = _get_prompt_from_db(prompt_id, task_logger)
-        if not system_prompt:
-            task_logger.error(f"未能从数据库加载 ID 为 {prompt_id} 的提示词，任务中止。")
-            return
-
-        # 2. 获取K线数据
-        kline_data = fetch_all_kline_data_concurrently(symbol=symbol, asset_type=asset_type)
-        if not any(kline_data.values()):
-            task_logger.warning(f"未能为 {symbol} 获取到K线数据。正在中止任务。")
-            return
-
-        # 3. 构建Prompt并调用AI
+        try:
+            ok = await _run_stages(run, prompt_id, cycle, symbol, asset_type, kline_encoding)
+        except asyncio.CancelledError:
+            run.finish(CANCELLED)
+            raise
+        except Exception as e:
+            run.finish(ERROR, type(e).__name__)
+            raise
+        else:
+            run.finish(OK if ok else FAILED)
+        finally:
+            run_ledger.record(run)
+            if run_info is not None:
+                run_info.update(run_id=run.run_id, outcome=run.outcome, error_class=run.error_class)
+            task_logger.info(f"运行耗时 {run.total_seconds:.3f}s, 各阶段: "
+                             + ", ".join(f"{name}={seconds:.3f}s" for name, seconds in run.stages.items()))
+    return ok
+
+async def _run_stages(run: TaskRun, prompt_id: int, cycle: str, symbol: str, asset_type: int,
+                      kline_encoding: Optional[str]) -> bool:
+    # 1. 从数据库加载指定的提示词
+    with run.stage("prompt_load"):
+        prompt = await _get_prompt(prompt_id, task_logger)
+    if prompt is None or not prompt.system_prompt:
+        task_logger.error(f"未能从数据库加载 ID 为 {prompt_id} 的提示词，任务中止。")
+        return run.fail("PromptUnavailable")
+    if prompt.format_error:
+        task_logger.error(f"提示词 ID {prompt_id} 无法使用，任务中止: {prompt.format_error}")
+        return run.fail("PromptFormatError")
+
+    # 2. 获取K线数据
+    with run.stage("kline"):
+        kline_data = await fetch_all_kline_data_async(symbol=symbol, asset_type=asset_type, timings=run.kline_intervals)
+    if not any(kline_data.values()):
+        task_logger.warning(f"未能为 {symbol} 获取到K线数据。正在中止任务。")
+        return run.fail("KlineUnavailable")
+
+    # 3. 构建Prompt并调用AI
+    with run.stage("prepare"):
         asset_type_str = ASSET_TYPE_MAP.get(asset_type, "未知类型")
-        
+
         full_system_prompt = (
-            f"{system_prompt.format(symbol=symbol, asset_type=asset_type_str, cycle=cycle)}\n\n"
+            f"{prompt.render(symbol=symbol, asset_type=asset_type_str, cycle=cycle)}\n\n"
             f"请严格按照以下JSON结构返回分析结果:\n"
-            f"{json_structure}"
+            f"{prompt.json_structure}"
         )
-        
-        kline_data_str = json.dumps(kline_data, indent=2)
-        user_prompt = (
-            f"以下是最新的K线数据:\n"
-            f"```json\n{kline_data_str}\n```"
+
+        encoding = _resolve_kline_encoding(kline_encoding, prompt.kline_encoding, task_logger)
+        user_prompt, prompt_stats = build_kline_prompt(kline_data, encoding)
+        task_logger.info(
+            f"K线编码: {prompt_stats['encoding']}, 大小: {prompt_stats['bytes']} 字节, "
+            f"估算令牌数: {prompt_stats['tokens']}"
         )
-        
-        task_logger.info("正在向AI模型发送请求...")
+        if settings.ANALYSIS_INCLUDE_INDICATORS:
+            features = indicator_engine.compute_all(symbol, asset_type, kline_data)
+            user_prompt += (
+                f"\n\n以下是基于上述K线预计算的技术指标 (EMA/SMA/RSI/ATR/MACD/布林带/摆动点/Zig-Zag):\n"
+                f"```json\n{json.dumps(features)}\n```"
+            )
+    run.prompt_chars = len(full_system_prompt) + len(user_prompt)
+
+    task_logger.info("正在向AI模型发送请求...")
+    call_info: Dict[str, Any] = {}
+    with run.stage("llm"):
         ai_response_str = await get_ai_response(
             system_prompt=full_system_prompt,
-            user_prompt=user_prompt
+            user_prompt=user_prompt,
+            call_info=call_info,
+            priority=CYCLE_PRIORITY.get(cycle, DEFAULT_PRIORITY)
+        )
+    run.record_call(call_info)
+    run.response_chars = len(ai_response_str) if ai_response_str else 0
+    task_logger.info(f"上下文预算: {call_info.get('budget')}")
+    if 'ttft' in call_info or 'time_to_json' in call_info:
+        task_logger.info(
+            f"流式响应: 首令牌耗时 {call_info.get('ttft')}s, JSON 完整耗时 {call_info.get('time_to_json')}s"
         )
-        task_logger.info(f"原始AI响应:\n---\n{ai_response_str}\n---")
+    if call_info.get('cache_hit'):
+        task_logger.info("AI 响应来自缓存 (cache hit)，未调用模型。")
+    task_logger.info(f"原始AI响应:\n---\n{ai_response_str}\n---")
 
-        if not ai_response_str or "错误：" in ai_response_str:
-            task_logger.error(f"未能从AI获取有效响应: {ai_response_str}")
-            return
+    if not ai_response_str or "错误：" in ai_response_str:
+        task_logger.error(f"未能从AI获取有效响应: {ai_response_str}")
+        return run.fail("LLMError")
 
-        # 4. 解析并存储
+    # 4. 解析并存储
+    with run.stage("parse"):
+        started = time.perf_counter()
         json_part = _extract_json_from_response(ai_response_str)
         if not json_part:
             task_logger.error(f"无法从AI响应中提取JSON: {ai_response_str}")
-            return
-            
+            return run.fail("JSONNotFound")
+
         try:
             analysis_result = json.loads(json_part)
-            _save_results_to_db(analysis_result, symbol, cycle, prompt_id, task_logger)
-            task_logger.info(f"为 {symbol} ({cycle}) 的分析任务已成功完成。")
         except json.JSONDecodeError:
             task_logger.error(f"从AI响应解码JSON失败: {json_part}")
-    finally:
-        handler.close()
-        task_logger.removeHandler(handler)
\ No newline at end of file
+            return run.fail("JSONDecodeError")
+        finally:
+            JSON_EXTRACT_SECONDS.observe(time.perf_counter() - started)
+
+    with run.stage("save"):
+        run.analysis_id = await _save_results(analysis_result, symbol, cycle, prompt_id, task_logger, prompt_stats)
+    if run.analysis_id is None:
+        return run.fail("SaveError")
+    task_logger.info(f"为 {symbol} ({cycle}) 的分析任务已成功完成。")
+    return True
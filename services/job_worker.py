@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from core import job_queue, run_ledger
+from core.config import settings
+from core.db_executor import db_executor
+from core.metrics import ANALYSIS_JOBS, JOB_QUEUE_WAIT_SECONDS, GaugeFunc
+from core.scheduler import execute_task_job, scheduler
+from core.task_log import new_run_id, run_context
+
+logger = logging.getLogger(__name__)
+
+# 重试也不会成功的失败：直接转入死信，不再消耗模型调用
+PERMANENT_FAILURES = frozenset({"PromptUnavailable", "PromptFormatError"})
+# 同理，这些异常通常是代码或数据缺陷，而不是暂时性故障
+PERMANENT_EXCEPTIONS = (KeyError, TypeError, AttributeError)
+
+
+class AnalysisWorkerPool:
+    """
+    分析作业工作者池：从 analysis_jobs 中领取作业并执行。
+
+    调度器只负责入队，执行吞吐量由工作者数量决定 (可以在多个进程中各开一个池)。
+    执行中的作业定期续租；执行者崩溃时租约过期，作业会被其他工作者重新领取。
+    """
+
+    def __init__(self, concurrency: int, poll_interval: float):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._workers: List[asyncio.Task] = []
+        self._housekeeper: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._in_flight: Dict[int, Dict[str, Any]] = {}
+        self.claimed = 0
+        self.succeeded = 0
+        self.retried = 0
+        self.dead = 0
+        self.released = 0
+        self.lost_leases = 0
+        self.claim_errors = 0
+        self.run_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return any(not worker.done() for worker in self._workers)
+
+    def start(self):
+        if self.concurrency <= 0:
+            logger.info("ANALYSIS_WORKERS 为 0，本进程不执行分析作业。")
+            return
+        if self.running:
+            return
+        self._stopping = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker_loop(), name=f"analysis-worker-{i}") for i in range(self.concurrency)
+        ]
+        self._housekeeper = asyncio.create_task(self._housekeeping(), name="analysis-jobs-housekeeping")
+        logger.info(f"分析工作者池已启动: {self.worker_id}, 并发 {self.concurrency}。")
+
+    async def _sleep(self, seconds: float) -> bool:
+        """可被停止信号打断的等待；收到停止信号时返回 True。"""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                jobs = await db_executor.run(job_queue.claim_jobs, self.worker_id, 1)
+            except Exception as e:
+                self.claim_errors += 1
+                logger.error(f"领取分析作业失败: {e}")
+                jobs = []
+            if not jobs:
+                await self._sleep(self.poll_interval)
+                continue
+            await self._process(jobs[0])
+
+    async def _keep_lease(self, job: Dict[str, Any]):
+        while True:
+            await asyncio.sleep(settings.JOB_VISIBILITY_TIMEOUT / 3)
+            try:
+                if not await db_executor.run(job_queue.extend_lease, job):
+                    self.lost_leases += 1
+                    logger.warning(f"作业 {job['id']} 的租约已被接管，本次执行结果将被丢弃。")
+                    return
+            except Exception as e:
+                logger.error(f"作业 {job['id']} 续租失败: {e}")
+
+    async def _process(self, job: Dict[str, Any]):
+        # 本次执行的所有日志 (包括续租和状态更新) 都带上运行ID、任务ID和作业ID；
+        # 触发时间和尝试次数不写入日志，只供运行台账使用
+        with run_context(run_id=new_run_id(), task_id=job["task_id"], job_id=job["id"],
+                         fire_time=job.get("fire_time"), job_attempt=job.get("attempts")):
+            await self._run_job(job)
+
+    async def _run_job(self, job: Dict[str, Any]):
+        self.claimed += 1
+        if isinstance(job.get("fire_time"), datetime):
+            # fire_time 以调度器时区的本地时间存储
+            now = datetime.now(scheduler.timezone).replace(tzinfo=None)
+            JOB_QUEUE_WAIT_SECONDS.observe(max(0.0, (now - job["fire_time"]).total_seconds()))
+        self._in_flight[job["id"]] = job
+        payload = job["payload"]
+        logger.info(
+            f"开始执行作业 {job['id']} (任务 {job['task_id']}, 触发时间 {job['fire_time']}, "
+            f"第 {job['attempts']}/{job['max_attempts']} 次)"
+        )
+        lease_keeper = asyncio.create_task(self._keep_lease(job))
+        start = time.perf_counter()
+        error = None
+        permanent = False
+        run_info: Dict[str, Any] = {}
+        try:
+            ok = await execute_task_job(
+                job["task_id"], payload["trigger_mode"], payload["task_kwargs"], job["id"], run_info,
+                job.get("fire_time")
+            )
+            if not ok:
+                error_class = run_info.get("error_class")
+                permanent = error_class in PERMANENT_FAILURES
+                error = f"分析未成功完成 ({error_class or '未知原因'})，详见任务日志"
+        except asyncio.CancelledError:
+            # 停机时被取消：归还作业，由其他工作者 (或重启后的本进程) 立即重新执行
+            lease_keeper.cancel()
+            self._in_flight.pop(job["id"], None)
+            if await asyncio.shield(db_executor.run(job_queue.release_job, job)):
+                self.released += 1
+                ANALYSIS_JOBS.labels("released").inc()
+            raise
+        except Exception as e:
+            logger.error(f"作业 {job['id']} 执行出错: {e}", exc_info=True)
+            error = f"{type(e).__name__}: {e}"
+            permanent = isinstance(e, PERMANENT_EXCEPTIONS)
+        finally:
+            lease_keeper.cancel()
+            self.run_seconds += time.perf_counter() - start
+
+        self._in_flight.pop(job["id"], None)
+        try:
+            if error is None:
+                if await db_executor.run(job_queue.complete_job, job):
+                    self.succeeded += 1
+                    ANALYSIS_JOBS.labels("succeeded").inc()
+                else:
+                    self.lost_leases += 1
+                return
+            status = await db_executor.run(job_queue.fail_job, job, error, permanent)
+        except Exception as e:
+            logger.error(f"更新作业 {job['id']} 状态失败，将在租约过期后重试: {e}")
+            return
+        if status == job_queue.DEAD:
+            self.dead += 1
+            ANALYSIS_JOBS.labels("dead").inc()
+            if permanent:
+                logger.error(f"作业 {job['id']} 的失败不可重试，直接转入死信: {error}")
+            else:
+                logger.error(f"作业 {job['id']} 已用完 {job['max_attempts']} 次尝试，转入死信: {error}")
+        elif status == job_queue.PENDING:
+            self.retried += 1
+            ANALYSIS_JOBS.labels("retried").inc()
+            logger.warning(f"作业 {job['id']} 执行失败，稍后重试: {error}")
+        else:
+            self.lost_leases += 1
+
+    async def _housekeeping(self):
+        while not await self._sleep(3600):
+            purged = await db_executor.run(job_queue.purge_finished_jobs, settings.JOB_RETENTION_DAYS)
+            if purged:
+                logger.info(f"已清理 {purged} 个超过 {settings.JOB_RETENTION_DAYS} 天的已完成作业。")
+            purged = await db_executor.run(run_ledger.purge_runs, settings.TASK_RUN_RETENTION_DAYS)
+            if purged:
+                logger.info(f"已清理 {purged} 条超过 {settings.TASK_RUN_RETENTION_DAYS} 天的运行记录。")
+
+    async def stop(self, grace_seconds: float = 30.0):
+        """停止领取新作业；等待执行中的作业最多 grace_seconds 秒，其余的取消并归还队列。"""
+        if not self._workers:
+            return
+        self._stopping.set()
+        if self._in_flight:
+            logger.info(f"正在等待 {len(self._in_flight)} 个执行中的分析作业完成 (最多 {grace_seconds}s)...")
+        _, pending = await asyncio.wait(self._workers + [self._housekeeper], timeout=grace_seconds)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        self._workers = []
+        logger.info("分析工作者池已停止。")
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "in_flight": sorted(self._in_flight),
+            "claimed": self.claimed,
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "dead": self.dead,
+            "released": self.released,
+            "lost_leases": self.lost_leases,
+            "claim_errors": self.claim_errors,
+            "avg_run_seconds": round(self.run_seconds / self.claimed, 3) if self.claimed else 0.0,
+        }
+
+
+worker_pool = AnalysisWorkerPool(settings.ANALYSIS_WORKERS, settings.JOB_POLL_INTERVAL)
+GaugeFunc("analysis_jobs_in_flight", "本进程正在执行的作业数", lambda: len(worker_pool._in_flight))
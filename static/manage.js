@@ -22,6 +22,9 @@ document.addEventListener('DOMContentLoaded', () => {
     const promptSelect = document.getElementById('task-prompt');
     const cycleSelect = document.getElementById('task-cycle');
     const cronInput = document.getElementById('task-cron');
+    const cronGroup = document.getElementById('task-cron-group');
+    const triggerModeSelect = document.getElementById('task-trigger-mode');
+    const encodingSelect = document.getElementById('task-encoding');
     const activeSelect = document.getElementById('task-active');
     const statusMessage = document.getElementById('task-status-message');
 
@@ -67,7 +70,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 <td>${asset.symbol}</td>
                 <td>${task.cycle}</td>
                 <td>${prompt.name} (v${prompt.version})</td>
-                <td><code>${task.cron_expression}</code></td>
+                <td>${task.trigger_mode === 'candle_close' ? `K线收盘 (${task.cycle})` : `<code>${task.cron_expression}</code>`}</td>
                 <td><span class="status ${task.is_active ? 'active' : ''}">${task.is_active ? '激活' : '禁用'}</span></td>
                 <td>
                     <button class="edit-task-btn" data-id="${task.id}">编辑</button>
@@ -95,14 +98,23 @@ document.addEventListener('DOMContentLoaded', () => {
             promptSelect.value = task.prompt_id;
             cycleSelect.value = task.cycle;
             cronInput.value = task.cron_expression;
+            triggerModeSelect.value = task.trigger_mode || 'cron';
+            encodingSelect.value = task.kline_encoding || '';
             activeSelect.value = String(task.is_active);
         } else {
             modalTitle.textContent = '添加新任务';
             taskIdInput.value = '';
         }
+        updateCronVisibility();
         taskModal.style.display = 'block';
     }
 
+    function updateCronVisibility() {
+        const cronMode = triggerModeSelect.value === 'cron';
+        cronGroup.style.display = cronMode ? '' : 'none';
+        cronInput.required = cronMode;
+    }
+
     function closeModal() {
         taskModal.style.display = 'none';
     }
@@ -110,6 +122,7 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- 事件监听器 ---
 
     addTaskBtn.addEventListener('click', () => openModal());
+    triggerModeSelect.addEventListener('change', updateCronVisibility);
     closeModalBtn.addEventListener('click', closeModal);
     window.addEventListener('click', (event) => {
         if (event.target === taskModal) closeModal();
@@ -126,6 +139,8 @@ document.addEventListener('DOMContentLoaded', () => {
             prompt_id: parseInt(promptSelect.value),
             cycle: cycleSelect.value,
             cron_expression: cronInput.value.trim(),
+            kline_encoding: encodingSelect.value || null,
+            trigger_mode: triggerModeSelect.value,
             is_active: activeSelect.value === 'true'
         };
 
@@ -15,6 +15,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const planIdInput = document.getElementById('plan-id-input');
     const statusSelect = document.getElementById('plan-status-select');
     const statusMessage = document.getElementById('status-message');
+    const filterForm = document.getElementById('plan-filters');
 
     let currentPage = 1;
     const pageSize = 20;
@@ -40,13 +41,37 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    function buildFilterParams() {
+        // 筛选在服务端完成 (走 trade_plan 的复合索引)，这里只负责拼接查询参数
+        const params = new URLSearchParams();
+        const form = new FormData(filterForm);
+        for (const [key, value] of form.entries()) {
+            if (!value) continue;
+            if (key === 'since_hours') {
+                // created_at 以服务器本地时间存储，这里同样按本地时间格式化
+                const since = new Date(Date.now() - Number(value) * 3600 * 1000);
+                const pad = (n) => String(n).padStart(2, '0');
+                params.set('start_time', `${since.getFullYear()}-${pad(since.getMonth() + 1)}-${pad(since.getDate())}T` +
+                    `${pad(since.getHours())}:${pad(since.getMinutes())}:${pad(since.getSeconds())}`);
+            } else {
+                params.set(key, value.trim());
+            }
+        }
+        return params;
+    }
+
     async function fetchPlans(page = 1) {
         try {
-            const response = await fetch(`/api/plans?page=${page}&page_size=${pageSize}`);
+            const params = buildFilterParams();
+            params.set('page', page);
+            params.set('page_size', pageSize);
+            params.set('with_total', 'true');
+            const response = await fetch(`/api/plans?${params.toString()}`);
             if (!response.ok) throw new Error('获取交易计划失败');
-            const result = await response.json();
-            renderTable(result.data);
-            renderPagination(result.total_pages, page);
+            const plans = await response.json();
+            const total = Number(response.headers.get('X-Total-Count') || plans.length);
+            renderTable(plans);
+            renderPagination(Math.ceil(total / pageSize), page);
             currentPage = page;
         } catch (error) {
             tableBody.innerHTML = `<tr><td colspan="10" class="error">加载交易计划出错: ${error.message}</td></tr>`;
@@ -104,9 +129,16 @@ document.addEventListener('DOMContentLoaded', () => {
 
     function populateStatusSelect() {
         const statusMap = dictionary['trade_plan_status'] || {};
-        statusSelect.innerHTML = Object.entries(statusMap)
+        const options = Object.entries(statusMap)
             .map(([code, label]) => `<option value="${code}">${label}</option>`)
             .join('');
+        statusSelect.innerHTML = options;
+        document.getElementById('filter-status').insertAdjacentHTML('beforeend', options);
+
+        const directionMap = dictionary['direction'] || {};
+        document.getElementById('filter-direction').insertAdjacentHTML('beforeend', Object.entries(directionMap)
+            .map(([code, label]) => `<option value="${code}">${label}</option>`)
+            .join(''));
     }
 
     // --- 模态框控制 ---
@@ -124,6 +156,11 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- 事件监听器 ---
 
+    filterForm.addEventListener('submit', (event) => {
+        event.preventDefault();
+        fetchPlans(1);
+    });
+
     closeModalBtn.addEventListener('click', closeModal);
     window.addEventListener('click', (event) => {
         if (event.target === statusModal) closeModal();
@@ -11,6 +11,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const modalTitle = document.getElementById('modal-title');
     const promptNameInput = document.getElementById('prompt-name');
     const promptContentInput = document.getElementById('prompt-content');
+    const promptEncodingSelect = document.getElementById('prompt-encoding');
     const viewModalTitle = document.getElementById('view-modal-title');
     const viewPromptContent = document.getElementById('view-prompt-content');
     const copyFromViewBtn = document.getElementById('copy-from-view-btn');
@@ -94,6 +95,7 @@ document.addEventListener('DOMContentLoaded', () => {
         event.preventDefault();
         const name = promptNameInput.value;
         const content = promptContentInput.value;
+        const kline_encoding = promptEncodingSelect.value || null;
 
         if (!name.trim() || !content.trim()) {
             alert('提示词名称和内容不能为空！');
@@ -104,7 +106,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const response = await fetch('/api/prompts', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ name, content }),
+                body: JSON.stringify({ name, content, kline_encoding }),
             });
             if (!response.ok) {
                 const errorData = await response.json();
@@ -180,6 +182,7 @@ document.addEventListener('DOMContentLoaded', () => {
             promptNameInput.value = prompt.name;
             promptNameInput.disabled = true; // Name cannot be changed when creating a new version
             promptContentInput.value = prompt.content;
+            promptEncodingSelect.value = prompt.kline_encoding || '';
             modal.style.display = 'block';
         } catch (e) {
             alert('加载内容以复制失败！');
@@ -0,0 +1,61 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import core.ai_client as ai_client
+from core.config import settings
+
+
+class _HangingCompletions:
+    """永不返回的模型调用，记录被取消的次数。"""
+
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+
+    async def create(self, **kwargs):
+        self.started += 1
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+class HedgeCancellationTest(unittest.TestCase):
+    def test_caller_cancelled_during_hedge_delay_releases_slot(self):
+        """调用方在对冲等待期间被取消时，主请求随之取消并归还准入名额"""
+        completions = _HangingCompletions()
+        fake_client = SimpleNamespace(base_url="http://llm.test/v1", chat=SimpleNamespace(completions=completions))
+        admission = ai_client.AdmissionController(max_concurrency=2)
+        budget = {"prompt_tokens": 100}
+
+        async def scenario():
+            caller = asyncio.create_task(ai_client._call_with_hedge(
+                "model-a", ["model-a", "model-b"], [{"role": "user", "content": "hi"}], {}, 0, budget, {}
+            ))
+            await asyncio.sleep(0.05)
+            self.assertEqual(admission.running, 1)
+            caller.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await caller
+            # 让被取消的请求任务执行其清理逻辑
+            for _ in range(5):
+                await asyncio.sleep(0)
+            # 必须在事件循环结束前检查：asyncio.run 退出时会取消所有遗留任务
+            self.assertEqual((completions.started, completions.cancelled), (1, 1))
+            self.assertEqual(admission.running, 0)
+
+        with mock.patch.object(ai_client, "client", fake_client), \
+                mock.patch.object(ai_client, "admission", admission), \
+                mock.patch.object(ai_client.model_router, "hedge_delay", return_value=10.0), \
+                mock.patch.object(settings, "AI_HEDGE_ENABLED", True), \
+                mock.patch.object(settings, "AI_STREAMING_ENABLED", False):
+            asyncio.run(scenario())
+
+        self.assertEqual(admission.stats()["queue_depth"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
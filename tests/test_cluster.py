@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import core.cluster as cluster_module
+from core.cluster import NODES_DDL, ClusterMembership, HashRing
+from core.config import settings
+
+TASK_IDS = list(range(1, 201))
+
+
+class HashRingTest(unittest.TestCase):
+    def test_every_task_has_one_owner(self):
+        ring = HashRing(["node-a", "node-b", "node-c"])
+        owners = {ring.owner(task_id) for task_id in TASK_IDS}
+        self.assertEqual(owners, {"node-a", "node-b", "node-c"})
+        self.assertIsNone(HashRing([]).owner(1))
+
+    def test_adding_a_node_only_moves_tasks_to_it(self):
+        """新增节点时，换主的任务只会移到新节点上"""
+        before = HashRing(["node-a", "node-b"])
+        after = HashRing(["node-a", "node-b", "node-c"])
+        moved = [t for t in TASK_IDS if before.owner(t) != after.owner(t)]
+        self.assertTrue(moved)
+        self.assertTrue(all(after.owner(t) == "node-c" for t in moved))
+        self.assertLess(len(moved), len(TASK_IDS) / 2)
+
+
+class ClusterMembershipTest(unittest.TestCase):
+    """两个节点共享一个临时 SQLite 文件；时钟由测试控制。"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, "cluster.db")
+        conn = self._connect()
+        conn.execute(NODES_DDL)
+        conn.commit()
+        conn.close()
+
+        self.now = 1_000_000.0
+        for patcher in (
+            mock.patch.object(cluster_module.time, "time", lambda: self.now),
+            mock.patch.object(settings, "CLUSTER_LEASE_SECONDS", 15.0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.a = ClusterMembership("node-a", connect=self._connect, placeholder="?")
+        self.b = ClusterMembership("node-b", connect=self._connect, placeholder="?")
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    def _owned(self, node: ClusterMembership) -> set:
+        return {t for t in TASK_IDS if node.owns(t)}
+
+    def _join_both(self):
+        self.a.heartbeat()
+        self.b.heartbeat()
+        self.a.heartbeat()
+        self.assertEqual(self.a.live_nodes, ["node-a", "node-b"])
+        self.assertEqual(self.b.live_nodes, ["node-a", "node-b"])
+
+    def test_live_members_split_tasks(self):
+        """两个存活节点各负责一部分任务，互不重叠且覆盖全部任务"""
+        self._join_both()
+        owned_a, owned_b = self._owned(self.a), self._owned(self.b)
+        self.assertTrue(owned_a and owned_b)
+        self.assertFalse(owned_a & owned_b)
+        self.assertEqual(owned_a | owned_b, set(TASK_IDS))
+
+    def test_survivor_takes_over_within_one_lease(self):
+        """一个节点停止心跳后，存活节点在一个租约周期内接管全部任务"""
+        self._join_both()
+        lease, interval = self.a.lease_seconds, self.a.heartbeat_interval
+        last_b_heartbeat = self.now
+
+        # 租约内 b 仍视为存活
+        self.now += interval
+        self.assertFalse(self.a.heartbeat())
+        self.assertNotEqual(self._owned(self.a), set(TASK_IDS))
+
+        # a 按心跳间隔继续刷新，最迟在 b 最后一次心跳之后一个租约内完成接管
+        while self.now + interval <= last_b_heartbeat + lease:
+            self.now += interval
+            if self.a.heartbeat():
+                break
+        self.assertLessEqual(self.now - last_b_heartbeat, lease)
+        self.assertEqual(self.a.live_nodes, ["node-a"])
+        self.assertEqual(self._owned(self.a), set(TASK_IDS))
+
+    def test_leave_hands_over_on_next_heartbeat(self):
+        """正常退出的节点删除租约，其他节点下一次心跳即接管"""
+        self._join_both()
+        self.b.leave()
+        self.now += 0.1
+        self.assertTrue(self.a.heartbeat())
+        self.assertEqual(self._owned(self.a), set(TASK_IDS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import math
+import unittest
+
+import numpy as np
+
+from core.indicators import IndicatorEngine, _calculate_zigzag_loop, _ema_loop, ema, zigzag
+from core.kline_cache import INTERVAL_MS
+from core.kline_series import KlineSeries
+
+INTERVAL = "15m"
+
+
+def _random_series(candles: int, seed: int) -> KlineSeries:
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.003, candles)))
+    high = close * (1 + np.abs(rng.normal(0, 0.0015, candles)))
+    low = close * (1 - np.abs(rng.normal(0, 0.0015, candles)))
+    return KlineSeries(
+        np.arange(candles, dtype=np.int64) * INTERVAL_MS[INTERVAL], close, high, low, close, np.ones(candles)
+    )
+
+
+def _flatten(obj, prefix=""):
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            yield from _flatten(value, f"{prefix}{key}.")
+    elif isinstance(obj, list):
+        for i, value in enumerate(obj):
+            yield from _flatten(value, f"{prefix}{i}.")
+    else:
+        yield prefix.rstrip("."), obj
+
+
+class VectorizedIndicatorTest(unittest.TestCase):
+    def test_zigzag_matches_loop(self):
+        """向量化 Zig-Zag 与逐K线参考实现给出相同的转折点价格"""
+        for seed in range(5):
+            series = _random_series(5000, seed)
+            dicts = [{"high": h, "low": l} for h, l in zip(series.high.tolist(), series.low.tolist())]
+            for threshold in (0.5, 1.0, 3.0):
+                with self.subTest(seed=seed, threshold=threshold):
+                    self.assertEqual(
+                        zigzag(series.high, series.low, threshold)[1].tolist(),
+                        _calculate_zigzag_loop(dicts, threshold),
+                    )
+
+    def test_zigzag_short_input(self):
+        """空序列与单根K线"""
+        empty = np.empty(0)
+        self.assertEqual(zigzag(empty, empty)[1].tolist(), _calculate_zigzag_loop([]))
+        one = np.array([1.0])
+        self.assertEqual(zigzag(one, one)[1].tolist(), _calculate_zigzag_loop([{"high": 1.0, "low": 1.0}]))
+
+    def test_ema_matches_loop(self):
+        """分块 cumsum 的 EMA 与逐项递推一致，种子之前为 NaN"""
+        for seed in range(3):
+            close = _random_series(20000, seed).close
+            for period in (5, 20, 50, 200):
+                with self.subTest(seed=seed, period=period):
+                    np.testing.assert_allclose(ema(close, period), _ema_loop(close.tolist(), period), rtol=1e-9)
+        self.assertTrue(np.isnan(ema(np.arange(10.0), 20)).all())
+
+
+class IndicatorEngineTest(unittest.TestCase):
+    def _now(self, series: KlineSeries, closed: bool) -> int:
+        """最后一根K线已收盘或仍在进行中时的当前时间"""
+        last_open = int(series.open_time[-1])
+        return last_open + INTERVAL_MS[INTERVAL] + (0 if closed else -1)
+
+    def assertFeaturesEqual(self, actual: dict, expected: dict):
+        actual_items, expected_items = dict(_flatten(actual)), dict(_flatten(expected))
+        self.assertEqual(actual_items.keys(), expected_items.keys())
+        for key, value in expected_items.items():
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                self.assertIsNone(actual_items[key], key)
+            else:
+                self.assertAlmostEqual(actual_items[key], value, delta=1e-6 * max(1.0, abs(value)), msg=key)
+
+    def test_incremental_matches_full_recompute(self):
+        """逐步推进的状态与整段重算给出相同的特征"""
+        series = _random_series(600, seed=7)
+        key = ("BTCUSDT", 0, INTERVAL)
+        engine = IndicatorEngine()
+        for end in (300, 301, 350, 351, 600):
+            for closed in (False, True):
+                window = series[:end]
+                now_ms = self._now(window, closed)
+                with self.subTest(end=end, closed=closed):
+                    incremental = engine.features(key, window, now_ms)
+                    full = IndicatorEngine().features(key, window, now_ms)
+                    self.assertFeaturesEqual(incremental, full)
+        self.assertEqual(engine.full_computes, 1)
+        self.assertEqual(engine.incremental_updates, 9)
+
+    def test_gap_falls_back_to_full_recompute(self):
+        """状态不在当前窗口内时回退为整段计算"""
+        series = _random_series(600, seed=3)
+        key = ("BTCUSDT", 0, INTERVAL)
+        engine = IndicatorEngine()
+        engine.features(key, series[:200], self._now(series[:200], True))
+        window = series[300:]
+        result = engine.features(key, window, self._now(window, True))
+        self.assertEqual(engine.full_computes, 2)
+        self.assertFeaturesEqual(result, IndicatorEngine().features(key, window, self._now(window, True)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+from core.config import settings
+from core.database import get_db_connection, init_connection_pool
+
+MYSQL_CONFIGURED = (settings.DATABASE_URL or "").startswith("mysql")
+
+
+@unittest.skipUnless(MYSQL_CONFIGURED, "未配置 MySQL (DATABASE_URL)")
+class PlanQueryExplainTest(unittest.TestCase):
+    """交易计划列表的常见筛选组合必须走索引，不能出现全表扫描或文件排序。"""
+
+    @classmethod
+    def setUpClass(cls):
+        init_connection_pool()
+        conn = get_db_connection()
+        if conn is None:
+            raise unittest.SkipTest("无法连接 MySQL")
+        conn.close()
+
+    def test_no_full_scan_or_filesort(self):
+        from api.routes.plans import explain_plan_queries
+
+        for item in explain_plan_queries():
+            with self.subTest(case=item["case"]):
+                self.assertNotEqual(item["type"], "ALL", item)
+                self.assertNotIn("Using filesort", item["extra"], item)
+
+
+if __name__ == '__main__':
+    unittest.main()
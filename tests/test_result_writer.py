@@ -0,0 +1,141 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import core.result_writer as result_writer_module
+from core.result_writer import ANALYSIS_COLUMNS, PLAN_COLUMNS, AnalysisResult, ResultWriter, write_batch
+
+
+class _FakeDatabase:
+    """内存中的 trade_analysis / trade_plan，按 InnoDB 的方式为多行 INSERT 分配连续自增 ID。"""
+
+    def __init__(self, first_id: int = 1):
+        self.next_id = first_id
+        self.analysis = {}
+        self.plans = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.interleaved = False  # 为 True 时在批次第一行之后插入一条并发写入的行，模拟 ID 不连续
+
+    def connect(self):
+        return _FakeConnection(self)
+
+
+class _FakeCursor:
+    def __init__(self, db: _FakeDatabase):
+        self.db = db
+        self.lastrowid = None
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        if sql.startswith("INSERT INTO trade_analysis"):
+            width = len(ANALYSIS_COLUMNS)
+            self.lastrowid = self.db.next_id
+            for k in range(len(params) // width):
+                row = params[k * width:(k + 1) * width]
+                self.db.analysis[self.db.next_id] = (self.db.next_id, row[0], row[3])
+                self.db.next_id += 1
+                if k == 0 and self.db.interleaved:
+                    self.db.analysis[self.db.next_id] = (self.db.next_id, "OTHER", "1h")
+                    self.db.next_id += 1
+        elif sql.startswith("INSERT INTO trade_plan"):
+            width = len(PLAN_COLUMNS)
+            for k in range(len(params) // width):
+                self.db.plans.append(params[k * width:(k + 1) * width])
+        elif sql.startswith("SELECT"):
+            low, high = params
+            self._rows = [self.db.analysis[i] for i in sorted(self.db.analysis) if low <= i <= high]
+
+    def fetchall(self):
+        return self._rows
+
+
+class _FakeConnection:
+    def __init__(self, db: _FakeDatabase):
+        self.db = db
+
+    def cursor(self):
+        return _FakeCursor(self.db)
+
+    def commit(self):
+        self.db.commits += 1
+
+    def rollback(self):
+        self.db.rollbacks += 1
+
+    def close(self):
+        pass
+
+
+def _result(symbol: str, with_plan: bool) -> AnalysisResult:
+    data = {
+        "analysis": {"trend": "UP", "confidence": 0.7, "conclusion": symbol},
+        "tradePlan": {"direction": "LONG", "entry_price": 100.0} if with_plan else {},
+    }
+    return AnalysisResult(data, symbol, "1h", 1)
+
+
+class WriteBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.db = _FakeDatabase(first_id=41)
+        patcher = mock.patch.object(result_writer_module, "get_db_connection", self.db.connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ids_follow_input_order(self):
+        """返回的 ID 与输入顺序一致，交易计划关联到各自的分析行"""
+        results = [_result("BTCUSDT", True), _result("ETHUSDT", False), _result("SOLUSDT", True)]
+        ids = write_batch(results)
+
+        self.assertEqual(ids, [41, 42, 43])
+        self.assertEqual([self.db.analysis[i][1] for i in ids], ["BTCUSDT", "ETHUSDT", "SOLUSDT"])
+        analysis_id_col = PLAN_COLUMNS.index("analysis_id")
+        self.assertEqual([(plan[0], plan[analysis_id_col]) for plan in self.db.plans], [("BTCUSDT", 41), ("SOLUSDT", 43)])
+        self.assertEqual((self.db.commits, self.db.rollbacks), (1, 0))
+
+    def test_non_contiguous_ids_roll_back(self):
+        """读回的 ID 段与输入不一致时回滚，不写交易计划"""
+        self.db.interleaved = True
+        with self.assertRaises(RuntimeError):
+            write_batch([_result("BTCUSDT", True), _result("ETHUSDT", True)])
+
+        self.assertEqual(self.db.plans, [])
+        self.assertEqual((self.db.commits, self.db.rollbacks), (0, 1))
+
+
+class ResultWriterFallbackTest(unittest.TestCase):
+    def test_batch_failure_falls_back_to_single_writes(self):
+        """批量写入失败后逐条重写，单条失败只影响对应的调用者"""
+        written = []
+
+        def fake_single(result):
+            if result.symbol == "BAD":
+                raise ValueError("bad row")
+            written.append(result.symbol)
+            return 100 + len(written)
+
+        async def scenario():
+            writer = ResultWriter(batch_size=10, flush_interval=0.05)
+            outcomes = await asyncio.gather(
+                writer.submit(_result("BTCUSDT", True)),
+                writer.submit(_result("BAD", False)),
+                writer.submit(_result("ETHUSDT", False)),
+                return_exceptions=True,
+            )
+            await writer.close()
+            return writer, outcomes
+
+        with mock.patch.object(result_writer_module, "write_batch", side_effect=RuntimeError("batch failed")), \
+                mock.patch.object(result_writer_module, "write_single", side_effect=fake_single):
+            writer, outcomes = asyncio.run(scenario())
+
+        self.assertEqual(outcomes[0], 101)
+        self.assertIsInstance(outcomes[1], ValueError)
+        self.assertEqual(outcomes[2], 102)
+        self.assertEqual(written, ["BTCUSDT", "ETHUSDT"])
+        stats = writer.stats()
+        self.assertEqual((stats["batches"], stats["fallbacks"], stats["written"], stats["failed"]), (1, 1, 2, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()